@@ -8,6 +8,10 @@ VERSION = vexatapi.version
 REQUIRES = [
     'requests',
 ]
+EXTRAS = {
+    'async': ['aiohttp'],
+    'numpy': ['numpy'],
+}
 
 pwd = os.path.abspath(os.path.dirname(__file__))
 
@@ -29,4 +33,8 @@ setup(
     long_description=long_description,
     long_description_content_type='text/markdown',
     install_requires=REQUIRES,
+    extras_require=EXTRAS,
+    entry_points={
+        'console_scripts': ['vexatactl = vexatapi.cli:main'],
+    },
 )
@@ -0,0 +1,35 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import pytest
+
+from vexatapi.benchmarks.fake_server import FakeVexataServer
+
+
+@pytest.fixture
+def server():
+    """FakeVexataServer with a few objects of every kind, over HTTP."""
+    srv = FakeVexataServer(volumes=8, snapshots=1, initiators=4, vgs=2,
+                           igs=2, pgs=2, egs=2)
+    srv.start()
+    yield srv
+    srv.stop()
+
+
+@pytest.fixture
+def proxy(server):
+    proxy = server.proxy()
+    yield proxy
+    proxy.close()
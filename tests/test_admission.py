@@ -0,0 +1,100 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import asyncio
+import concurrent.futures
+import time
+
+import pytest
+
+from vexatapi.admission import (BACKGROUND, INTERACTIVE, MONITORING,
+                                PROVISIONING, AdmissionController, priority)
+from vexatapi.async_api_proxy import AsyncVexataAPIProxy
+from vexatapi.exceptions import VexataAPITimeout
+
+VOLUMES = '/api/storagearrays/1/volumes'
+
+
+def test_classify():
+    admission = AdmissionController()
+    assert admission.classify('GET', VOLUMES) == INTERACTIVE
+    assert admission.classify('POST', VOLUMES) == PROVISIONING
+    assert admission.classify('GET', '/api/nodes/1/sensors') == MONITORING
+    assert admission.classify('GET', '/api/mgmtping') == MONITORING
+    with priority(BACKGROUND):
+        assert admission.classify('GET', VOLUMES) == BACKGROUND
+    assert admission.classify('GET', VOLUMES) == INTERACTIVE
+
+
+def test_weighted_order():
+    admission = AdmissionController(max_concurrency=1)
+    with priority(BACKGROUND):
+        held = admission.acquire('GET', VOLUMES)
+    waiters = []
+    with admission._lock:
+        for cls in (BACKGROUND,) * 3 + (INTERACTIVE,) * 3:
+            waiters.append(admission._try_acquire(cls))
+    assert admission.queued() == {INTERACTIVE: 3, MONITORING: 0,
+                                  PROVISIONING: 0, BACKGROUND: 3}
+    granted = []
+    ticket = held
+    for _ in waiters:
+        admission.release(ticket)
+        waiter = [w for w in waiters if w.granted and w not in granted][0]
+        granted.append(waiter)
+        ticket = waiter.cls
+    # Interactive calls, queued last, get 3 of the first 4 slots
+    assert [w.cls for w in granted] == [INTERACTIVE, BACKGROUND,
+                                        INTERACTIVE, INTERACTIVE,
+                                        BACKGROUND, BACKGROUND]
+    admission.release(ticket)
+    assert admission.in_flight == 0
+
+
+def test_rate_limit_deadline():
+    admission = AdmissionController(rate=1, burst=1)
+    admission.release(admission.acquire('GET', VOLUMES))
+    with pytest.raises(VexataAPITimeout):
+        admission.acquire('GET', VOLUMES,
+                          deadline_at=time.monotonic() + 0.1)
+    assert admission.queued()[INTERACTIVE] == 0
+
+
+def test_concurrency_limit(server):
+    server.latency = 0.1
+    admission = AdmissionController(max_concurrency=2)
+    with server.proxy(admission=admission) as proxy:
+        start = time.monotonic()
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda _: proxy.list_pgs(),
+                                        range(8)))
+        elapsed = time.monotonic() - start
+    assert all(results)
+    assert elapsed >= 0.4
+    assert admission.in_flight == 0
+
+
+def test_async_admission(server):
+    admission = AdmissionController(max_concurrency=2)
+
+    async def run():
+        async with server.proxy(AsyncVexataAPIProxy,
+                                admission=admission) as proxy:
+            return await asyncio.gather(*[proxy.list_pgs()
+                                          for _ in range(6)])
+
+    assert all(asyncio.run(run()))
+    assert admission.in_flight == 0
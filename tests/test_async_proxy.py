@@ -0,0 +1,41 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import asyncio
+
+from vexatapi.async_api_proxy import AsyncVexataAPIProxy
+
+
+def test_async_calls(server):
+    snap = next(iter(server.array.snapshots.values()))
+
+    async def run():
+        async with server.proxy(AsyncVexataAPIProxy) as proxy:
+            assert await proxy.test_connection()
+            vol = await proxy.create_volume('v1', 'desc', 1024)
+            listed = [vol async for vol in proxy.iter_volumes()]
+            found = await proxy.find_volsnap_by_uuid(
+                snap['parentVolumeId'], snap['voluuid'])
+            all_vgs = await asyncio.gather(*[proxy.list_vgs()
+                                             for _ in range(32)])
+            assert await proxy.delete_volume(vol['id'])
+            return vol, listed, found, all_vgs
+
+    vol, listed, found, all_vgs = asyncio.run(run())
+    assert vol['id'] in [obj['id'] for obj in listed]
+    assert [s['id'] for s in found] == [snap['id']]
+    assert all(len(vgs) == len(server.array.vgs) for vgs in all_vgs)
+    assert vol['id'] not in server.array.volumes
@@ -0,0 +1,41 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import json
+
+from vexatapi.benchmarks import __main__ as bench
+from vexatapi.benchmarks.scenarios import SCENARIOS, Runner
+
+
+def test_scenarios_run_clean(server):
+    runner = Runner(server.proxy_kwargs(), scheme='http', iterations=3,
+                    workers=4, batch=5)
+    for name in SCENARIOS:
+        result = runner.run(name)
+        assert result['scenario'] == name
+        assert result['calls'] > 0
+        assert result['errors'] == 0, result
+
+
+def test_main_writes_report(tmp_path):
+    output = tmp_path / 'results.json'
+    assert bench.main(['--scenarios', 'list_polling', '--volumes', '10',
+                       '--initiators', '2', '--groups', '2',
+                       '--iterations', '2', '--output', str(output)]) == 0
+    report = json.loads(output.read_text())
+    assert [result['scenario'] for result in report['results']] == [
+        'list_polling']
+    assert report['server']['volumes'] == 10
@@ -0,0 +1,56 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import pytest
+
+from vexatapi.bulk import BulkItemError, BulkProvisioner
+
+
+def test_create_then_delete_volumes(proxy, server):
+    bulk = BulkProvisioner(proxy, max_workers=4)
+    report = bulk.create_volumes(
+        [{'vol_name': 'bulk%d' % i, 'vol_desc': '', 'vol_size_MiB': 1024}
+         for i in range(20)] + [('bulk20', '', 1024)])
+    assert report.ok and len(report.succeeded) == 21
+    vol_ids = [item.result['id'] for item in report.succeeded]
+    assert set(vol_ids) <= set(server.array.volumes)
+    report = bulk.delete_volumes(vol_ids)
+    assert report.ok
+    assert not set(vol_ids) & set(server.array.volumes)
+
+
+def test_abort_and_rollback(proxy, server):
+    vol_id = min(server.array.volumes)
+    snaps_before = set(server.array.snapshots)
+    bulk = BulkProvisioner(proxy, max_workers=1)
+    snaps = [(vol_id, 'snap%d' % i, '') for i in range(3)]
+    snaps.append((999999, 'missing', ''))
+    snaps.extend((vol_id, 'late%d' % i, '') for i in range(3))
+    report = bulk.create_volsnaps(snaps, max_failures=0, rollback=True)
+    assert report.aborted and not report.ok
+    assert [item.index for item in report.failed] == [3]
+    assert isinstance(report.failed[0].error, BulkItemError)
+    assert report.skipped == [4, 5, 6]
+    assert len(report.rolled_back) == 3
+    assert set(server.array.snapshots) == snaps_before
+
+
+def test_malformed_batch_makes_no_call(proxy, server):
+    requests = server.requests
+    with pytest.raises(TypeError):
+        BulkProvisioner(proxy).create_volumes([('v1', '', 1024),
+                                               {'bogus': 1}])
+    assert server.requests == requests
@@ -0,0 +1,50 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import time
+
+from vexatapi.cache import ResponseCache
+
+
+def test_cached_until_write(server):
+    with server.proxy(cache=ResponseCache(ttl=60,
+                                          ttls={'initiators': 0})) as proxy:
+        first = proxy.list_vgs()
+        requests = server.requests
+        assert proxy.list_vgs() == first
+        assert server.requests == requests
+        # A write invalidates the collections it affects
+        vol = proxy.create_volume('v1', '', 1024)
+        proxy.list_volumes()
+        assert server.requests == requests + 2
+        proxy.create_vg('vg_new', '', [vol['id']])
+        assert len(proxy.list_vgs()) == len(first) + 1
+        assert server.requests == requests + 4
+        # TTL of 0, never cached
+        proxy.list_initiators()
+        proxy.list_initiators()
+        assert server.requests == requests + 6
+
+
+def test_ttl_expiry(server):
+    with server.proxy(cache=ResponseCache(ttl=0.2)) as proxy:
+        proxy.list_pgs()
+        requests = server.requests
+        proxy.list_pgs()
+        assert server.requests == requests
+        time.sleep(0.3)
+        proxy.list_pgs()
+        assert server.requests == requests + 1
@@ -0,0 +1,66 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import collections
+
+import numpy
+
+from vexatapi.benchmarks.fake_server import FakeVexataServer
+from vexatapi.capacity import FleetCapacity
+from vexatapi.fleet import VexataFleet
+
+TiB = 2 ** 20
+
+
+def test_fleet_capacity(server):
+    big = FakeVexataServer(volumes=4, vol_size_MiB=TiB, vgs=1, igs=1, pgs=1)
+    down = FakeVexataServer()
+    big.start()
+    down.start()
+    down.stop()
+    try:
+        with VexataFleet(collections.OrderedDict([
+                ('small', server.proxy()), ('big', big.proxy()),
+                ('down', down.proxy(connect_timeout=1))])) as fleet:
+            capacity = FleetCapacity.from_fleet(fleet)
+    finally:
+        big.stop()
+    assert list(capacity.errors) == ['down']
+    report = capacity.arrays()
+    assert list(report['array']) == ['small', 'big']
+    assert list(report['volumes']) == [8, 4]
+    assert list(report['snapshots']) == [8, 0]
+    assert list(report['provisioned_MiB']) == [8 * 1024, 4 * TiB]
+    # VGs of export groups hold every volume of small, none of big
+    assert list(report['exported_MiB']) == [8 * 1024, 0]
+    assert numpy.allclose(report['snapshot_overhead'], [1, 0])
+
+    vgs = capacity.vgs()
+    assert list(vgs['volumes']) == [4, 4, 4]
+    assert list(vgs['snapshot_MiB']) == [4096, 4096, 0]
+    assert list(vgs['export_groups']) == [1, 1, 0]
+    assert list(capacity.egs()['allocated_MiB']) == [4096, 4096]
+
+    top = capacity.snapshot_overhead(top=3)
+    assert len(top['id']) == 3 and set(top['array']) == {'small'}
+
+    growth = capacity.growth(window=1)
+    assert list(growth['provisioned_MiB_per_day']) == [16 * 1024, 4 * TiB]
+    assert numpy.all(growth['days_to_full'] > 0)
+
+    assert capacity.recommend(1024) == 'small'
+    assert capacity.place([TiB, TiB], exclude=['small']) == ['big', 'big']
+    assert capacity.place([64 * TiB]) == [None]
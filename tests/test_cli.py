@@ -0,0 +1,77 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import io
+import json
+
+from vexatapi import cli
+from vexatapi.lite import LiteVexataAPIProxy
+
+
+def _main(server, monkeypatch, capsys, *argv):
+    monkeypatch.setattr(LiteVexataAPIProxy, 'SCHEME', 'http')
+    status = cli.main(['--host', server.host, '--port', str(server.port),
+                       '--user', 'admin', '--password', 'admin',
+                       '--insecure'] + list(argv))
+    out = capsys.readouterr().out
+    return status, [json.loads(line) for line in out.splitlines()]
+
+
+def test_find_volsnap_by_uuid_returns_list(proxy, server):
+    snap = next(iter(server.array.snapshots.values()))
+    found = proxy.find_volsnap_by_uuid(snap['parentVolumeId'],
+                                       snap['voluuid'])
+    assert isinstance(found, list)
+    assert [s['id'] for s in found] == [snap['id']]
+
+
+def test_command_prints_json(server, monkeypatch, capsys):
+    snap = next(iter(server.array.snapshots.values()))
+    status, lines = _main(server, monkeypatch, capsys,
+                          'find_volsnap_by_uuid',
+                          str(snap['parentVolumeId']), snap['voluuid'])
+    assert status == 0
+    assert [[s['id'] for s in line] for line in lines] == [[snap['id']]]
+
+
+def test_iter_command_prints_lines(server, monkeypatch, capsys):
+    status, lines = _main(server, monkeypatch, capsys, 'iter_volumes')
+    assert status == 0
+    # Snapshots are listed along with the volumes
+    assert sorted(vol['id'] for vol in lines) == sorted(
+        list(server.array.volumes) + list(server.array.snapshots))
+
+
+def test_batch(server):
+    snap = next(iter(server.array.snapshots.values()))
+    out = io.StringIO()
+    with server.proxy(LiteVexataAPIProxy, raise_on_error=True) as proxy:
+        failed = cli.Batch(proxy, 4, out).run([
+            '# comment',
+            'create_volume v1 "" 1024',
+            'wait',
+            json.dumps({'method': 'find_volsnap_by_uuid', 'id': 'snap',
+                        'args': [snap['parentVolumeId'],
+                                 snap['voluuid']]}),
+            'delete_volume 999999',
+        ])
+    outcomes = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert failed == 1
+    assert [o['line'] for o in outcomes] == [2, 4, 5]
+    assert outcomes[0]['ok'] and outcomes[0]['result']['name'] == 'v1'
+    assert outcomes[1]['id'] == 'snap'
+    assert [s['id'] for s in outcomes[1]['result']] == [snap['id']]
+    assert not outcomes[2]['ok'] and outcomes[2]['error']
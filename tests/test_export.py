@@ -0,0 +1,99 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+from vexatapi.export import ExportPlanner
+from vexatapi.inventory import Inventory
+
+HOST = ['10:00:00:90:fa:00:00:01', '10:00:00:90:fa:00:00:02']
+
+
+def _methods(steps):
+    return sorted(step.method for step in steps)
+
+
+def _visible(proxy, addr):
+    """Volume ids exported to the initiator of addr."""
+    inv = Inventory.from_proxy(proxy)
+    ini = inv.find_initiator_by_addr(addr)
+    vol_ids = []
+    for eg_id in inv.egs_of_initiator(ini['id']):
+        eg = inv.egs.get(eg_id)
+        vg = inv.vgs.get(eg['exportGroup3Tuple']['vgId'])
+        vol_ids.extend(vg['currVolumes'])
+    return vol_ids
+
+
+def test_export_new_host_and_replan(proxy):
+    vols = [vol['id'] for vol in proxy.list_volumes()
+            if not vol['snapshot']][:3]
+    planner = ExportPlanner(proxy)
+    result = planner.export_volumes(vols, HOST, [1, 3])
+    assert result.ok
+    assert sorted(_visible(proxy, HOST[0])) == sorted(vols)
+    assert planner.plan(vols, HOST, [1, 3]) == []
+
+
+def test_superset_port_group_is_opt_in(proxy):
+    vols = [vol['id'] for vol in proxy.list_volumes()
+            if not vol['snapshot']][:1]
+    inv = Inventory.from_proxy(proxy)
+    # The fixture port groups hold the even and the odd ports
+    assert not any(set(pg['currPorts']) == set([0, 2]) for pg in inv.pgs)
+    planner = ExportPlanner(proxy)
+    steps = planner.plan(vols, HOST, [0, 2], inventory=inv)
+    assert 'create_pg' in _methods(steps)
+    steps = planner.plan(vols, HOST, [0, 2], inventory=inv, wider_pgs=True)
+    assert 'create_pg' not in _methods(steps)
+
+
+def test_shared_vg_volumes_not_exported_twice(proxy):
+    vols = [vol['id'] for vol in proxy.list_volumes()
+            if not vol['snapshot']]
+    planner = ExportPlanner(proxy)
+    assert planner.export_volumes(vols[:2], HOST, [1, 3]).ok
+    inv = Inventory.from_proxy(proxy)
+    ini = inv.find_initiator_by_addr(HOST[0])
+    eg_id, = inv.egs_of_initiator(ini['id'])
+    vg_id = inv.egs.get(eg_id)['exportGroup3Tuple']['vgId']
+    # Another host's export group shares the volume group
+    other_ig = next(iter(inv.igs))
+    other_pg = next(pg for pg in inv.pgs if 0 in pg['currPorts'])
+    proxy.create_eg('other', '', (vg_id, other_ig['id'], other_pg['id']))
+
+    steps = planner.plan(vols[1:3], HOST, [1, 3])
+    assert _methods(steps) == ['create_eg', 'create_vg']
+    create_vg, = [step for step in steps if step.method == 'create_vg']
+    assert create_vg.kwargs['vol_ids'] == [vols[2]]
+    assert planner.export_volumes(vols[1:3], HOST, [1, 3]).ok
+    visible = _visible(proxy, HOST[0])
+    assert sorted(visible) == sorted(vols[:3])
+
+
+def test_new_initiator_extends_existing_ig(proxy):
+    vols = [vol['id'] for vol in proxy.list_volumes()
+            if not vol['snapshot']][:1]
+    planner = ExportPlanner(proxy)
+    assert planner.export_volumes(vols, HOST, [1, 3]).ok
+    inv = Inventory.from_proxy(proxy)
+    ig_id, = [ig['id'] for ig in inv.igs
+              if ig['name'] == ExportPlanner._default_name(HOST) + '_ig']
+    steps = planner.plan(vols, HOST + ['10:00:00:90:fa:00:00:03'], [1, 3])
+    assert _methods(steps) == ['add_initiator', 'modify_ig']
+    modify_ig, = [step for step in steps if step.method == 'modify_ig']
+    assert modify_ig.kwargs['ig_id'] == ig_id
+    assert planner.export_volumes(
+        vols, HOST + ['10:00:00:90:fa:00:00:03'], [1, 3]).ok
+    assert _visible(proxy, '10:00:00:90:fa:00:00:03') == vols
@@ -0,0 +1,42 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+from vexatapi.benchmarks.fake_server import FakeVexataServer
+from vexatapi.exceptions import VexataAPITimeout
+from vexatapi.fleet import VexataFleet
+
+
+def test_map_with_slow_array(server):
+    slow = FakeVexataServer(latency=1.0, volumes=1)
+    slow.start()
+    try:
+        with VexataFleet({'fast': server.proxy(),
+                          'slow': slow.proxy()}) as fleet:
+            results = fleet.map('list_volumes', timeout=0.3)
+            assert list(results) == ['fast', 'slow']
+            assert results['fast'].error is None
+            assert len(results['fast'].result) == len(
+                server.array.volumes) + len(server.array.snapshots)
+            assert isinstance(results['slow'].error, VexataAPITimeout)
+            assert results['slow'].result is None
+            # Callables and array selection
+            names = [res.array for res in fleet.imap(
+                lambda proxy, name: proxy.create_volume(name, '', 1024),
+                'v1', arrays=['fast'])]
+            assert names == ['fast']
+    finally:
+        slow.stop()
+    assert 'v1' in [vol['name'] for vol in server.array.volumes.values()]
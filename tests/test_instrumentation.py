@@ -0,0 +1,52 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+from vexatapi.instrumentation import Instrumentation, Metrics, uri_template
+
+VOLUMES = '/api/storagearrays/{sa_id}/volumes'
+
+
+def test_uri_template():
+    assert uri_template('/api/storagearrays/1/volumes/64/snapshots/65') == (
+        '/api/storagearrays/{sa_id}/volumes/{vol_id}/snapshots/{snap_id}')
+    assert uri_template('/api/mgmtping') == '/api/mgmtping'
+
+
+def test_metrics_of_calls(server):
+    metrics = Metrics()
+    calls = []
+
+    class Recorder(Instrumentation):
+        def before_request(self, array, method, template, attempt):
+            calls.append((method, template, attempt))
+
+    with server.proxy(instrumentation=[metrics, Recorder()]) as proxy:
+        for _ in range(3):
+            proxy.list_volumes()
+        proxy.delete_volume(999999)
+    assert calls[0] == ('GET', VOLUMES, 0)
+    assert len(calls) == 4
+    assert metrics.requests[(server.host, 'GET', VOLUMES, 200)] == 3
+    assert metrics.errors[(server.host, 'DELETE', VOLUMES + '/{vol_id}',
+                           'HTTP404')] == 1
+    assert metrics.quantile(0.5, method='GET') is not None
+    assert metrics.quantile(0.5, array='elsewhere') is None
+    text = metrics.prometheus()
+    assert ('vexatapi_requests_total{array="%s",method="GET",uri="%s",'
+            'status="200"} 3' % (server.host, VOLUMES)) in text
+    assert 'vexatapi_request_duration_seconds_count' in text
+    metrics.reset()
+    assert not metrics.requests
@@ -0,0 +1,59 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+from vexatapi.inventory import Inventory
+
+
+def test_from_proxy_indexes(proxy, server):
+    inv = Inventory.from_proxy(proxy)
+    array = server.array
+    assert len(inv.volumes) == len(array.volumes)
+    assert len(inv.snapshots) == len(array.snapshots)
+    vol = next(iter(array.volumes.values()))
+    assert inv.find_volume_by_uuid(vol['voluuid'])['id'] == vol['id']
+    assert inv.volumes.get(vol['name'], 'name')['id'] == vol['id']
+    snap = next(iter(array.snapshots.values()))
+    assert inv.find_volsnap_by_uuid(snap['voluuid'])['id'] == snap['id']
+    assert snap['id'] in inv.snapshots_of_volume(snap['parentVolumeId'])
+    ini = next(iter(array.initiators.values()))
+    assert inv.find_initiator_by_addr(ini['memberId'])['id'] == ini['id']
+
+
+def test_reverse_lookups(proxy):
+    inv = Inventory.from_proxy(proxy)
+    assert len(inv.egs)
+    for eg in inv.egs:
+        eg_tuple = eg['exportGroup3Tuple']
+        vg = inv.vgs.get(eg_tuple['vgId'])
+        assert eg['id'] in inv.egs_of_vg(vg['id'])
+        assert eg['id'] in inv.egs_of_ig(eg_tuple['igId'])
+        assert eg['id'] in inv.egs_of_pg(eg_tuple['pgId'])
+        for vol_id in vg['currVolumes']:
+            assert vg['id'] in inv.vgs_of_volume(vol_id)
+            assert eg['id'] in inv.egs_of_volume(vol_id)
+        ig = inv.igs.get(eg_tuple['igId'])
+        for ini_id in ig['currInitiators']:
+            assert eg['id'] in inv.egs_of_initiator(ini_id)
+    assert inv.egs_of_volume(-1) == set()
+
+
+def test_collection_add_replace_remove():
+    inv = Inventory(volumes=[{'id': 1, 'name': 'a', 'voluuid': 'u1'}])
+    inv.volumes.add({'id': 1, 'name': 'b', 'voluuid': 'u1'})
+    assert inv.volumes.get('a', 'name') is None
+    assert inv.volumes.get('b', 'name')['id'] == 1
+    assert inv.volumes.remove(1)['name'] == 'b'
+    assert inv.find_volume_by_uuid('u1') is None and len(inv.volumes) == 0
@@ -0,0 +1,55 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+from vexatapi.inventory_store import InventoryStore, StoredInventory
+
+
+def test_warm_start_without_array_calls(proxy, server, tmp_path):
+    path = str(tmp_path / 'inventory.db')
+    with InventoryStore(path) as store:
+        inv = StoredInventory(store, proxy).get()
+    assert len(inv.volumes) == len(server.array.volumes)
+    assert len(inv.snapshots) == len(server.array.snapshots)
+    requests = server.requests
+    # Another process, the stored collections are fresh enough
+    with InventoryStore(path) as store:
+        warm = StoredInventory(store, proxy).get()
+    assert server.requests == requests
+    assert sorted(warm.volumes.ids()) == sorted(inv.volumes.ids())
+    assert warm.egs_of_vg(next(iter(server.array.vgs))) == inv.egs_of_vg(
+        next(iter(server.array.vgs)))
+
+
+def test_update_applies_changes_only(proxy, server, tmp_path):
+    path = str(tmp_path / 'inventory.db')
+    with InventoryStore(path) as writer, InventoryStore(path) as reader:
+        ours = StoredInventory(writer, proxy)
+        theirs = StoredInventory(reader, proxy)
+        ours.get()
+        theirs.update()
+        before = dict(theirs.generations)
+        assert theirs.update() == []
+        vol = proxy.create_volume('v1', '', 1024)
+        gone = min(server.array.initiators)
+        proxy.remove_initiator(gone)
+        assert sorted(writer.refresh(proxy, max_age=0)) == sorted(
+            writer.collections(ours.array))
+        assert theirs.update() == ['initiators', 'volumes']
+        inv = theirs.inventory
+        assert inv.volumes.get(vol['id'])['name'] == 'v1'
+        assert inv.initiators.get(gone) is None
+        assert theirs.generations['volumes'] > before['volumes']
+        assert theirs.generations['vgs'] == before['vgs']
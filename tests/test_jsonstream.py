@@ -0,0 +1,60 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import json
+
+import pytest
+
+from vexatapi.exceptions import VexataAPIStatusError
+from vexatapi.jsonstream import ArrayParser
+from vexatapi.lite import LiteVexataAPIProxy
+
+ITEMS = [{'id': 1, 'name': 'café [1], "x"'}, 12.5, -3, [], None,
+         'a,b]', {'nested': [1, {'k': [2, 3]}]}, True]
+
+
+@pytest.mark.parametrize('size', [1, 2, 7, 1 << 16])
+def test_parser_chunk_boundaries(size):
+    body = json.dumps(ITEMS, indent=1).encode('utf-8')
+    parser = ArrayParser()
+    items = []
+    for i in range(0, len(body), size):
+        items.extend(parser.feed(body[i:i + size]))
+    items.extend(parser.close())
+    assert items == ITEMS
+
+
+@pytest.mark.parametrize('body', [b'[1, 2', b'{"a": 1}', b'[1] [2]',
+                                  b'[1 2]'])
+def test_parser_errors(body):
+    parser = ArrayParser()
+    with pytest.raises(ValueError):
+        parser.feed(body)
+        parser.close()
+
+
+@pytest.mark.parametrize('cls', [None, LiteVexataAPIProxy])
+def test_iter_matches_list(server, monkeypatch, cls):
+    proxy = server.proxy() if cls is None else server.proxy(cls)
+    with proxy:
+        monkeypatch.setattr(proxy, 'STREAM_CHUNK', 64)
+        assert list(proxy.iter_volumes()) == proxy.list_volumes()
+        assert list(proxy.iter_initiators()) == proxy.list_initiators()
+        vol_id = min(server.array.volumes)
+        assert list(proxy.iter_volsnaps(vol_id)) == proxy.list_volsnaps(
+            vol_id)
+        with pytest.raises(VexataAPIStatusError):
+            list(proxy.iter_volsnaps(999999))
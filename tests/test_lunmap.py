@@ -0,0 +1,69 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+from vexatapi.inventory import Inventory
+from vexatapi.lunmap import LunMapCrawler
+
+
+def _expected(inv):
+    """Volume id -> initiator ids seeing it, from the export groups."""
+    seen = {}
+    for eg in inv.egs:
+        eg_tuple = eg['exportGroup3Tuple']
+        ig = inv.igs.get(eg_tuple['igId'])
+        for vol_id in inv.vgs.get(eg_tuple['vgId'])['currVolumes']:
+            seen.setdefault(vol_id, set()).update(ig['currInitiators'])
+    return seen
+
+
+def test_refresh_indexes(proxy):
+    crawler = LunMapCrawler(proxy, max_workers=4)
+    assert crawler.refresh() == {}
+    inv = Inventory.from_proxy(proxy)
+    expected = _expected(inv)
+    assert expected
+    for vol_id, ini_ids in expected.items():
+        assert crawler.initiators_of_volume(vol_id) == ini_ids
+        for path in crawler.paths_of_volume(vol_id):
+            assert path in crawler.paths_of_pair(path.initiator_id,
+                                                 path.saport_id)
+            assert path.port_wwn == inv.saports.get(path.saport_id)['name']
+    for ig in inv.igs:
+        assert crawler.volumes_of_ig(ig['id']) == set(
+            vol_id for vol_id, ini_ids in expected.items()
+            if ini_ids & set(ig['currInitiators']))
+
+
+def test_refresh_fetches_changed_pairs_only(proxy, server):
+    crawler = LunMapCrawler(proxy)
+    crawler.refresh()
+    requests = server.requests
+    crawler.refresh()
+    # Only the four group lists
+    assert server.requests - requests == 4
+    eg = next(iter(server.array.egs.values()))
+    vg = server.array.vgs[eg['exportGroup3Tuple']['vgId']]
+    vol = proxy.create_volume('mapped', '', 1024)
+    proxy.modify_vg(vg['id'], vg['name'], '', add_vol_ids=[vol['id']],
+                    rm_vol_ids=[])
+    requests = server.requests
+    assert crawler.refresh() == {}
+    ig = server.array.igs[eg['exportGroup3Tuple']['igId']]
+    pg = server.array.pgs[eg['exportGroup3Tuple']['pgId']]
+    assert server.requests - requests == 4 + len(
+        ig['currInitiators']) * len(pg['currPorts'])
+    assert crawler.initiators_of_volume(vol['id']) == set(
+        ig['currInitiators'])
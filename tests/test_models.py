@@ -0,0 +1,61 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+from vexatapi import models
+from vexatapi.inventory import Inventory
+
+
+def test_models_equal_raw_dicts(server):
+    with server.proxy() as raw, server.proxy(models=True) as typed:
+        for method in ('list_volumes', 'list_initiators', 'list_saports',
+                       'list_vgs', 'list_igs', 'list_pgs', 'list_egs'):
+            dicts = getattr(raw, method)()
+            objs = getattr(typed, method)()
+            assert objs == dicts, method
+            assert all(isinstance(obj, models.Model) for obj in objs)
+        vols = typed.list_volumes()
+        snaps = [vol for vol in vols if isinstance(vol, models.Snapshot)]
+        assert len(snaps) == len(server.array.snapshots)
+        assert all(snap.parent_volume_id in server.array.volumes
+                   for snap in snaps)
+        vol = vols[0]
+        assert vol['voluuid'] == vol.uuid and vol.get('volSize') == (
+            vol.size_MiB)
+        assert 'createdTime' in vol and vol.extra['createdTime']
+        eg = typed.list_egs()[0]
+        assert eg['exportGroup3Tuple']['vgId'] == eg.vg_id
+        created = typed.create_volume('v1', '', 1024)
+        assert isinstance(created, models.Volume) and created.name == 'v1'
+
+
+def test_inventory_of_models(server):
+    with server.proxy(models=True) as proxy:
+        inv = Inventory.from_proxy(proxy)
+    assert len(inv.volumes) == len(server.array.volumes)
+    assert len(inv.snapshots) == len(server.array.snapshots)
+    for eg in inv.egs:
+        assert eg.id in inv.egs_of_vg(eg.vg_id)
+
+
+def test_decode_passthrough():
+    assert models.decode('/api/mgmtping', {'a': 1}) == {'a': 1}
+    assert models.decode('/api/storagearrays/1/volumes', []) == []
+    mapping = models.decode(
+        '/api/storagearrays/1/initiators/2/ports/3',
+        {'itnId': 7, 'initiatorWwn': 'w1', 'portWwn': 'w2',
+         'volumeMappings': [{'volumeId': 64, 'hostLunId': 0}]})
+    assert list(mapping.volume_ids) == [64]
+    assert mapping['volumeMappings'] == [{'volumeId': 64, 'hostLunId': 0}]
@@ -0,0 +1,54 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import concurrent.futures
+
+import pytest
+
+from vexatapi.exceptions import VexataAPIStatusError
+
+
+def test_calls_share_one_session(proxy, server):
+    vols = proxy.list_volumes()
+    session = proxy._session
+    assert session is not None
+    assert len([vol for vol in vols if not vol.get('snapshot')]) == len(
+        server.array.volumes)
+    vol = proxy.create_volume('v1', 'desc', 1024)
+    assert proxy.grow_volume('v1', 'desc', vol['id'], 2048)['volSize'] == 2048
+    assert proxy.delete_volume(vol['id'])
+    assert proxy._session is session
+    # Usable again after close, with a new pool
+    proxy.close()
+    assert proxy._session is None
+    assert proxy.test_connection()
+    assert proxy._session is not None and proxy._session is not session
+
+
+def test_concurrent_calls(server):
+    with server.proxy(pool_size=4) as proxy:
+        with concurrent.futures.ThreadPoolExecutor(16) as executor:
+            results = list(executor.map(lambda _: proxy.list_vgs(),
+                                         range(64)))
+    assert all(len(vgs) == len(server.array.vgs) for vgs in results)
+
+
+def test_error_status(server):
+    with server.proxy() as proxy:
+        assert proxy.delete_volume(999999) is False
+    with server.proxy(raise_on_error=True) as proxy:
+        with pytest.raises(VexataAPIStatusError):
+            proxy.delete_volume(999999)
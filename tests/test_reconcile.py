@@ -0,0 +1,47 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+from vexatapi.reconcile import Reconciler
+
+SPEC = {
+    'volumes': [
+        {'name': 'db1', 'size_MiB': 1024,
+         'snapshots': [{'name': 'gold'}]},
+        {'name': 'db2', 'size_MiB': 1024,
+         'snapshots': [{'name': 'silver'}]},
+        {'name': 'db1_test', 'clone_of': 'gold'},
+    ],
+}
+
+
+def test_apply_then_nothing_to_do(proxy):
+    rec = Reconciler(proxy)
+    result = rec.apply(SPEC)
+    assert result.ok, result.errors
+    assert rec.plan(SPEC) == []
+
+
+def test_prune_unlisted_snapshots(proxy):
+    rec = Reconciler(proxy)
+    assert rec.apply(SPEC).ok
+    db1 = [vol for vol in proxy.list_volumes() if vol['name'] == 'db1'][0]
+    proxy.create_volsnap(db1['id'], 'extra', '')
+    names = [step.name for step in rec.plan(SPEC, prune=True)]
+    # The volumes of the fake array missing from SPEC go as well
+    assert 'delete_volsnap:db1/extra' in names
+    assert not [name for name in names
+                if name.split(':')[1].startswith(('db1', 'db2'))
+                and name != 'delete_volsnap:db1/extra']
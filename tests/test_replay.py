@@ -0,0 +1,62 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import json
+
+import pytest
+
+from vexatapi.replay import ReplayError, TrafficLog
+from vexatapi.vexata_api_proxy import VexataAPIProxy
+
+
+def _workload(proxy):
+    vol = proxy.create_volume('v1', 'desc', 1024)
+    return vol, proxy.list_vgs(), proxy.delete_volume(999999)
+
+
+@pytest.mark.parametrize('name', ['traffic.jsonl', 'traffic.jsonl.gz'])
+def test_record_then_replay(server, tmp_path, name):
+    path = str(tmp_path / name)
+    with TrafficLog(path, TrafficLog.RECORD) as log:
+        with server.proxy(traffic=log) as proxy:
+            recorded = _workload(proxy)
+    server.stop()
+    with TrafficLog(path, TrafficLog.REPLAY) as log:
+        # Nothing listens there, every response comes from the log
+        proxy = VexataAPIProxy('127.0.0.1', 'admin', 'admin',
+                               mgmt_port=server.port, traffic=log)
+        proxy.SCHEME = 'http'
+        assert _workload(proxy) == recorded
+        # Exhausted responses are served again
+        assert proxy.list_vgs() == recorded[1]
+        with pytest.raises(ReplayError):
+            proxy.list_pgs()
+
+
+def test_replay_follows_recorded_timeline(tmp_path):
+    path = str(tmp_path / 'traffic.jsonl')
+    with open(path, 'w') as f:
+        for uri, start in (('/a', 100.0), ('/b', 100.5)):
+            f.write(json.dumps({'method': 'GET', 'uri': uri, 'data': None,
+                                'start': start, 'elapsed': 0.1,
+                                'status': 200, 'body': '{}'}) + '\n')
+    with TrafficLog(path, TrafficLog.REPLAY, speed=2) as log:
+        assert log.replay('GET', '/a', None)[0] == pytest.approx(0.05)
+        # Sent 0.5s after /a in the recording
+        assert log.replay('GET', '/b', None)[0] == pytest.approx(0.3,
+                                                                 abs=0.02)
+        # Served again past the recording, at the recorded latency
+        assert log.replay('GET', '/a', None)[0] == pytest.approx(0.05)
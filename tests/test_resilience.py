@@ -0,0 +1,134 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import asyncio
+import time
+
+import pytest
+
+from vexatapi import resilience
+from vexatapi.exceptions import CircuitOpenError, VexataAPITimeout
+from vexatapi.resilience import CircuitBreaker, RetryPolicy
+
+
+def test_breaker_opens_and_closes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    time.sleep(0.06)
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_lost_probe_is_replaced():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    # The probe never records its outcome
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_released_probe_is_replaced():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.release_probe()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_survives_cancelled_async_probe(server):
+    from vexatapi.async_api_proxy import AsyncVexataAPIProxy
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.2)
+    breaker.record_failure()
+    time.sleep(0.25)
+    server.latency = 0.5
+
+    async def main():
+        proxy = server.proxy(AsyncVexataAPIProxy, breaker=breaker)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(proxy.sa_info(), 0.05)
+            server.latency = 0
+            return await proxy.sa_info()
+        finally:
+            await proxy.close()
+
+    assert asyncio.run(main())['name'] == 'fake-array'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_ignores_interrupted_call(proxy, monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.2)
+    proxy.breaker = breaker
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(proxy, '_send', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        proxy.sa_info()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+    breaker.record_failure()
+    time.sleep(0.25)
+    # The interrupted probe does not re-open the circuit nor hold the
+    # probe slot
+    with pytest.raises(KeyboardInterrupt):
+        proxy.sa_info()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    monkeypatch.undo()
+    assert proxy.sa_info()['name'] == 'fake-array'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retry_and_deadline(server, proxy):
+    proxy.retry = RetryPolicy(attempts=3, backoff=0.01)
+    assert proxy.list_volumes() is not None
+    server.latency = 0.3
+    with resilience.deadline(0.1):
+        with pytest.raises(VexataAPITimeout):
+            proxy.list_volumes()
@@ -0,0 +1,81 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import time
+
+import pytest
+
+from vexatapi import retention
+from vexatapi.retention import Policy, RetentionScheduler, VOLUME
+
+
+def test_policy_keep_at_least_one():
+    with pytest.raises(ValueError):
+        Policy('none', 3600, 0)
+    with pytest.raises(ValueError):
+        Policy('never', 0, 1)
+    assert Policy('hourly', 3600, 1).keep == 1
+
+
+def test_prune_keeps_latest(proxy, server):
+    vol_id = min(server.array.volumes)
+    policy = Policy('often', 60, 2)
+    sched = RetentionScheduler(proxy)
+    results = [sched._snapshot(VOLUME, vol_id, policy, cycle)
+               for cycle in (1, 2, 3, 4)]
+    assert all(result.error is None for result in results)
+    assert [len(result.pruned) for result in results] == [0, 0, 1, 1]
+    names = sorted(snap['name'] for snap in proxy.list_volsnaps(vol_id)
+                   if snap['name'].startswith('retain-'))
+    assert names == ['retain-vol%d-often-3' % vol_id,
+                     'retain-vol%d-often-4' % vol_id]
+    # Snapshot of a cycle taken already is not taken again
+    again = sched._snapshot(VOLUME, vol_id, policy, 4)
+    assert again.created is None and again.pruned == []
+
+
+def test_missed_cycle_runs_due(proxy, server):
+    vol_id = min(server.array.volumes)
+    policy = Policy('often', 60, 1)
+    sched = RetentionScheduler(proxy)
+    key = sched._key(VOLUME, vol_id, policy.name)
+    cycle = sched._cycle(key, policy, time.time())
+    sched._cycles[key] = cycle - 1
+    sched.protect(VOLUME, vol_id, [policy])
+    results = sched.run_due()
+    assert [(result.cycle, result.error) for result in results] == [
+        (cycle, None)]
+    assert sched._cycles[key] == cycle
+    assert sched.run_due() == []
+
+
+def test_reprotect_reschedules(proxy):
+    sched = RetentionScheduler(proxy)
+    sched.protect(VOLUME, 1, [Policy('p', 86400, 1)])
+    sched.protect(VOLUME, 1, [Policy('p', 10, 3)])
+    # The entry of the first call is superseded, not run on its timing
+    jobs = sched._pop_due(time.time() + 20)
+    assert [job[2] for job in jobs] == [Policy('p', 10, 3)]
+    assert sched._pop_due(time.time() + 2 * 86400) == []
+
+
+def test_unprotect_drops_entries(proxy):
+    sched = RetentionScheduler(proxy)
+    sched.protect(VOLUME, 1, [retention.HOURLY])
+    sched.unprotect(VOLUME, 1)
+    assert sched._pop_due(time.time() + 7200) == []
+    sched.protect(VOLUME, 1, [retention.HOURLY])
+    assert len(sched._pop_due(time.time() + 7200)) == 1
@@ -0,0 +1,87 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from vexatapi.async_api_proxy import AsyncVexataAPIProxy
+from vexatapi.singleflight import SingleFlight
+
+
+def test_concurrent_gets_share_one_request(server):
+    server.latency = 0.2
+    flights = SingleFlight()
+    with server.proxy(coalesce=flights, pool_size=8) as proxy:
+        requests = server.requests
+        barrier = threading.Barrier(8)
+
+        def call(_):
+            barrier.wait()
+            return proxy.list_vgs()
+
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(call, range(8)))
+    assert all(result == results[0] for result in results)
+    assert server.requests - requests < 8
+    assert flights.coalesced == 8 - (server.requests - requests)
+    assert len(flights) == 0
+
+
+def test_error_shared_and_not_cached():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        started.set()
+        release.wait()
+        raise KeyError('boom')
+
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        first = executor.submit(flights.do, 'k', fail)
+        started.wait()
+        second = executor.submit(flights.do, 'k', fail)
+        while not flights.coalesced:
+            time.sleep(0.001)
+        release.set()
+        for future in (first, second):
+            with pytest.raises(KeyError):
+                future.result()
+    assert len(calls) == 1
+    assert flights.do('k', lambda: 42) == 42
+
+
+def test_async_coalescing(server):
+    server.latency = 0.2
+    flights = SingleFlight()
+
+    async def run():
+        async with server.proxy(AsyncVexataAPIProxy,
+                                coalesce=flights) as proxy:
+            return await asyncio.gather(*[proxy.list_igs()
+                                          for _ in range(8)])
+
+    requests = server.requests
+    results = asyncio.run(run())
+    assert all(result == results[0] for result in results)
+    assert server.requests - requests == 1
+    assert flights.coalesced == 7
@@ -0,0 +1,67 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+from vexatapi.exceptions import VexataAPIConnectionError
+from vexatapi.sync import ADDED, MODIFIED, REMOVED, InventorySync
+
+
+def test_poll_events(proxy, server):
+    sync = InventorySync(proxy, collections=('volumes', 'vgs'),
+                         min_interval=1, max_interval=8)
+    received = []
+    sync.subscribe(received.append, collections=('volumes',))
+    first = sync.poll()
+    assert len(first) == (len(server.array.volumes) + len(server.array.vgs)
+                          + len(server.array.snapshots))
+    assert set(event.kind for event in first) == {ADDED}
+    assert sync.poll() == []
+    assert sync.interval > 1
+
+    vol = proxy.create_volume('v1', '', 1024)
+    old_id = min(server.array.volumes)
+    proxy.grow_volume('grown', '', old_id, 4096)
+    gone = max(vol_id for vol_id in server.array.volumes
+               if vol_id != vol['id'])
+    proxy.delete_volume(gone)
+    events = sync.poll()
+    kinds = dict(((event.collection, event.id), event.kind)
+                 for event in events)
+    assert kinds[('volumes', vol['id'])] == ADDED
+    assert kinds[('volumes', old_id)] == MODIFIED
+    assert kinds[('volumes', gone)] == REMOVED
+    assert sync.inventory.volumes.get(old_id)['volSize'] == 4096
+    assert sync.inventory.volumes.get(gone) is None
+    # Subscribers only get the collections they asked for
+    assert all(event.collection == 'volumes'
+               for batch in received for event in batch)
+    assert len(received) == 2
+
+
+def test_poll_skips_failed_collection(proxy, server, monkeypatch):
+    sync = InventorySync(proxy, collections=('volumes', 'vgs'))
+    sync.poll()
+    vgs = sorted(sync.inventory.vgs.ids())
+
+    def unreachable():
+        raise VexataAPIConnectionError('list_vgs: connection refused')
+
+    monkeypatch.setattr(proxy, 'list_vgs', unreachable)
+    server.array.vgs.clear()
+    vol = proxy.create_volume('v1', '', 1024)
+    events = sync.poll()
+    assert [(event.collection, event.id) for event in events] == [
+        ('volumes', vol['id'])]
+    assert sorted(sync.inventory.vgs.ids()) == vgs
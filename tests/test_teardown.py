@@ -0,0 +1,61 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import time
+
+from vexatapi import teardown
+from vexatapi.inventory import Inventory
+from vexatapi.teardown import Teardown, VOLUME
+
+
+def test_created_time_units():
+    now = time.time()
+    for value in (now, int(now * 1000), str(int(now)),
+                  time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now)),
+                  time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(now))):
+        created = teardown._created_time({'createdTime': value})
+        assert abs(created - now) < 1, value
+    for value in (None, '', 'yesterday', 0, -5, float('nan'), True, [1]):
+        assert teardown._created_time({'createdTime': value}) is None
+
+
+def test_sweep_snapshots_by_age(proxy):
+    now = time.time()
+    old = now - 7200
+    created = [old, old * 1000, time.strftime(
+        '%Y-%m-%dT%H:%M:%SZ', time.gmtime(old)), now, now * 1000,
+        'garbage', None]
+    inv = Inventory(
+        volumes=[{'id': 1, 'name': 'vol'}],
+        snapshots=[{'id': 10 + i, 'name': 'snap%d' % i, 'snapshot': True,
+                    'parentVolumeId': 1, 'createdTime': value}
+                   for i, value in enumerate(created)])
+    steps = Teardown(proxy).plan_sweep(inventory=inv, kinds=('snapshots',),
+                                       older_than=3600)
+    assert [step.name for step in steps] == [
+        'delete_volsnap:10', 'delete_volsnap:11', 'delete_volsnap:12']
+
+
+def test_cascade_delete_volume(proxy, server):
+    vol_id = min(server.array.volumes)
+    snaps = [snap['id'] for snap in server.array.snapshots.values()
+             if snap['parentVolumeId'] == vol_id]
+    result = Teardown(proxy).cascade_delete(VOLUME, vol_id)
+    assert result.ok, result.errors
+    assert vol_id not in server.array.volumes
+    assert not set(snaps) & set(server.array.snapshots)
+    for vg in proxy.list_vgs():
+        assert vol_id not in vg['currVolumes']
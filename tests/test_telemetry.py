@@ -0,0 +1,90 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import io
+import math
+
+from vexatapi import telemetry
+from vexatapi.fleet import VexataFleet
+from vexatapi.telemetry import (MAX, Ring, TelemetryCollector,
+                                TelemetryStore)
+
+
+def test_ring_grows_then_wraps():
+    ring = Ring(4)
+    assert len(ring._times) == 0
+    ring.append(1, {'a': 1})
+    ring.append(2, {'a': 2, 'b': 20})
+    # Columns only hold the samples appended so far
+    assert len(ring._times) == len(ring._columns['b']) == 2
+    assert list(ring.column('a')) == [1, 2]
+    assert math.isnan(ring.column('b')[0])
+    for t in range(3, 7):
+        ring.append(t, {'a': t, 'c': t * 100})
+    assert len(ring) == 4 and len(ring._columns['a']) == 4
+    assert list(ring.times()) == [3, 4, 5, 6]
+    assert list(ring.column('a')) == [3, 4, 5, 6]
+    assert list(ring.column('c')) == [300, 400, 500, 600]
+    assert all(math.isnan(value) for value in ring.column('b'))
+
+
+def test_store_rollups_and_max_metrics():
+    store = TelemetryStore(raw_capacity=100, rollups=((10, 10),),
+                           max_metrics=2)
+    for t in range(30):
+        store.add('a1', t, {'x': t, 'y': -t, 'z': 0})
+    assert sorted(store.metrics('a1')) == ['x', 'y']
+    times, values = store.query('a1', 'x', since=10)
+    assert list(times) == list(range(10, 30))
+    # The window of 20-29 is still open
+    times, values = store.query('a1', 'x', window=10, stat=MAX)
+    assert list(times) == [0, 10] and list(values) == [9, 19]
+    out = io.StringIO()
+    store.to_csv(out, 'a1', window=10)
+    assert out.getvalue().splitlines()[0] == 'time,x,y'
+
+
+def test_frame_keeps_colons_in_raw_metric_names():
+    store = TelemetryStore(raw_capacity=10, rollups=((10, 10),))
+    name = 'ports.20:00:00:00.rate'
+    for t in range(20):
+        store.add('a1', t, {name: t})
+    times, columns = store.frame('a1')
+    assert list(columns) == [name] and list(columns[name])[-1] == 19
+    out = io.StringIO()
+    store.to_csv(out, 'a1')
+    assert out.getvalue().splitlines()[:2] == ['time,' + name, '10.0,10.0']
+    times, columns = store.frame('a1', window=10, stat=MAX)
+    assert list(columns) == [name] and list(columns[name]) == [9]
+
+
+def test_collector_samples_fleet(server):
+    fleet = VexataFleet({'a1': server.proxy()})
+    collector = TelemetryCollector(fleet, store=TelemetryStore(
+        raw_capacity=10))
+    try:
+        assert collector.sample() == {}
+        assert collector.sample() == {}
+    finally:
+        fleet.close()
+    metrics = collector.store.metrics('a1')
+    assert 'sensors.temp0.value' in metrics
+    assert 'iocs.1.cpuLoad' in metrics
+    times, values = collector.store.query('a1', 'iocs.1.cpuLoad')
+    assert list(values) == [11, 11]
+    assert telemetry.flatten({'id': 3, 'v': True, 'n': [{'id': 7,
+                                                          'x': 1.5}]}) == {
+        'n.7.x': 1.5}
@@ -0,0 +1,90 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import asyncio
+import time
+
+import pytest
+
+from vexatapi import waiters
+from vexatapi.exceptions import VexataAPITimeout
+from vexatapi.waiters import Waiter, has_fields
+
+
+def _waiter(proxy):
+    return Waiter(proxy, min_interval=0.01, max_interval=0.05)
+
+
+def _wait_stopped(waiter):
+    for _ in range(100):
+        if waiter._thread is None:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_wait_until_state(proxy, server):
+    waiter = _waiter(proxy)
+    vol_id = min(server.array.volumes)
+    server.array.volumes[vol_id]['state'] = 'OFFLINE'
+    vol = waiter.wait_until(has_fields(state='OFFLINE'), 'volumes', vol_id,
+                            timeout=5)
+    assert vol['id'] == vol_id
+    with pytest.raises(VexataAPITimeout):
+        waiter.wait_until(has_fields(state='GONE'), 'volumes', vol_id,
+                          timeout=0.1)
+    assert _wait_stopped(waiter)
+
+
+def test_wait_until_async(proxy, server):
+    waiter = _waiter(proxy)
+    vol_id = min(server.array.volumes)
+
+    async def wait():
+        return await waiter.wait_until_async(
+            lambda vol: vol is not None, 'volumes', vol_id, timeout=5)
+
+    assert asyncio.run(wait())['id'] == vol_id
+
+
+def test_poll_error_fails_waits(proxy, monkeypatch):
+    waiter = _waiter(proxy)
+
+    def poll(collection):
+        raise KeyError(collection)
+
+    monkeypatch.setattr(waiter, '_poll', poll)
+    with pytest.raises(KeyError):
+        waiter.wait_until(lambda vols: True, 'volumes', timeout=5)
+    assert _wait_stopped(waiter)
+    monkeypatch.undo()
+    # A new wait starts a new poller thread
+    assert waiter.wait_until(lambda vols: True, 'volumes', timeout=5)
+
+
+def test_closed_loop_does_not_stop_poller(proxy):
+    waiter = _waiter(proxy)
+
+    async def abandon():
+        # Left pending when asyncio.run() closes the loop
+        waiter._start(waiters._Wait('volumes', None, 'id', lambda vols: True,
+                                    asyncio.get_running_loop()))
+
+    asyncio.run(abandon())
+    start = time.monotonic()
+    assert waiter.wait_until(lambda vols: True, 'volumes', timeout=5)
+    assert time.monotonic() - start < 2
+    assert _wait_stopped(waiter)
@@ -0,0 +1,290 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Client-side admission control of the calls made to an array.
+
+    admission = AdmissionController(rate=50, max_concurrency=8,
+                                    limits={BACKGROUND: 2})
+    proxy = VexataAPIProxy(ip, user, passwd, admission=admission)
+    with priority(BACKGROUND):
+        # Waits behind interactive and monitoring calls
+        proxy.create_volume('vol1', '', 1024)
+
+Every attempt sent to the array takes one token from a token bucket
+(rate per second, up to burst) and one of max_concurrency slots. Calls
+that cannot be admitted right away queue per priority class, classes
+are served in proportion to their weights (start-time fair queueing) so
+that a large batch cannot starve the other classes.
+
+The class of a call is the one set by priority(), if any. Otherwise
+node and management ping calls are MONITORING, other reads INTERACTIVE
+and writes PROVISIONING. Share one controller between all proxies of the
+same array.
+"""
+
+import asyncio
+import collections
+import contextlib
+import contextvars
+import threading
+import time
+
+from vexatapi.exceptions import VexataAPITimeout
+from vexatapi.instrumentation import uri_template
+
+INTERACTIVE = 'interactive'
+PROVISIONING = 'provisioning'
+MONITORING = 'monitoring'
+BACKGROUND = 'background'
+
+_priority = contextvars.ContextVar('vexatapi_priority', default=None)
+
+
+@contextlib.contextmanager
+def priority(cls):
+    """Calls made within the block are of priority class cls."""
+    token = _priority.set(cls)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _Waiter(object):
+    __slots__ = ('cls', 'granted', 'event', 'future', 'loop')
+
+    def __init__(self, cls, loop=None):
+        self.cls = cls
+        self.granted = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+            self.future = None
+        else:
+            self.event = None
+            self.future = loop.create_future()
+
+    def wake(self):
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionController(object):
+    # Share of the array given to each class while they all queue
+    WEIGHTS = {INTERACTIVE: 8, MONITORING: 4, PROVISIONING: 2,
+               BACKGROUND: 1}
+    MAX_CONCURRENCY = 8
+
+    def __init__(self,
+                 rate=None,
+                 burst=None,
+                 max_concurrency=None,
+                 weights=None,
+                 limits=None):
+        """Init method.
+
+        :param rate: Calls per second, None for no rate limit
+        :param burst: Calls that may be sent at once after an idle
+                      period, None to use rate (one second of calls)
+        :param max_concurrency: Max calls in flight, None to use default
+                                (MAX_CONCURRENCY)
+        :param weights: Class -> weight, overrides WEIGHTS
+        :param limits: Class -> max calls in flight of that class
+        """
+        self.rate = rate
+        self.burst = max(1, burst or rate or 1)
+        self.max_concurrency = max_concurrency or self.MAX_CONCURRENCY
+        self.weights = dict(self.WEIGHTS)
+        self.weights.update(weights or {})
+        self.limits = dict(limits or {})
+        self.in_flight = 0
+        self.in_flight_by_class = collections.Counter()
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+        self._queues = dict((cls, collections.deque())
+                            for cls in self.weights)
+        # Virtual start times of the classes, and of the last call
+        # granted, for fair queueing
+        self._vtime = dict((cls, 0.0) for cls in self.weights)
+        self._vclock = 0.0
+        self._lock = threading.Lock()
+
+    def classify(self, method, uri):
+        """Priority class of a call."""
+        cls = _priority.get()
+        if cls is not None:
+            return cls
+        if method != 'GET':
+            return PROVISIONING
+        template = uri_template(uri)
+        if template.startswith('/api/nodes/') or template == '/api/mgmtping':
+            return MONITORING
+        return INTERACTIVE
+
+    def queued(self):
+        """Class -> number of calls waiting."""
+        with self._lock:
+            return dict((cls, len(queue))
+                        for cls, queue in self._queues.items())
+
+    # -----------------------------------------------------------------
+    # Called with the lock held
+    # -----------------------------------------------------------------
+    def _refill(self):
+        if self.rate is None:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _token_delay(self):
+        """Seconds until the next token, None if not rate limited."""
+        if self.rate is None or self._tokens >= 1:
+            return None
+        return (1 - self._tokens) / self.rate
+
+    def _available(self, cls):
+        limit = self.limits.get(cls)
+        return (self.in_flight < self.max_concurrency
+                and (self.rate is None or self._tokens >= 1)
+                and (limit is None or self.in_flight_by_class[cls] < limit))
+
+    def _grant(self, cls):
+        self.in_flight += 1
+        self.in_flight_by_class[cls] += 1
+        if self.rate is not None:
+            self._tokens -= 1
+
+    def _dispatch(self):
+        """Admit queued calls while capacity is available."""
+        self._refill()
+        while True:
+            ready = [cls for cls, queue in self._queues.items()
+                     if queue and self._available(cls)]
+            if not ready:
+                return
+            cls = min(ready, key=self._vtime.get)
+            waiter = self._queues[cls].popleft()
+            self._grant(cls)
+            self._vclock = self._vtime[cls]
+            self._vtime[cls] += 1.0 / self.weights[cls]
+            waiter.wake()
+
+    def _try_acquire(self, cls, loop=None):
+        """Admit the call right away, or return the waiter to wait on."""
+        if cls not in self._queues:
+            raise ValueError('Unknown priority class %r' % cls)
+        self._refill()
+        if not any(self._queues.values()) and self._available(cls):
+            self._grant(cls)
+            return None
+        queue = self._queues[cls]
+        if not queue:
+            # Idle classes do not bank credit
+            self._vtime[cls] = max(self._vtime[cls], self._vclock)
+        waiter = _Waiter(cls, loop)
+        queue.append(waiter)
+        self._dispatch()
+        return waiter
+
+    def _wait_timeout(self, deadline_at):
+        timeout = self._token_delay()
+        if deadline_at is not None:
+            remaining = deadline_at - time.monotonic()
+            timeout = remaining if timeout is None else min(timeout,
+                                                            remaining)
+        return timeout
+
+    def _abandon(self, waiter, method, uri):
+        """Give up waiting past the deadline, unless granted meanwhile."""
+        if waiter.granted:
+            return
+        self._queues[waiter.cls].remove(waiter)
+        raise VexataAPITimeout('%s %s: deadline exceeded waiting for '
+                               'admission' % (method, uri))
+
+    def _cancel(self, waiter):
+        """Withdraw the call of a cancelled task."""
+        if waiter.granted:
+            self.in_flight -= 1
+            self.in_flight_by_class[waiter.cls] -= 1
+            self._dispatch()
+        else:
+            self._queues[waiter.cls].remove(waiter)
+
+    # -----------------------------------------------------------------
+    # Proxy hooks
+    # -----------------------------------------------------------------
+    def acquire(self, method, uri, deadline_at=None):
+        """Wait until the call may be sent, return its ticket.
+
+        :param deadline_at: time.monotonic() deadline of the call,
+                            VexataAPITimeout is raised past it
+        """
+        cls = self.classify(method, uri)
+        with self._lock:
+            waiter = self._try_acquire(cls)
+        while waiter is not None and not waiter.granted:
+            with self._lock:
+                timeout = self._wait_timeout(deadline_at)
+            if timeout is None or timeout > 0:
+                waiter.event.wait(timeout)
+            with self._lock:
+                self._dispatch()
+                if (deadline_at is not None
+                        and time.monotonic() >= deadline_at):
+                    self._abandon(waiter, method, uri)
+        return cls
+
+    async def acquire_async(self, method, uri, deadline_at=None):
+        """Coroutine version of acquire()."""
+        cls = self.classify(method, uri)
+        with self._lock:
+            waiter = self._try_acquire(cls, asyncio.get_running_loop())
+        while waiter is not None and not waiter.granted:
+            with self._lock:
+                timeout = self._wait_timeout(deadline_at)
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future),
+                                           timeout)
+                except asyncio.TimeoutError:
+                    pass
+                except asyncio.CancelledError:
+                    with self._lock:
+                        self._cancel(waiter)
+                    raise
+            with self._lock:
+                self._dispatch()
+                if (deadline_at is not None
+                        and time.monotonic() >= deadline_at):
+                    self._abandon(waiter, method, uri)
+        return cls
+
+    def release(self, ticket):
+        """The call of ticket completed."""
+        with self._lock:
+            self.in_flight -= 1
+            self.in_flight_by_class[ticket] -= 1
+            self._dispatch()
@@ -0,0 +1,304 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Vexata REST API proxy for asyncio.
+
+AsyncVexataAPIProxy exposes the same methods as VexataAPIProxy, each one
+returns an awaitable, except iter_* which return async iterators:
+
+    async with AsyncVexataAPIProxy(ip, user, passwd) as proxy:
+        vols = await proxy.list_volumes()
+        async for vol in proxy.iter_volumes():
+            ...
+
+URI building and response code handling are inherited from
+VexataAPIProxy, only the transport differs.
+"""
+
+import asyncio
+import functools
+import os
+import ssl
+import time
+
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+from vexatapi import resilience
+from vexatapi.exceptions import (VexataAPIConnectionError, VexataAPIError,
+                                 VexataAPIStatusError, VexataAPITimeout)
+from vexatapi.jsonstream import ArrayParser
+from vexatapi.lite import _Response
+from vexatapi.vexata_api_proxy import VexataAPIProxy
+
+
+class _StreamResponse(object):
+    """Response whose body is left to be read, see _send(stream=True)."""
+    __slots__ = ('status_code', 'url', '_rsp')
+
+    def __init__(self, rsp, url):
+        self.status_code = rsp.status
+        self.url = url
+        self._rsp = rsp
+
+    def iter_chunked(self, size):
+        return self._rsp.content.iter_chunked(size)
+
+    async def read(self):
+        """Read the whole body, return it as a _Response."""
+        content = await self._rsp.read()
+        return _Response(self.status_code, content, self.url)
+
+    def close(self):
+        self._rsp.release()
+
+
+class AsyncVexataAPIProxy(VexataAPIProxy):
+
+    def __init__(self, *args, **kwargs):
+        """Init method, takes the same arguments as VexataAPIProxy."""
+        super(AsyncVexataAPIProxy, self).__init__(*args, **kwargs)
+        self._async_session = None
+
+    def __enter__(self):
+        raise TypeError('Use "async with" with %s' % type(self).__name__)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """Close all pooled connections to the array.
+
+        The proxy remains usable, a new pool is created on the next call.
+        """
+        session, self._async_session = self._async_session, None
+        if session is not None:
+            await session.close()
+
+    def _ssl(self):
+        verify = self._verify()
+        if verify is False:
+            return False
+        if verify is True:
+            return None
+        if os.path.isdir(verify):
+            return ssl.create_default_context(capath=verify)
+        return ssl.create_default_context(cafile=verify)
+
+    def _new_async_session(self):
+        # Must be called from within the running event loop.
+        connector = aiohttp.TCPConnector(limit=self.pool_size,
+                                         ssl=self._ssl())
+        timeout = aiohttp.ClientTimeout(sock_connect=self.timeout[0],
+                                        sock_read=self.timeout[1])
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            auth=aiohttp.BasicAuth(self.user, self.passwd))
+
+    async def _send(self, method, uri, data, timeout, stream=False):
+        # No await between the check and the assignment, so this is
+        # race free within the event loop.
+        if self._async_session is None:
+            self._async_session = self._new_async_session()
+        session = self._async_session
+        if method == 'GET':
+            kwargs = {'params': data}
+        else:
+            kwargs = {'json': data}
+        url = self._url(uri)
+        if timeout is not self.timeout:
+            # Shortened by the deadline
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout[1],
+                                                      sock_connect=timeout[0],
+                                                      sock_read=timeout[1])
+        try:
+            if stream:
+                rsp = await session.request(method, url, **kwargs)
+                return _StreamResponse(rsp, url)
+            async with session.request(method, url, **kwargs) as rsp:
+                content = await rsp.read()
+                return _Response(rsp.status, content, url)
+        except asyncio.TimeoutError as e:
+            raise VexataAPITimeout('%s %s: timed out' % (method, uri)) from e
+        except aiohttp.ClientError as e:
+            raise VexataAPIConnectionError('%s %s: %s'
+                                           % (method, uri, e)) from e
+
+    async def _traffic_send(self, method, uri, data, timeout):
+        if self.traffic.replaying:
+            delay, rsp, error = self.traffic.replay(method, uri, data)
+            if delay:
+                await asyncio.sleep(delay)
+            if error is not None:
+                raise error
+            return rsp
+        start, t0 = time.time(), time.perf_counter()
+        rsp = error = None
+        try:
+            rsp = await self._send(method, uri, data, timeout)
+            return rsp
+        except VexataAPIError as e:
+            error = e
+            raise
+        finally:
+            if rsp is not None or error is not None:
+                self.traffic.record(method, uri, data, start,
+                                    time.perf_counter() - t0, rsp, error)
+
+    async def _request(self, method, uri, data=None, stream=False):
+        assert method in ('GET', 'POST', 'PUT', 'DELETE')
+        deadline_at = resilience.deadline_at(self.deadline)
+        attempt = 0
+        while True:
+            ticket = None
+            if self.admission is not None:
+                ticket = await self.admission.acquire_async(method, uri,
+                                                            deadline_at)
+            try:
+                timeout = self._attempt_timeout(method, uri, deadline_at)
+                rsp = error = None
+                if self._instruments:
+                    start = self._before_send(method, uri, attempt)
+                try:
+                    if self.traffic is None:
+                        rsp = await self._send(method, uri, data, timeout,
+                                               stream)
+                    else:
+                        rsp = await self._traffic_send(method, uri, data,
+                                                       timeout)
+                except VexataAPIError as e:
+                    error = e
+                except BaseException:
+                    # Cancelled or interrupted, not an array failure, but
+                    # a half-open breaker would otherwise hold its probe
+                    # slot until reset_timeout.
+                    if self.breaker is not None:
+                        self.breaker.release_probe()
+                    raise
+                if self._instruments:
+                    self._after_send(method, uri, attempt, start, rsp, error,
+                                     stream)
+                delay = self._retry_delay(method, attempt, deadline_at,
+                                          rsp, error)
+            finally:
+                if ticket is not None:
+                    self.admission.release(ticket)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return rsp
+            if rsp is not None:
+                rsp.close()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _get(self, uri, data=None, exp_rsp_code=None):
+        token = None
+        if self.cache is not None:
+            hit, result, token = self.cache.lookup(uri, data)
+            if hit:
+                return result
+        if self.coalesce is None:
+            return await self._fetch(uri, data, exp_rsp_code, token)
+        return await self.coalesce.do_async(
+            self._flight_key(uri, data, exp_rsp_code),
+            functools.partial(self._fetch, uri, data, exp_rsp_code, token),
+            resilience.deadline_at(self.deadline))
+
+    async def _fetch(self, uri, data, exp_rsp_code, token):
+        rsp = await self._request('GET', uri, data)
+        result = self._decode(uri, self._get_result(rsp, exp_rsp_code))
+        if token is not None and result is not None:
+            self.cache.store(uri, data, result, token)
+        return result
+
+    async def _iter(self, uri, data=None, exp_rsp_code=None):
+        if self.cache is not None:
+            hit, result, _ = self.cache.lookup(uri, data)
+            if hit:
+                for item in result:
+                    yield item
+                return
+        rsp = await self._request('GET', uri, data, stream=True)
+        try:
+            streamed = isinstance(rsp, _StreamResponse)
+            if rsp.status_code != (exp_rsp_code or self.GET_OK):
+                if streamed:
+                    rsp = await rsp.read()
+                raise VexataAPIStatusError.from_response(rsp)
+            parser = ArrayParser()
+            if not streamed:
+                # Recorded or replayed, the body was read already
+                for item in parser.feed(rsp.content):
+                    yield self._decode(uri, item)
+            else:
+                try:
+                    async for chunk in rsp.iter_chunked(self.STREAM_CHUNK):
+                        for item in parser.feed(chunk):
+                            yield self._decode(uri, item)
+                except asyncio.TimeoutError as e:
+                    raise VexataAPITimeout('GET %s: timed out' % uri) from e
+                except aiohttp.ClientError as e:
+                    raise VexataAPIConnectionError('GET %s: %s'
+                                                   % (uri, e)) from e
+            for item in parser.close():
+                yield self._decode(uri, item)
+        finally:
+            rsp.close()
+
+    async def _post(self, uri, data, exp_rsp_code=None):
+        try:
+            rsp = await self._request('POST', uri, data=data)
+        finally:
+            self._invalidate(uri)
+        return self._decode(uri, self._post_result(rsp, exp_rsp_code))
+
+    async def _put(self, uri, data, exp_rsp_code=None):
+        try:
+            rsp = await self._request('PUT', uri, data=data)
+        finally:
+            self._invalidate(uri)
+        return self._decode(uri, self._put_result(rsp, exp_rsp_code))
+
+    async def _delete(self, uri, exp_rsp_code=None):
+        try:
+            rsp = await self._request('DELETE', uri)
+        finally:
+            self._invalidate(uri)
+        return self._delete_result(rsp, exp_rsp_code)
+
+    # -----------------------------------------------------------------
+    # Methods that post-process the response need their own coroutine,
+    # all others return the awaitable from _get/_post/_put/_delete as is.
+    # -----------------------------------------------------------------
+    async def test_connection(self):
+        uri = '/api/mgmtping'
+        return (await self._get(uri)) is not None
+
+    async def find_volsnap_by_uuid(self,
+                                   parent_vol_id,
+                                   snap_uuid):
+        uri = ('/api/storagearrays/%(sa_id)d/volumes/%(vol_id)d/snapshots'
+               % {'sa_id': self.SA_ID, 'vol_id': parent_vol_id})
+        rsp = await self._get(uri)
+        return self._match_volsnap_uuid(rsp, snap_uuid)
@@ -0,0 +1,119 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Run the benchmark scenarios and write their results as JSON.
+
+The fake server runs in a child process so that the reported RSS and
+latencies are the client's own.
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import signal
+import sys
+import time
+import warnings
+
+import vexatapi
+from vexatapi.benchmarks.fake_server import FakeVexataServer
+from vexatapi.benchmarks.scenarios import SCENARIOS, Runner
+
+
+def _serve(conn, kwargs):
+    # Exit through the finally clause below on terminate()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    server = FakeVexataServer(**kwargs)
+    conn.send(server.proxy_kwargs())
+    conn.close()
+    try:
+        server.serve_forever()
+    finally:
+        server.stop()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m vexatapi.benchmarks',
+                                     description=__doc__.strip())
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS),
+                        default=list(SCENARIOS),
+                        help='Scenarios to run (default: all)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds added by the server to each response')
+    parser.add_argument('--tls', action='store_true',
+                        help='Serve HTTPS with a self-signed certificate')
+    parser.add_argument('--volumes', type=int, default=1000)
+    parser.add_argument('--snapshots', type=int, default=0,
+                        help='Snapshots per volume')
+    parser.add_argument('--initiators', type=int, default=100)
+    parser.add_argument('--groups', type=int, default=50,
+                        help='Volume, initiator, port and export groups')
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--batch', type=int, default=200,
+                        help='Volumes per bulk batch')
+    parser.add_argument('--output', default='-',
+                        help='JSON output file (default: stdout)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # The proxies do not verify the self-signed certificate of --tls
+    warnings.filterwarnings('ignore', 'Unverified HTTPS request')
+    server_kwargs = {
+        'latency': args.latency, 'tls': args.tls, 'volumes': args.volumes,
+        'snapshots': args.snapshots, 'initiators': args.initiators,
+        'vgs': args.groups, 'igs': args.groups, 'pgs': min(args.groups, 16),
+        'egs': args.groups,
+    }
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=_serve,
+                                     args=(child, server_kwargs))
+    server.daemon = True
+    server.start()
+    try:
+        proxy_kwargs = parent.recv()
+        runner = Runner(proxy_kwargs,
+                        scheme='https' if args.tls else 'http',
+                        iterations=args.iterations, workers=args.workers,
+                        batch=args.batch)
+        results = [runner.run(name) for name in args.scenarios]
+    finally:
+        server.terminate()
+        server.join()
+    report = {
+        'version': vexatapi.version,
+        'python': platform.python_version(),
+        'time': int(time.time()),
+        'server': server_kwargs,
+        'iterations': args.iterations,
+        'workers': args.workers,
+        'batch': args.batch,
+        'results': results,
+    }
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
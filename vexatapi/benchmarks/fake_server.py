@@ -0,0 +1,751 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Stateful fake of the Vexata REST endpoints used by VexataAPIProxy.
+
+    server = FakeVexataServer(latency=0.002, volumes=50000)
+    server.start()
+    proxy = server.proxy()
+    ...
+    server.stop()
+
+Objects are kept in memory and follow the shapes returned by the array,
+including the back-references between volume, initiator, port and export
+groups. It is not a validating model of the array: requests are only
+checked as far as needed to keep its own state consistent.
+"""
+
+import http.server
+import json
+import os
+import re
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+
+from vexatapi.vexata_api_proxy import VexataAPIProxy
+
+SA = r'/api/storagearrays/(?P<sa_id>\d+)'
+NODE = r'/api/nodes/(?P<node_id>\d+)'
+
+
+class _NotFound(Exception):
+    pass
+
+
+class FakeArray(object):
+    """In-memory state of one storage array."""
+
+    def __init__(self, volumes=0, snapshots=0, initiators=0, saports=16,
+                 vgs=0, igs=0, pgs=0, egs=0, vol_size_MiB=1024):
+        """Init method, arguments are the initial collection sizes.
+
+        :param snapshots: Snapshots per volume
+        Groups are populated round-robin from the volumes, initiators and
+        ports, export groups from the VG/IG/PG triplets.
+        """
+        self.lock = threading.Lock()
+        self._next_id = 0
+        self.volumes = {}
+        self.snapshots = {}
+        self.initiators = {}
+        self.saports = {}
+        self.vgs = {}
+        self.vgsnaps = {}
+        self.igs = {}
+        self.pgs = {}
+        self.egs = {}
+        # Encoded list bodies, reset on every write
+        self._bodies = {}
+        for i in range(saports):
+            self.saports[i] = {
+                'id': i, 'state': 'ONLINE', 'nameType': 'WWN',
+                'type': 'FIBRECHANNEL', 'name': self._wwn(0x2000, i)}
+        for i in range(volumes):
+            vol = self.create_volume('vol%d' % i, '', vol_size_MiB)
+            for j in range(snapshots):
+                self.create_volsnap(vol['id'], 'vol%d_snap%d' % (i, j), '')
+        for i in range(initiators):
+            self.add_initiator('ini%d' % i, '', self._wwn(0x1000, i))
+        vol_ids = sorted(self.volumes)
+        ini_ids = sorted(self.initiators)
+        port_ids = sorted(self.saports)
+        for i in range(vgs):
+            self.create_vg('vg%d' % i, '', vol_ids[i::vgs])
+        for i in range(igs):
+            self.create_ig('ig%d' % i, '', ini_ids[i::igs])
+        for i in range(pgs):
+            self.create_pg('pg%d' % i, '', port_ids[i::pgs])
+        vg_ids, ig_ids, pg_ids = sorted(self.vgs), sorted(self.igs), \
+            sorted(self.pgs)
+        for i in range(egs):
+            if not (vg_ids and ig_ids and pg_ids):
+                break
+            self.create_eg('eg%d' % i, '', (vg_ids[i % len(vg_ids)],
+                                            ig_ids[i % len(ig_ids)],
+                                            pg_ids[i % len(pg_ids)]))
+
+    @staticmethod
+    def _wwn(prefix, i):
+        value = '%04x%012x' % (prefix, i)
+        return ':'.join(value[j:j + 2] for j in range(0, 16, 2))
+
+    def _id(self):
+        self._next_id += 1
+        return self._next_id
+
+    def _get(self, objs, obj_id):
+        obj = objs.get(obj_id)
+        if obj is None:
+            raise _NotFound()
+        return obj
+
+    def changed(self):
+        self._bodies.clear()
+
+    def body(self, key, build):
+        """Encoded JSON of a list response, cached until the next write."""
+        body = self._bodies.get(key)
+        if body is None:
+            body = self._bodies[key] = json.dumps(build()).encode()
+        return body
+
+    # -----------------------------------------------------------------
+    # Volumes & snapshots
+    # -----------------------------------------------------------------
+    def create_volume(self, name, desc, size, vol_uuid=None,
+                      parent_id=None):
+        vol = {
+            'id': self._id(), 'name': name, 'description': desc,
+            'volSize': size, 'voluuid': vol_uuid or str(uuid.uuid4()),
+            'snapshot': False, 'state': 'ONLINE',
+            'createdTime': int(time.time()),
+        }
+        if parent_id is not None:
+            vol['parentSnapshotId'] = parent_id
+        self.volumes[vol['id']] = vol
+        return vol
+
+    def create_volsnap(self, vol_id, name, desc, snap_uuid=None):
+        parent = self._get(self.volumes, vol_id)
+        snap = {
+            'id': self._id(), 'name': name, 'description': desc,
+            'volSize': parent['volSize'],
+            'voluuid': snap_uuid or str(uuid.uuid4()),
+            'snapshot': True, 'parentVolumeId': vol_id,
+            'createdTime': int(time.time()),
+        }
+        self.snapshots[snap['id']] = snap
+        return snap
+
+    def delete_volume(self, vol_id):
+        self._get(self.volumes, vol_id)
+        for vg in self.vgs.values():
+            if vol_id in vg['currVolumes']:
+                vg['currVolumes'].remove(vol_id)
+                vg['numOfVols'] = len(vg['currVolumes'])
+        for snap_id in [snap['id'] for snap in self.snapshots.values()
+                        if snap['parentVolumeId'] == vol_id]:
+            del self.snapshots[snap_id]
+        del self.volumes[vol_id]
+
+    # -----------------------------------------------------------------
+    # Initiators
+    # -----------------------------------------------------------------
+    def add_initiator(self, name, desc, addr):
+        ini = {'id': self._id(), 'name': name, 'description': desc,
+               'memberId': addr, 'initiatorType': 'FC'}
+        self.initiators[ini['id']] = ini
+        return ini
+
+    # -----------------------------------------------------------------
+    # Groups
+    # -----------------------------------------------------------------
+    def _group(self, objs, name, desc, members_key, members):
+        group = {'id': self._id(), 'name': name, 'description': desc,
+                 members_key: list(members), 'exportGroups': []}
+        objs[group['id']] = group
+        return group
+
+    def create_vg(self, name, desc, vol_ids):
+        vg = self._group(self.vgs, name, desc, 'currVolumes', vol_ids)
+        vg['numOfVols'] = len(vg['currVolumes'])
+        return vg
+
+    def create_ig(self, name, desc, ini_ids):
+        return self._group(self.igs, name, desc, 'currInitiators', ini_ids)
+
+    def create_pg(self, name, desc, port_ids):
+        return self._group(self.pgs, name, desc, 'currPorts', port_ids)
+
+    @staticmethod
+    def _modify(group, data, members_key, add_key, rm_key):
+        group['name'] = data.get('name', group['name'])
+        group['description'] = data.get('description',
+                                        group['description'])
+        members = group[members_key]
+        for member in data.get(add_key) or ():
+            if member not in members:
+                members.append(member)
+        for member in data.get(rm_key) or ():
+            if member in members:
+                members.remove(member)
+
+    def create_eg(self, name, desc, eg_tuple):
+        vg = self._get(self.vgs, eg_tuple[0])
+        ig = self._get(self.igs, eg_tuple[1])
+        pg = self._get(self.pgs, eg_tuple[2])
+        eg = {'id': self._id(), 'name': name, 'description': desc,
+              'exportGroup3Tuple': {'vgId': vg['id'], 'igId': ig['id'],
+                                    'pgId': pg['id']}}
+        for group in (vg, ig, pg):
+            group['exportGroups'].append(eg['id'])
+        self.egs[eg['id']] = eg
+        return eg
+
+    def delete_eg(self, eg_id):
+        eg = self._get(self.egs, eg_id)
+        eg_tuple = eg['exportGroup3Tuple']
+        for objs, key in ((self.vgs, 'vgId'), (self.igs, 'igId'),
+                          (self.pgs, 'pgId')):
+            group = objs.get(eg_tuple[key])
+            if group is not None and eg_id in group['exportGroups']:
+                group['exportGroups'].remove(eg_id)
+        del self.egs[eg_id]
+
+    def lun_mappings(self, ini_id, port_id):
+        ini = self._get(self.initiators, ini_id)
+        port = self._get(self.saports, port_id)
+        mappings = []
+        for eg in self.egs.values():
+            eg_tuple = eg['exportGroup3Tuple']
+            ig = self.igs.get(eg_tuple['igId'])
+            pg = self.pgs.get(eg_tuple['pgId'])
+            vg = self.vgs.get(eg_tuple['vgId'])
+            if (ig is None or pg is None or vg is None
+                    or ini_id not in ig['currInitiators']
+                    or port_id not in pg['currPorts']):
+                continue
+            for lun, vol_id in enumerate(vg['currVolumes'], 1):
+                mappings.append({'volumeId': vol_id, 'hostLunId': lun})
+        if not mappings:
+            return []
+        return [{'itnId': ini_id * 1024 + port_id,
+                 'initiatorWwn': ini['memberId'],
+                 'portWwn': port['name'],
+                 'volumeMappings': mappings}]
+
+
+class FakeVexataServer(object):
+    """HTTP(S) server serving a FakeArray."""
+
+    def __init__(self, latency=0.0, tls=False, certfile=None, keyfile=None,
+                 host='127.0.0.1', port=0, **sizes):
+        """Init method.
+
+        :param latency: Seconds added to every response
+        :param tls: Serve HTTPS, with a self-signed certificate generated
+                    by the openssl command unless certfile/keyfile given
+        :param certfile, keyfile: PEM certificate and key for TLS
+        :param host, port: Address to listen on, port 0 picks a free one
+        :param sizes: Initial collection sizes, see FakeArray
+        """
+        self.latency = latency
+        self.tls = tls
+        self.array = FakeArray(**sizes)
+        self.requests = 0
+        self._tmpdir = None
+        handler = type('Handler', (_Handler,), {'server_state': self})
+        self.httpd = _HTTPServer((host, port), handler)
+        if tls:
+            if certfile is None:
+                certfile, keyfile = self._self_signed()
+            ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            ctx.load_cert_chain(certfile, keyfile)
+            # Handshake in the handler threads rather than in accept()
+            self.httpd.socket = ctx.wrap_socket(
+                self.httpd.socket, server_side=True,
+                do_handshake_on_connect=False)
+        self.host, self.port = self.httpd.server_address[:2]
+        self._thread = None
+
+    def _self_signed(self):
+        self._tmpdir = tempfile.mkdtemp(prefix='vexata-fake-')
+        certfile = os.path.join(self._tmpdir, 'cert.pem')
+        keyfile = os.path.join(self._tmpdir, 'key.pem')
+        subprocess.check_call(
+            ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+             '-keyout', keyfile, '-out', certfile, '-days', '1',
+             '-subj', '/CN=localhost'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return certfile, keyfile
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever,
+                                        name='vexata-fake-server')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+
+    def proxy_kwargs(self):
+        """VexataAPIProxy arguments to reach this server."""
+        return {'mgmt_ip': self.host, 'mgmt_user': 'admin',
+                'mgmt_passwd': 'admin', 'mgmt_port': self.port,
+                'verify_cert': False}
+
+    def proxy(self, cls=VexataAPIProxy, **kwargs):
+        """Proxy of class cls talking to this server."""
+        args = self.proxy_kwargs()
+        args.update(kwargs)
+        proxy = cls(**args)
+        if not self.tls:
+            proxy.SCHEME = 'http'
+        return proxy
+
+
+class _HTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 overflows under concurrent load, dropped
+    # SYNs are only retransmitted after a second.
+    request_queue_size = 128
+
+
+def _route(method, pattern):
+    def decorator(fn):
+        fn.route = (method, re.compile(pattern + '$'))
+        return fn
+    return decorator
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, without TCP_NODELAY the
+    # second write waits for the delayed ACK of the first.
+    disable_nagle_algorithm = True
+    server_state = None
+    routes = None
+
+    def log_message(self, format, *args):
+        pass
+
+    @classmethod
+    def _routes(cls):
+        if cls.routes is None:
+            routes = []
+            for name in dir(cls):
+                route = getattr(getattr(cls, name), 'route', None)
+                if route is not None:
+                    routes.append(route + (name,))
+            cls.routes = routes
+        return cls.routes
+
+    def _dispatch(self, method):
+        state = self.server_state
+        state.requests += 1
+        if state.latency:
+            time.sleep(state.latency)
+        url = urllib.parse.urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        data = None
+        if length:
+            data = json.loads(self.rfile.read(length))
+        if method == 'GET':
+            data = dict(urllib.parse.parse_qsl(url.query))
+        if 'Authorization' not in self.headers:
+            return self._send(401, {'error': 'Unauthorized'})
+        for route_method, regex, name in self._routes():
+            if route_method != method:
+                continue
+            match = regex.match(url.path)
+            if match is None:
+                continue
+            args = dict((key, int(value))
+                        for key, value in match.groupdict().items())
+            try:
+                with state.array.lock:
+                    code, body = getattr(self, name)(state.array, data,
+                                                     **args)
+                    if method != 'GET':
+                        state.array.changed()
+            except _NotFound:
+                code, body = 404, {'error': 'Not found'}
+            except (KeyError, TypeError, ValueError) as e:
+                code, body = 400, {'error': str(e)}
+            return self._send(code, body)
+        return self._send(404, {'error': 'No such endpoint'})
+
+    def _send(self, code, body):
+        if body is None:
+            payload = b''
+        elif isinstance(body, bytes):
+            payload = body
+        else:
+            payload = json.dumps(body).encode()
+        self.send_response(code)
+        if payload:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    # -----------------------------------------------------------------
+    # Node & array
+    # -----------------------------------------------------------------
+    @_route('GET', r'/api/mgmtping')
+    def mgmtping(self, array, data):
+        return 200, {}
+
+    @_route('GET', NODE)
+    def node(self, array, data, node_id):
+        return 200, {'id': node_id, 'name': 'node%d' % node_id,
+                     'state': 'ONLINE', 'uptime': int(time.monotonic())}
+
+    @_route('GET', NODE + r'/drivegroups')
+    def drivegroups(self, array, data, node_id):
+        return 200, [{'id': i, 'state': 'ONLINE', 'numDrives': 16,
+                      'capacityMiB': 16 * 2 ** 20,
+                      'usedMiB': sum(vol['volSize']
+                                     for vol in array.volumes.values()) // 2}
+                     for i in range(2)]
+
+    @_route('GET', NODE + r'/iocs')
+    def iocs(self, array, data, node_id):
+        return 200, [{'id': i, 'state': 'ONLINE', 'cpuLoad': 10 + i,
+                      'iops': 1000 * (i + 1)} for i in range(2)]
+
+    @_route('GET', NODE + r'/sensors')
+    def sensors(self, array, data, node_id):
+        now = time.time()
+        return 200, [{'id': i, 'name': 'temp%d' % i, 'type': 'TEMPERATURE',
+                      'value': 40 + (now + i) % 5} for i in range(8)]
+
+    @_route('GET', SA)
+    def sa_info(self, array, data, sa_id):
+        return 200, {'id': sa_id, 'name': 'fake-array',
+                     'totalCapacityMiB': 64 * 2 ** 20,
+                     'numVolumes': len(array.volumes)}
+
+    # -----------------------------------------------------------------
+    # Volumes
+    # -----------------------------------------------------------------
+    @_route('GET', SA + r'/volumes')
+    def list_volumes(self, array, data, sa_id):
+        if data.get('uuid'):
+            return 200, [vol for vol in array.volumes.values()
+                         if vol['voluuid'] == data['uuid']]
+        # Snapshots are listed along with the volumes
+        return 200, array.body('volumes',
+                               lambda: (list(array.volumes.values())
+                                        + list(array.snapshots.values())))
+
+    @_route('POST', SA + r'/volumes')
+    def create_volume(self, array, data, sa_id):
+        return 201, array.create_volume(data['name'], data['description'],
+                                        data['volSize'], data.get('voluuid'))
+
+    @_route('PUT', SA + r'/volumes/(?P<vol_id>\d+)')
+    def grow_volume(self, array, data, sa_id, vol_id):
+        vol = array._get(array.volumes, vol_id)
+        if data['volSize'] < vol['volSize']:
+            raise ValueError('Volumes can only grow')
+        vol.update(name=data['name'], description=data['description'],
+                   volSize=data['volSize'])
+        return 200, vol
+
+    @_route('DELETE', SA + r'/volumes/(?P<vol_id>\d+)')
+    def delete_volume(self, array, data, sa_id, vol_id):
+        array.delete_volume(vol_id)
+        return 204, None
+
+    # -----------------------------------------------------------------
+    # Volume snapshots & clones
+    # -----------------------------------------------------------------
+    @_route('GET', SA + r'/volumes/(?P<vol_id>\d+)/snapshots')
+    def list_volsnaps(self, array, data, sa_id, vol_id):
+        array._get(array.volumes, vol_id)
+        return 200, [snap for snap in array.snapshots.values()
+                     if snap['parentVolumeId'] == vol_id]
+
+    @_route('POST', SA + r'/volumes/(?P<vol_id>\d+)/snapshots')
+    def create_volsnap(self, array, data, sa_id, vol_id):
+        return 201, array.create_volsnap(vol_id, data['name'],
+                                         data['description'],
+                                         data.get('voluuid'))
+
+    @_route('DELETE',
+            SA + r'/volumes/(?P<vol_id>\d+)/snapshots/(?P<snap_id>\d+)')
+    def delete_volsnap(self, array, data, sa_id, vol_id, snap_id):
+        snap = array._get(array.snapshots, snap_id)
+        if snap['parentVolumeId'] != vol_id:
+            raise _NotFound()
+        del array.snapshots[snap_id]
+        return 204, None
+
+    @_route('POST', SA + r'/volumes/(?P<vol_id>\d+)/snapshots'
+            r'/(?P<snap_id>\d+)/restore')
+    def restore_volume_from_volsnap(self, array, data, sa_id, vol_id,
+                                    snap_id):
+        array._get(array.volumes, vol_id)
+        array._get(array.snapshots, snap_id)
+        return 204, None
+
+    @_route('POST', SA + r'/snapshots/(?P<snap_id>\d+)/clones')
+    def clone_volsnap_to_new_volume(self, array, data, sa_id, snap_id):
+        snap = array._get(array.snapshots, snap_id)
+        return 201, array.create_volume(data['name'], data['description'],
+                                        snap['volSize'],
+                                        data.get('voluuid'), snap_id)
+
+    # -----------------------------------------------------------------
+    # Initiators, ports & LUN mappings
+    # -----------------------------------------------------------------
+    @_route('GET', SA + r'/initiators')
+    def list_initiators(self, array, data, sa_id):
+        return 200, array.body('initiators',
+                               lambda: list(array.initiators.values()))
+
+    @_route('POST', SA + r'/initiators')
+    def add_initiator(self, array, data, sa_id):
+        return 201, array.add_initiator(data['name'], data['description'],
+                                        data['memberId'])
+
+    @_route('DELETE', SA + r'/initiators/(?P<ini_id>\d+)')
+    def remove_initiator(self, array, data, sa_id, ini_id):
+        array._get(array.initiators, ini_id)
+        del array.initiators[ini_id]
+        return 204, None
+
+    @_route('GET', SA + r'/storagearrayports')
+    def list_saports(self, array, data, sa_id):
+        return 200, list(array.saports.values())
+
+    @_route('GET', SA + r'/initiators/(?P<ini_id>\d+)/ports/(?P<port_id>\d+)')
+    def list_lun_mappings(self, array, data, sa_id, ini_id, port_id):
+        return 200, array.lun_mappings(ini_id, port_id)
+
+    # -----------------------------------------------------------------
+    # Volume groups & VG snapshots
+    # -----------------------------------------------------------------
+    @_route('GET', SA + r'/volumegroups')
+    def list_vgs(self, array, data, sa_id):
+        return 200, array.body('vgs', lambda: list(array.vgs.values()))
+
+    @_route('GET', SA + r'/volumegroups/(?P<vg_id>\d+)')
+    def find_vg_by_id(self, array, data, sa_id, vg_id):
+        return 200, array._get(array.vgs, vg_id)
+
+    @_route('POST', SA + r'/volumegroups')
+    def create_vg(self, array, data, sa_id):
+        for vol_id in data['addVolumes']:
+            array._get(array.volumes, vol_id)
+        return 201, array.create_vg(data['name'], data['description'],
+                                    data['addVolumes'])
+
+    @_route('PUT', SA + r'/volumegroups/(?P<vg_id>\d+)')
+    def modify_vg(self, array, data, sa_id, vg_id):
+        vg = array._get(array.vgs, vg_id)
+        array._modify(vg, data, 'currVolumes', 'addVolumes', 'deleteVolumes')
+        vg['numOfVols'] = len(vg['currVolumes'])
+        return 200, vg
+
+    @_route('DELETE', SA + r'/volumegroups/(?P<vg_id>\d+)')
+    def delete_vg(self, array, data, sa_id, vg_id):
+        vg = array._get(array.vgs, vg_id)
+        if vg['exportGroups']:
+            raise ValueError('Volume group is exported')
+        del array.vgs[vg_id]
+        return 204, None
+
+    @_route('GET', SA + r'/volumegroups/(?P<vg_id>\d+)/snapshots')
+    def list_vgsnaps(self, array, data, sa_id, vg_id):
+        array._get(array.vgs, vg_id)
+        return 200, [snap for snap in array.vgsnaps.values()
+                     if snap['parentVolumeGroupId'] == vg_id]
+
+    @_route('GET',
+            SA + r'/volumegroups/(?P<vg_id>\d+)/snapshots/(?P<snap_id>\d+)')
+    def find_vgsnap_by_id(self, array, data, sa_id, vg_id, snap_id):
+        snap = array._get(array.vgsnaps, snap_id)
+        if snap['parentVolumeGroupId'] != vg_id:
+            raise _NotFound()
+        return 200, snap
+
+    @_route('POST', SA + r'/volumegroups/(?P<vg_id>\d+)/snapshots')
+    def create_vgsnap(self, array, data, sa_id, vg_id):
+        vg = array._get(array.vgs, vg_id)
+        snap_vols = [array.create_volsnap(vol_id, '%s_%d' % (data['name'],
+                                                              vol_id), '')
+                     for vol_id in vg['currVolumes']]
+        snap = {'id': array._id(), 'name': data['name'],
+                'description': data['description'],
+                'parentVolumeGroupId': vg_id, 'exportGroups': [],
+                'currVolumes': [vol['id'] for vol in snap_vols],
+                'numOfVols': len(snap_vols),
+                'createdTime': int(time.time())}
+        array.vgsnaps[snap['id']] = snap
+        return 201, snap
+
+    @_route('DELETE',
+            SA + r'/volumegroups/(?P<vg_id>\d+)/snapshots/(?P<snap_id>\d+)')
+    def delete_vgsnap(self, array, data, sa_id, vg_id, snap_id):
+        snap = array._get(array.vgsnaps, snap_id)
+        if snap['parentVolumeGroupId'] != vg_id:
+            raise _NotFound()
+        for vol_id in snap['currVolumes']:
+            array.snapshots.pop(vol_id, None)
+        del array.vgsnaps[snap_id]
+        return 204, None
+
+    @_route('POST', SA + r'/volumegroups/(?P<vg_id>\d+)/snapshotgroups'
+            r'/(?P<snap_id>\d+)/restorevolumegroup')
+    def restore_vg_from_vgsnap(self, array, data, sa_id, vg_id, snap_id):
+        array._get(array.vgs, vg_id)
+        array._get(array.vgsnaps, snap_id)
+        return 204, None
+
+    @_route('POST', SA + r'/snapshotgroups/(?P<snap_id>\d+)/clones')
+    def clone_vgsnap_to_new_vg(self, array, data, sa_id, snap_id):
+        snap = array._get(array.vgsnaps, snap_id)
+        vols = [array.create_volume('%s_%d' % (data['name'], vol_id), '',
+                                    array.snapshots[vol_id]['volSize'],
+                                    parent_id=vol_id)
+                for vol_id in snap['currVolumes']
+                if vol_id in array.snapshots]
+        return 201, array.create_vg(data['name'], data['description'],
+                                    [vol['id'] for vol in vols])
+
+    # -----------------------------------------------------------------
+    # Initiator, port & export groups
+    # -----------------------------------------------------------------
+    @_route('GET', SA + r'/initiatorgroups')
+    def list_igs(self, array, data, sa_id):
+        return 200, array.body('igs', lambda: list(array.igs.values()))
+
+    @_route('POST', SA + r'/initiatorgroups')
+    def create_ig(self, array, data, sa_id):
+        ig = array.create_ig(data['name'], data['description'],
+                             data['addInitiators'])
+        if data.get('hostProfileType'):
+            ig['hostProfileType'] = data['hostProfileType']
+        return 201, ig
+
+    @_route('PUT', SA + r'/initiatorgroups/(?P<ig_id>\d+)')
+    def modify_ig(self, array, data, sa_id, ig_id):
+        ig = array._get(array.igs, ig_id)
+        array._modify(ig, data, 'currInitiators', 'addInitiators',
+                      'deleteInitiators')
+        return 200, ig
+
+    @_route('DELETE', SA + r'/initiatorgroups/(?P<ig_id>\d+)')
+    def delete_ig(self, array, data, sa_id, ig_id):
+        ig = array._get(array.igs, ig_id)
+        if ig['exportGroups']:
+            raise ValueError('Initiator group is exported')
+        del array.igs[ig_id]
+        return 204, None
+
+    @_route('GET', SA + r'/portgroups')
+    def list_pgs(self, array, data, sa_id):
+        return 200, array.body('pgs', lambda: list(array.pgs.values()))
+
+    @_route('POST', SA + r'/portgroups')
+    def create_pg(self, array, data, sa_id):
+        return 201, array.create_pg(data['name'], data['description'],
+                                    data['addPorts'])
+
+    @_route('PUT', SA + r'/portgroups/(?P<pg_id>\d+)')
+    def modify_pg(self, array, data, sa_id, pg_id):
+        pg = array._get(array.pgs, pg_id)
+        array._modify(pg, data, 'currPorts', 'addPorts', 'deletePorts')
+        return 200, pg
+
+    @_route('DELETE', SA + r'/portgroups/(?P<pg_id>\d+)')
+    def delete_pg(self, array, data, sa_id, pg_id):
+        pg = array._get(array.pgs, pg_id)
+        if pg['exportGroups']:
+            raise ValueError('Port group is exported')
+        del array.pgs[pg_id]
+        return 204, None
+
+    @_route('GET', SA + r'/exportgroups')
+    def list_egs(self, array, data, sa_id):
+        return 200, array.body('egs', lambda: list(array.egs.values()))
+
+    @_route('POST', SA + r'/exportgroups')
+    def create_eg(self, array, data, sa_id):
+        eg_tuple = data['exportGroup3Tuple']
+        return 201, array.create_eg(data['name'], data['description'],
+                                    (eg_tuple['vgId'], eg_tuple['igId'],
+                                     eg_tuple['pgId']))
+
+    @_route('PUT', SA + r'/exportgroups/(?P<eg_id>\d+)')
+    def modify_eg(self, array, data, sa_id, eg_id):
+        eg = array._get(array.egs, eg_id)
+        eg_tuple = data['exportGroup3Tuple']
+        array.delete_eg(eg_id)
+        new = array.create_eg(data['name'], data['description'],
+                              (eg_tuple['vgId'], eg_tuple['igId'],
+                               eg_tuple['pgId']))
+        # Keep the id of the modified export group
+        del array.egs[new['id']]
+        for objs, key in ((array.vgs, 'vgId'), (array.igs, 'igId'),
+                          (array.pgs, 'pgId')):
+            groups = objs[new['exportGroup3Tuple'][key]]['exportGroups']
+            groups[groups.index(new['id'])] = eg['id']
+        new['id'] = eg['id']
+        array.egs[eg['id']] = new
+        return 200, new
+
+    @_route('DELETE', SA + r'/exportgroups/(?P<eg_id>\d+)')
+    def delete_eg(self, array, data, sa_id, eg_id):
+        array.delete_eg(eg_id)
+        return 204, None
@@ -0,0 +1,219 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark scenarios.
+
+A scenario is a function taking a Runner, making its calls through
+runner.proxy() and returning nothing. Runner.run() times it and reports
+the latency of every request sent, as recorded by the proxy
+instrumentation hooks.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import math
+import resource
+import threading
+import time
+
+from vexatapi.async_api_proxy import AsyncVexataAPIProxy, HAS_AIOHTTP
+from vexatapi.bulk import BulkProvisioner
+from vexatapi.instrumentation import Instrumentation
+from vexatapi.vexata_api_proxy import VexataAPIProxy
+
+SCENARIOS = collections.OrderedDict()
+
+
+def scenario(fn):
+    SCENARIOS[fn.__name__] = fn
+    return fn
+
+
+def rss_kb():
+    """Current resident set size of this process in KiB, None if unknown."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * resource.getpagesize() // 1024
+
+
+def percentile(values, q):
+    """q-th percentile (0-100) of sorted values, nearest rank."""
+    if not values:
+        return None
+    rank = max(1, int(math.ceil(q / 100.0 * len(values))))
+    return values[rank - 1]
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+class Recorder(Instrumentation):
+    """Keeps the latency of every request."""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def after_request(self, array, method, template, attempt,
+                      elapsed, status_code, size, error):
+        with self._lock:
+            self.latencies.append(elapsed)
+            if error is not None or status_code >= 400:
+                self.errors += 1
+
+
+class Runner(object):
+    """Runs scenarios against one (fake) array."""
+
+    def __init__(self, proxy_kwargs, scheme='https', iterations=100,
+                 workers=16, batch=200):
+        """Init method.
+
+        :param proxy_kwargs: VexataAPIProxy arguments to reach the array
+        :param scheme: URL scheme of the array, 'http' for a fake server
+                       without TLS
+        :param iterations: Rounds of the polling and churn scenarios
+        :param workers: Threads (or asyncio tasks) of the load scenarios
+        :param batch: Volumes created per bulk batch
+        """
+        self.proxy_kwargs = proxy_kwargs
+        self.scheme = scheme
+        self.iterations = iterations
+        self.workers = workers
+        self.batch = batch
+        self.recorder = None
+
+    def proxy(self, cls=VexataAPIProxy, **kwargs):
+        args = dict(self.proxy_kwargs)
+        args.update(kwargs)
+        args['instrumentation'] = self.recorder
+        proxy = cls(**args)
+        proxy.SCHEME = self.scheme
+        return proxy
+
+    def run(self, name):
+        """Run scenario name, return its results as a dict."""
+        self.recorder = Recorder()
+        start = time.perf_counter()
+        SCENARIOS[name](self)
+        seconds = time.perf_counter() - start
+        latencies = sorted(self.recorder.latencies)
+        return collections.OrderedDict([
+            ('scenario', name),
+            ('calls', len(latencies)),
+            ('errors', self.recorder.errors),
+            ('seconds', round(seconds, 3)),
+            ('calls_per_sec', round(len(latencies) / seconds, 1)),
+            ('p50_ms', _ms(percentile(latencies, 50))),
+            ('p99_ms', _ms(percentile(latencies, 99))),
+            ('rss_kb', rss_kb()),
+            # ru_maxrss is in KiB on Linux
+            ('rss_peak_kb',
+             resource.getrusage(resource.RUSAGE_SELF).ru_maxrss),
+        ])
+
+
+@scenario
+def list_polling(runner):
+    """Poll every collection, as monitoring and inventory refreshes do."""
+    with runner.proxy() as proxy:
+        for _ in range(runner.iterations):
+            proxy.list_volumes()
+            proxy.list_initiators()
+            proxy.list_saports()
+            proxy.list_vgs()
+            proxy.list_igs()
+            proxy.list_pgs()
+            proxy.list_egs()
+
+
+@scenario
+def bulk_create_delete(runner):
+    """Create then delete a batch of volumes with BulkProvisioner."""
+    with runner.proxy(pool_size=runner.workers) as proxy:
+        bulk = BulkProvisioner(proxy, max_workers=runner.workers)
+        report = bulk.create_volumes(
+            [{'vol_name': 'bench%d' % i, 'vol_desc': '',
+              'vol_size_MiB': 1024} for i in range(runner.batch)])
+        bulk.delete_volumes([item.result['id']
+                             for item in report.succeeded])
+
+
+@scenario
+def snapshot_churn(runner):
+    """Snapshot, list and delete snapshots of a single volume."""
+    with runner.proxy() as proxy:
+        vol = proxy.create_volume('bench_churn', '', 1024)
+        for i in range(runner.iterations):
+            snap = proxy.create_volsnap(vol['id'], 'churn%d' % i, '')
+            proxy.list_volsnaps(vol['id'])
+            proxy.delete_volsnap(vol['id'], snap['id'])
+        proxy.delete_volume(vol['id'])
+
+
+def _read_calls(proxy, vol_ids, i):
+    proxy.list_volsnaps(vol_ids[i % len(vol_ids)])
+    proxy.list_egs()
+    proxy.sa_info()
+
+
+def _sample_vol_ids(proxy, count=100):
+    vols = proxy.list_volumes() or []
+    vol_ids = [vol['id'] for vol in vols if not vol.get('snapshot')]
+    if not vol_ids:
+        vol_ids = [proxy.create_volume('bench_load', '', 1024)['id']]
+    return vol_ids[:count]
+
+
+@scenario
+def threaded_load(runner):
+    """Small reads from many threads sharing one proxy."""
+    with runner.proxy(pool_size=runner.workers) as proxy:
+        vol_ids = _sample_vol_ids(proxy)
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=runner.workers) as executor:
+            list(executor.map(
+                lambda i: _read_calls(proxy, vol_ids, i),
+                range(runner.iterations * runner.workers)))
+
+
+if HAS_AIOHTTP:
+    @scenario
+    def async_load(runner):
+        """Small reads from many asyncio tasks sharing one proxy."""
+        with runner.proxy() as proxy:
+            vol_ids = _sample_vol_ids(proxy)
+
+        async def worker(proxy, first):
+            for i in range(first, first + runner.iterations):
+                await proxy.list_volsnaps(vol_ids[i % len(vol_ids)])
+                await proxy.list_egs()
+                await proxy.sa_info()
+
+        async def main():
+            async with runner.proxy(AsyncVexataAPIProxy,
+                                    pool_size=runner.workers) as proxy:
+                await asyncio.gather(*[
+                    worker(proxy, i * runner.iterations)
+                    for i in range(runner.workers)])
+
+        asyncio.run(main())
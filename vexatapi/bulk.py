@@ -0,0 +1,225 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Bulk provisioning on a single Vexata array.
+
+    bulk = BulkProvisioner(proxy, max_workers=16)
+    report = bulk.create_volumes(
+        [{'vol_name': 'vol%d' % i, 'vol_desc': '', 'vol_size_MiB': 1024}
+         for i in range(500)],
+        max_failures=10, rollback=True)
+    ids = [item.result['id'] for item in report.succeeded]
+"""
+
+import collections
+import concurrent.futures
+import inspect
+
+from vexatapi.exceptions import VexataAPIError
+
+
+BulkItem = collections.namedtuple('BulkItem',
+                                  ['index', 'request', 'result', 'error'])
+BulkItem.__doc__ = """Outcome of one item of a batch.
+
+:param index: Position of the item in the batch
+:param request: Arguments of the call, by parameter name
+:param result: Return value of the call, None on error
+:param error: Exception describing the failure, None on success
+"""
+
+
+class BulkItemError(VexataAPIError):
+    """Array call reported failure (returned None/False)."""
+
+
+class BulkReport(object):
+    """Per-item outcome of a batch."""
+
+    def __init__(self, size):
+        self.items = [None] * size
+        self.aborted = False
+        self.rolled_back = []
+
+    @property
+    def succeeded(self):
+        return [item for item in self.items
+                if item is not None and item.error is None]
+
+    @property
+    def failed(self):
+        return [item for item in self.items
+                if item is not None and item.error is not None]
+
+    @property
+    def skipped(self):
+        """Indexes of items not attempted because the batch aborted."""
+        return [i for i, item in enumerate(self.items) if item is None]
+
+    @property
+    def ok(self):
+        return not self.aborted and not self.failed
+
+
+class BulkProvisioner(object):
+    MAX_WORKERS = 8
+
+    def __init__(self, proxy, max_workers=None):
+        """Init method.
+
+        :param proxy: VexataAPIProxy of the array
+        :param max_workers: Max calls in flight, None to use default
+                            (MAX_WORKERS). Should not exceed the proxy
+                            pool_size.
+        """
+        self.proxy = proxy
+        self.max_workers = max_workers or self.MAX_WORKERS
+
+    @staticmethod
+    def _bind(method, requests):
+        """Bind each request to method's parameters.
+
+        A request is a dict of keyword arguments, a tuple/list of
+        positional arguments or a single positional argument. Binding up
+        front rejects malformed batches before any call is made.
+        """
+        sig = inspect.signature(method)
+        bound = []
+        for req in requests:
+            if isinstance(req, dict):
+                args = sig.bind(**req)
+            elif isinstance(req, (tuple, list)):
+                args = sig.bind(*req)
+            else:
+                args = sig.bind(req)
+            bound.append(dict(args.arguments))
+        return bound
+
+    @staticmethod
+    def _call(method, request):
+        try:
+            result = method(**request)
+        except Exception as e:
+            return None, e
+        if result is None or result is False:
+            return None, BulkItemError('%s(%r) failed'
+                                       % (method.__name__, request))
+        return result, None
+
+    def _run(self, method, requests, undo=None,
+             max_failures=None, rollback=False):
+        requests = self._bind(method, requests)
+        report = BulkReport(len(requests))
+        failures = 0
+        todo = iter(enumerate(requests))
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers) as executor:
+            pending = {}
+
+            def submit():
+                for index, request in todo:
+                    future = executor.submit(self._call, method, request)
+                    pending[future] = (index, request)
+                    return
+
+            for _ in range(self.max_workers):
+                submit()
+            while pending:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    index, request = pending.pop(future)
+                    result, error = future.result()
+                    report.items[index] = BulkItem(index, request,
+                                                   result, error)
+                    if error is not None:
+                        failures += 1
+                    if max_failures is not None and failures > max_failures:
+                        report.aborted = True
+                    if not report.aborted:
+                        submit()
+
+            if report.aborted and rollback and undo is not None:
+                futures = [executor.submit(self._call, undo,
+                                           {'request': item.request,
+                                            'result': item.result})
+                           for item in report.succeeded]
+                for item, future in zip(report.succeeded, futures):
+                    result, error = future.result()
+                    report.rolled_back.append(
+                        BulkItem(item.index, item.request, result, error))
+        return report
+
+    # -----------------------------------------------------------------
+    # Undo operations for rollback, called as undo(request, result)
+    # -----------------------------------------------------------------
+    def _undo_create_volume(self, request, result):
+        return self.proxy.delete_volume(result['id'])
+
+    def _undo_create_volsnap(self, request, result):
+        return self.proxy.delete_volsnap(request['parent_vol_id'],
+                                         result['id'])
+
+    # -----------------------------------------------------------------
+    # Bulk operations
+    #
+    # max_failures: abort the batch once more items than this have
+    #     failed, None to always run the whole batch
+    # rollback: undo the items that succeeded if the batch aborted
+    # -----------------------------------------------------------------
+    def create_volumes(self, vols, max_failures=None, rollback=False):
+        """Create volumes.
+
+        :param vols: create_volume() arguments, one request per volume
+        """
+        return self._run(self.proxy.create_volume, vols,
+                         undo=self._undo_create_volume,
+                         max_failures=max_failures, rollback=rollback)
+
+    def delete_volumes(self, vol_ids, max_failures=None):
+        """Delete volumes, cannot be rolled back.
+
+        :param vol_ids: delete_volume() arguments, one request per volume
+        """
+        return self._run(self.proxy.delete_volume, vol_ids,
+                         max_failures=max_failures)
+
+    def create_volsnaps(self, snaps, max_failures=None, rollback=False):
+        """Create volume snapshots.
+
+        :param snaps: create_volsnap() arguments, one request per snapshot
+        """
+        return self._run(self.proxy.create_volsnap, snaps,
+                         undo=self._undo_create_volsnap,
+                         max_failures=max_failures, rollback=rollback)
+
+    def delete_volsnaps(self, snaps, max_failures=None):
+        """Delete volume snapshots, cannot be rolled back.
+
+        :param snaps: delete_volsnap() arguments, one request per snapshot
+        """
+        return self._run(self.proxy.delete_volsnap, snaps,
+                         max_failures=max_failures)
+
+    def clone_volsnaps(self, clones, max_failures=None, rollback=False):
+        """Clone volume snapshots to new volumes.
+
+        :param clones: clone_volsnap_to_new_volume() arguments, one
+                       request per clone
+        """
+        return self._run(self.proxy.clone_volsnap_to_new_volume, clones,
+                         undo=self._undo_create_volume,
+                         max_failures=max_failures, rollback=rollback)
@@ -0,0 +1,147 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Read cache for storage array collections.
+
+    proxy = VexataAPIProxy(ip, user, passwd,
+                           cache=ResponseCache(ttl=5, ttls={'volumes': 2}))
+
+GET responses under /api/storagearrays/<sa_id>/<collection> are cached per
+collection with a TTL and LRU eviction. Writes through the same proxy
+invalidate the collections they can affect, so reads never return data
+older than the proxy's own writes. Cached results are shared between
+callers and must be treated as read-only.
+"""
+
+import collections
+import threading
+import time
+
+
+class ResponseCache(object):
+    TTL = 5
+    MAX_ENTRIES = 256
+    # Collections to invalidate on a write to a collection. A write also
+    # changes back-references held by other objects, e.g. creating an EG
+    # updates the 'exportGroups' of its VG, IG and PG.
+    INVALIDATES = {
+        'volumes': ('volumes', 'volumegroups'),
+        'snapshots': ('volumes',),
+        'volumegroups': ('volumegroups', 'volumes'),
+        'snapshotgroups': ('volumegroups', 'volumes'),
+        'initiators': ('initiators', 'initiatorgroups'),
+        'initiatorgroups': ('initiatorgroups', 'initiators'),
+        'portgroups': ('portgroups', 'storagearrayports'),
+        'storagearrayports': ('storagearrayports', 'portgroups'),
+        'exportgroups': ('exportgroups', 'volumegroups', 'initiatorgroups',
+                         'portgroups', 'initiators'),
+    }
+
+    def __init__(self, ttl=None, ttls=None, max_entries=None):
+        """Init method.
+
+        :param ttl: Seconds to keep a cached collection, None to use
+                    default (TTL)
+        :param ttls: Dict of collection -> TTL overriding ttl, e.g.
+                     {'volumes': 2, 'storagearrayports': 60}. A TTL of
+                     0 disables caching of that collection.
+        :param max_entries: Max cached responses, None to use default
+                            (MAX_ENTRIES)
+        """
+        self.ttl = self.TTL if ttl is None else ttl
+        self.ttls = dict(ttls or {})
+        self.max_entries = max_entries or self.MAX_ENTRIES
+        self._entries = collections.OrderedDict()
+        self._generations = collections.defaultdict(int)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def collection(uri):
+        """Collection a URI belongs to, None if not a collection URI."""
+        parts = uri.split('/')
+        # ['', 'api', 'storagearrays', '<sa_id>', '<collection>', ...]
+        if len(parts) > 4 and parts[2] == 'storagearrays':
+            return parts[4]
+        return None
+
+    @staticmethod
+    def _key(uri, params):
+        if params:
+            return uri, tuple(sorted(params.items()))
+        return uri, None
+
+    def _ttl(self, name):
+        return self.ttls.get(name, self.ttl)
+
+    def lookup(self, uri, params=None):
+        """Look up a GET response.
+
+        Returns (hit, value, token), token must be passed to store() once
+        the response has been fetched from the array.
+        """
+        name = self.collection(uri)
+        if name is None or not self._ttl(name):
+            return False, None, None
+        key = self._key(uri, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return True, value, None
+                del self._entries[key]
+            return False, None, (name, self._generations[name])
+
+    def store(self, uri, params, value, token):
+        """Cache a GET response.
+
+        Dropped if the collection was invalidated since the lookup() that
+        returned token, the response may predate that write.
+        """
+        if token is None:
+            return
+        name, generation = token
+        key = self._key(uri, params)
+        with self._lock:
+            if self._generations[name] != generation:
+                return
+            self._entries[key] = (time.monotonic() + self._ttl(name), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, uri):
+        """Invalidate the collections affected by a write to uri."""
+        name = self.collection(uri)
+        if name is None:
+            return
+        names = set(self.INVALIDATES.get(name, (name,)))
+        with self._lock:
+            for affected in names:
+                self._generations[affected] += 1
+            for key in [key for key in self._entries
+                        if self.collection(key[0]) in names]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            for name in list(self._generations):
+                self._generations[name] += 1
+            self._entries.clear()
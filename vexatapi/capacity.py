@@ -0,0 +1,436 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Capacity analytics of a fleet of arrays, on numpy columns.
+
+    capacity = FleetCapacity.from_fleet(fleet)
+    report = capacity.arrays()
+    for name, ratio in zip(report['array'], report['overprovisioning']):
+        print(name, ratio)
+    name = capacity.recommend(10240)
+
+The list_volumes(), list_vgs(), list_egs(), sa_info() and drivegroups()
+responses of every array are loaded once into columns, one row per
+volume, VG member, export group or array. Reports are computed with
+vectorized numpy operations, without Python loops over the volumes, and
+return dicts of column name -> numpy array, in the row order of the
+report.
+
+Sizes are in MiB. Physical capacity and usage are those of the drive
+groups. Snapshot sizes are the logical sizes reported by the array, an
+upper bound of the space snapshots hold. Requires numpy.
+"""
+
+import collections
+import itertools
+import logging
+import time
+
+try:
+    import numpy
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+LOG = logging.getLogger(__name__)
+
+# Proxy methods whose responses are analyzed
+SOURCES = ('list_volumes', 'list_vgs', 'list_egs', 'sa_info', 'drivegroups')
+
+# Bits of the id in the (array, id) keys of the lookups
+_ID_BITS = 40
+
+
+def fetch(proxy):
+    """Dict of method -> response of the SOURCES methods of an array."""
+    return dict((method, getattr(proxy, method)()) for method in SOURCES)
+
+
+def _column(items, key, dtype, default):
+    return numpy.fromiter((default if item.get(key) is None else item[key]
+                           for item in items), dtype, len(items))
+
+
+def _ratio(num, den):
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return num / den
+
+
+class _Keys(object):
+    """Row lookup by (array index, id), vectorized."""
+
+    def __init__(self, array_idx, ids):
+        keys = (array_idx.astype(numpy.int64) << _ID_BITS) | ids
+        self._order = numpy.argsort(keys, kind='stable')
+        self._keys = keys[self._order]
+
+    def rows(self, array_idx, ids):
+        """Rows of the (array_idx, ids) pairs, -1 where not found."""
+        keys = (array_idx.astype(numpy.int64) << _ID_BITS) | ids
+        if not len(self._keys):
+            return numpy.full(len(keys), -1, numpy.int64)
+        pos = numpy.minimum(numpy.searchsorted(self._keys, keys),
+                            len(self._keys) - 1)
+        found = (self._keys[pos] == keys) & (ids >= 0)
+        return numpy.where(found, self._order[pos], -1)
+
+
+class FleetCapacity(object):
+    # Growth projections look at the volumes created this many days back
+    GROWTH_WINDOW = 30
+    # Days ahead of the projected utilization
+    HORIZON = 90
+    # Highest projected utilization of the physical capacity for
+    # recommend()
+    MAX_UTILIZATION = 0.9
+
+    def __init__(self, arrays):
+        """Init method.
+
+        :param arrays: Dict of array name -> dict of method -> response of
+                       the SOURCES methods of the array, see fetch(). A
+                       missing or None response counts as unknown.
+        """
+        if not HAS_NUMPY:
+            raise RuntimeError('numpy is required for capacity analytics')
+        self.names = list(arrays)
+        self.errors = {}
+        n_arrays = len(self.names)
+        responses = [arrays[name] for name in self.names]
+        # Arrays whose responses are all known, the others are never
+        # recommended
+        self.complete = numpy.fromiter(
+            (all(rsp.get(method) is not None for method in SOURCES)
+             for rsp in responses), bool, n_arrays)
+
+        def rows(method):
+            lists = [rsp.get(method) or () for rsp in responses]
+            counts = numpy.fromiter(map(len, lists), numpy.int64, n_arrays)
+            return (list(itertools.chain.from_iterable(lists)),
+                    numpy.repeat(numpy.arange(n_arrays), counts))
+
+        # Volumes and snapshots
+        vols, self.vol_array = rows('list_volumes')
+        self.vol_id = _column(vols, 'id', numpy.int64, -1)
+        self.vol_name = numpy.array([vol.get('name') for vol in vols],
+                                    dtype=object)
+        self.vol_size = _column(vols, 'volSize', numpy.float64, 0)
+        self.vol_snapshot = _column(vols, 'snapshot', bool, False)
+        self.vol_created = _column(vols, 'createdTime', numpy.float64,
+                                   numpy.nan)
+        self._vol_keys = _Keys(self.vol_array, self.vol_id)
+        # Row of the parent volume of snapshots, -1 for volumes
+        self.vol_parent = self._vol_keys.rows(
+            self.vol_array, _column(vols, 'parentVolumeId', numpy.int64, -1))
+
+        # Volume groups, and their members as (VG row, volume row) pairs
+        vgs, self.vg_array = rows('list_vgs')
+        self.vg_id = _column(vgs, 'id', numpy.int64, -1)
+        self.vg_name = numpy.array([vg.get('name') for vg in vgs],
+                                   dtype=object)
+        members = [vg.get('currVolumes') or () for vg in vgs]
+        counts = numpy.fromiter(map(len, members), numpy.int64, len(vgs))
+        self.member_vg = numpy.repeat(numpy.arange(len(vgs)), counts)
+        self.member_vol = self._vol_keys.rows(
+            self.vg_array[self.member_vg],
+            numpy.fromiter(itertools.chain.from_iterable(members),
+                           numpy.int64, int(counts.sum())))
+        self._vg_keys = _Keys(self.vg_array, self.vg_id)
+
+        # Export groups, with the row of their VG
+        egs, self.eg_array = rows('list_egs')
+        self.eg_id = _column(egs, 'id', numpy.int64, -1)
+        self.eg_name = numpy.array([eg.get('name') for eg in egs],
+                                   dtype=object)
+        self.eg_vg = self._vg_keys.rows(self.eg_array, numpy.fromiter(
+            ((eg.get('exportGroup3Tuple') or {}).get('vgId', -1)
+             for eg in egs), numpy.int64, len(egs)))
+
+        # Arrays, NaN where unknown
+        def total(rsp, key):
+            groups = rsp.get('drivegroups')
+            if groups is None:
+                return numpy.nan
+            return sum(group.get(key) or 0 for group in groups)
+
+        self.physical = numpy.fromiter(
+            (total(rsp, 'capacityMiB') for rsp in responses),
+            numpy.float64, n_arrays)
+        self.used = numpy.fromiter((total(rsp, 'usedMiB')
+                                    for rsp in responses),
+                                   numpy.float64, n_arrays)
+        self.total = numpy.fromiter(
+            ((rsp.get('sa_info') or {}).get('totalCapacityMiB', numpy.nan)
+             for rsp in responses), numpy.float64, n_arrays)
+
+    @classmethod
+    def from_fleet(cls, fleet, arrays=None):
+        """Fetch the SOURCES of the arrays of a VexataFleet.
+
+        :param arrays: Names of the arrays to analyze, None for all
+        Arrays whose calls raised are left out, with their exception in
+        the errors dict of the result.
+        """
+        results = fleet.map(fetch, arrays=arrays)
+        responses = collections.OrderedDict()
+        errors = {}
+        for name, res in results.items():
+            if res.error is not None:
+                LOG.warning('Capacity of %s unknown: %s', name, res.error)
+                errors[name] = res.error
+            else:
+                responses[name] = res.result
+        capacity = cls(responses)
+        capacity.errors = errors
+        return capacity
+
+    # -----------------------------------------------------------------
+    # Per-object sums, vectorized
+    # -----------------------------------------------------------------
+    def _per_array(self, weights=None, mask=None):
+        array_idx = self.vol_array
+        if mask is not None:
+            array_idx = array_idx[mask]
+            weights = None if weights is None else weights[mask]
+        return numpy.bincount(array_idx, weights=weights,
+                              minlength=len(self.names))
+
+    def _snapshot_MiB_by_volume(self):
+        """Snapshot MiB of every volume row."""
+        snaps = self.vol_snapshot & (self.vol_parent >= 0)
+        return numpy.bincount(self.vol_parent[snaps],
+                              weights=self.vol_size[snaps],
+                              minlength=len(self.vol_id))
+
+    def _vg_sums(self):
+        """(volumes, allocated MiB, snapshot MiB) of every VG row."""
+        found = self.member_vol >= 0
+        vg_rows = self.member_vg[found]
+        vol_rows = self.member_vol[found]
+        n_vgs = len(self.vg_id)
+        return (numpy.bincount(vg_rows, minlength=n_vgs),
+                numpy.bincount(vg_rows, weights=self.vol_size[vol_rows],
+                               minlength=n_vgs),
+                numpy.bincount(
+                    vg_rows,
+                    weights=self._snapshot_MiB_by_volume()[vol_rows],
+                    minlength=n_vgs))
+
+    def _exported(self):
+        """Mask of the volume rows in a VG of some export group."""
+        vg_exported = numpy.zeros(len(self.vg_id), bool)
+        vg_exported[self.eg_vg[self.eg_vg >= 0]] = True
+        members = (self.member_vol >= 0) & vg_exported[self.member_vg]
+        exported = numpy.zeros(len(self.vol_id), bool)
+        exported[self.member_vol[members]] = True
+        return exported
+
+    # -----------------------------------------------------------------
+    # Reports
+    # -----------------------------------------------------------------
+    def arrays(self):
+        """Capacity of every array.
+
+        Columns: array, volumes, snapshots, provisioned_MiB (volumes),
+        snapshot_MiB, exported_MiB (volumes in an exported VG),
+        physical_MiB, used_MiB, free_MiB, total_MiB (sa_info),
+        utilization (used/physical), overprovisioning
+        (provisioned/physical) and snapshot_overhead
+        (snapshot/provisioned).
+        """
+        volumes = ~self.vol_snapshot
+        provisioned = self._per_array(self.vol_size, volumes)
+        snapshot = self._per_array(self.vol_size, self.vol_snapshot)
+        return collections.OrderedDict([
+            ('array', numpy.array(self.names, dtype=object)),
+            ('volumes', self._per_array(mask=volumes)),
+            ('snapshots', self._per_array(mask=self.vol_snapshot)),
+            ('provisioned_MiB', provisioned),
+            ('snapshot_MiB', snapshot),
+            ('exported_MiB', self._per_array(self.vol_size,
+                                             self._exported())),
+            ('physical_MiB', self.physical),
+            ('used_MiB', self.used),
+            ('free_MiB', self.physical - self.used),
+            ('total_MiB', self.total),
+            ('utilization', _ratio(self.used, self.physical)),
+            ('overprovisioning', _ratio(provisioned, self.physical)),
+            ('snapshot_overhead', _ratio(snapshot, provisioned)),
+        ])
+
+    def vgs(self):
+        """Allocation of every volume group.
+
+        Columns: array, id, name, volumes, allocated_MiB (member
+        volumes), snapshot_MiB (snapshots of the members) and
+        export_groups.
+        """
+        volumes, allocated, snapshot = self._vg_sums()
+        exports = numpy.bincount(self.eg_vg[self.eg_vg >= 0],
+                                 minlength=len(self.vg_id))
+        return collections.OrderedDict([
+            ('array', numpy.array(self.names, dtype=object)[self.vg_array]),
+            ('id', self.vg_id),
+            ('name', self.vg_name),
+            ('volumes', volumes),
+            ('allocated_MiB', allocated),
+            ('snapshot_MiB', snapshot),
+            ('export_groups', exports),
+        ])
+
+    def egs(self):
+        """Allocation exported by every export group.
+
+        Columns: array, id, name, vg_id (-1 if the VG is missing),
+        volumes, allocated_MiB and snapshot_MiB, those of the VG.
+        """
+        volumes, allocated, snapshot = self._vg_sums()
+        found = self.eg_vg >= 0
+        vg_rows = numpy.where(found, self.eg_vg, 0)
+
+        def of_vg(values, missing):
+            if not len(values):
+                return numpy.full(len(self.eg_id), missing)
+            return numpy.where(found, values[vg_rows], missing)
+
+        return collections.OrderedDict([
+            ('array', numpy.array(self.names, dtype=object)[self.eg_array]),
+            ('id', self.eg_id),
+            ('name', self.eg_name),
+            ('vg_id', of_vg(self.vg_id, -1)),
+            ('volumes', of_vg(volumes, 0)),
+            ('allocated_MiB', of_vg(allocated, 0.0)),
+            ('snapshot_MiB', of_vg(snapshot, 0.0)),
+        ])
+
+    def snapshot_overhead(self, top=None):
+        """Volumes by decreasing snapshot MiB.
+
+        :param top: Number of volumes to return, None for all the volumes
+                    with snapshots
+        Columns: array, id, name, size_MiB, snapshots, snapshot_MiB and
+        overhead (snapshot/size).
+        """
+        snaps = self.vol_snapshot & (self.vol_parent >= 0)
+        counts = numpy.bincount(self.vol_parent[snaps],
+                                minlength=len(self.vol_id))
+        snapshot = self._snapshot_MiB_by_volume()
+        rows = numpy.flatnonzero(counts)
+        if top is not None and top < len(rows):
+            rows = rows[numpy.argpartition(-snapshot[rows], top)[:top]]
+        rows = rows[numpy.argsort(-snapshot[rows], kind='stable')]
+        return collections.OrderedDict([
+            ('array', numpy.array(self.names,
+                                  dtype=object)[self.vol_array[rows]]),
+            ('id', self.vol_id[rows]),
+            ('name', self.vol_name[rows]),
+            ('size_MiB', self.vol_size[rows]),
+            ('snapshots', counts[rows]),
+            ('snapshot_MiB', snapshot[rows]),
+            ('overhead', _ratio(snapshot[rows], self.vol_size[rows])),
+        ])
+
+    def growth(self, window=None, horizon=None, now=None):
+        """Growth projection of every array.
+
+        The provisioning rate is the size of the volumes and snapshots
+        created over the last window days, deletions are not known. The
+        physical rate scales it by the current used/provisioned ratio.
+
+        :param window: Days to look back, None to use default
+                       (GROWTH_WINDOW)
+        :param horizon: Days ahead to project the utilization to, None to
+                        use default (HORIZON)
+        :param now: Time of the projection, None for now
+        Columns: array, provisioned_MiB_per_day, used_MiB_per_day,
+        days_to_full (inf if not growing) and projected_utilization.
+        """
+        window = window or self.GROWTH_WINDOW
+        horizon = self.HORIZON if horizon is None else horizon
+        now = time.time() if now is None else now
+        recent = self.vol_created >= now - window * 86400
+        rate = self._per_array(self.vol_size, recent) / window
+        provisioned = self._per_array(self.vol_size)
+        physical_ratio = numpy.where(provisioned > 0,
+                                     _ratio(self.used, provisioned), 1.0)
+        used_rate = rate * physical_ratio
+        free = self.physical - self.used
+        days_to_full = numpy.where(used_rate > 0,
+                                   _ratio(free, used_rate), numpy.inf)
+        return collections.OrderedDict([
+            ('array', numpy.array(self.names, dtype=object)),
+            ('provisioned_MiB_per_day', rate),
+            ('used_MiB_per_day', used_rate),
+            ('days_to_full', numpy.maximum(days_to_full, 0)),
+            ('projected_utilization',
+             _ratio(self.used + used_rate * horizon, self.physical)),
+        ])
+
+    # -----------------------------------------------------------------
+    # Placement
+    # -----------------------------------------------------------------
+    def place(self, sizes_MiB, max_utilization=None,
+              max_overprovisioning=None, exclude=()):
+        """Arrays on which to create volumes, least loaded first.
+
+        Each volume goes to the array with the lowest utilization once
+        it is placed, counting the volumes placed before it. Its physical
+        usage is estimated with the used/provisioned ratio of the array.
+
+        :param sizes_MiB: Sizes of the volumes to place
+        :param max_utilization: Highest utilization of an array after
+                                placement, None to use default
+                                (MAX_UTILIZATION)
+        :param max_overprovisioning: Highest provisioned/physical ratio
+                                     after placement, None for no limit
+        :param exclude: Names of arrays not to place volumes on
+        Returns a list of array names, None for the volumes that fit
+        nowhere.
+        """
+        if max_utilization is None:
+            max_utilization = self.MAX_UTILIZATION
+        provisioned = self._per_array(self.vol_size, ~self.vol_snapshot)
+        all_provisioned = self._per_array(self.vol_size)
+        physical_ratio = numpy.where(all_provisioned > 0,
+                                     _ratio(self.used, all_provisioned), 1.0)
+        eligible = self.complete & (self.physical > 0)
+        eligible &= ~numpy.isin(numpy.array(self.names, dtype=object),
+                                list(exclude))
+        used = self.used.copy()
+        placements = []
+        for size in sizes_MiB:
+            utilization = _ratio(used + size * physical_ratio,
+                                 self.physical)
+            fits = eligible & (utilization <= max_utilization)
+            if max_overprovisioning is not None:
+                fits &= (_ratio(provisioned + size, self.physical)
+                         <= max_overprovisioning)
+            if not fits.any():
+                placements.append(None)
+                continue
+            best = int(numpy.argmin(numpy.where(fits, utilization,
+                                                numpy.inf)))
+            used[best] += size * physical_ratio[best]
+            provisioned[best] += size
+            placements.append(self.names[best])
+        return placements
+
+    def recommend(self, size_MiB, **kwargs):
+        """Least loaded array for a new volume, None if none fits.
+
+        Takes the same keyword arguments as place().
+        """
+        return self.place([size_MiB], **kwargs)[0]
@@ -0,0 +1,307 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+vexatactl, command line access to the VexataAPIProxy methods.
+
+    export VEXATA_HOST=array1 VEXATA_USER=admin VEXATA_PASSWORD=...
+    vexatactl list_volumes
+    vexatactl create_volume vol1 'first volume' 1024
+    vexatactl modify_vg 3 vg3 '' add_vol_ids='[64, 65]' rm_vol_ids='[]'
+    vexatactl methods
+
+Arguments are positional or key=value, values are parsed as JSON when
+they are valid JSON and kept as strings otherwise: quote a name made of
+digits as '"123"'. The result is printed as one JSON line, one line per
+object for the iter_* methods.
+
+Batch mode runs the commands read from a file or stdin, one per line,
+over one pool of keep-alive connections:
+
+    vexatactl batch -j 8 < commands.txt
+
+A line is either a command as above, or a JSON object:
+
+    {"method": "create_vg", "args": ["vg1", ""], "kwargs": {...},
+     "id": "anything, echoed in the output"}
+
+Blank lines and lines starting with # are skipped. Up to JOBS commands
+run at a time, a line reading "wait" waits for the commands before it to
+complete. One JSON line is printed per command, in input order:
+
+    {"line": 2, "method": "create_vg", "ok": true, "result": ...}
+    {"line": 3, "method": "delete_vg", "ok": false, "error": "..."}
+
+The exit status is 1 if any command failed.
+
+vexatactl runs on LiteVexataAPIProxy so that a command does not pay the
+import time of requests, heavier modules are imported on the paths that
+need them.
+"""
+
+import argparse
+import collections.abc
+import json
+import os
+import re
+import sys
+
+from vexatapi.lite import LiteVexataAPIProxy
+
+# Methods of the proxy not exposed as commands
+HIDDEN = ('close',)
+KWARG_RE = re.compile(r'^([A-Za-z_]\w*)=(.*)$', re.S)
+
+
+def commands():
+    """Names of the proxy methods usable as commands."""
+    return sorted(name for name in dir(LiteVexataAPIProxy)
+                  if not name.startswith('_') and name not in HIDDEN
+                  and callable(getattr(LiteVexataAPIProxy, name)))
+
+
+def _value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _check_method(method):
+    if method not in commands():
+        raise ValueError('Unknown command %r, see "vexatactl methods"'
+                         % method)
+    return method
+
+
+def parse_command(words):
+    """(method, args, kwargs) of a command given as a list of words.
+
+    Raises ValueError for an unknown method.
+    """
+    if not words:
+        raise ValueError('Empty command')
+    method = _check_method(words[0])
+    args = []
+    kwargs = {}
+    for word in words[1:]:
+        match = KWARG_RE.match(word)
+        if match:
+            kwargs[match.group(1)] = _value(match.group(2))
+        elif kwargs:
+            raise ValueError('Positional argument %r after key=value '
+                             'arguments' % word)
+        else:
+            args.append(_value(word))
+    return method, args, kwargs
+
+
+def parse_line(line):
+    """(method, args, kwargs, id) of a batch line, None to skip it."""
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    if line.startswith('{'):
+        command = json.loads(line)
+        method = _check_method(command.get('method'))
+        args = command.get('args') or []
+        kwargs = command.get('kwargs') or {}
+        if not isinstance(args, list) or not isinstance(kwargs, dict):
+            raise ValueError('args must be a list and kwargs an object')
+        return method, args, kwargs, command.get('id')
+    import shlex
+
+    return parse_command(shlex.split(line)) + (None,)
+
+
+def call(proxy, method, args, kwargs):
+    """Result of a proxy method, iterators are read into lists."""
+    result = getattr(proxy, method)(*args, **kwargs)
+    if isinstance(result, collections.abc.Iterator):
+        result = list(result)
+    return result
+
+
+def _dumps(obj):
+    return json.dumps(obj, default=str)
+
+
+def _error(e):
+    return '%s: %s' % (type(e).__name__, e)
+
+
+class Batch(object):
+    """Runs batch lines on a proxy, prints their outcome in order."""
+
+    def __init__(self, proxy, jobs, out):
+        self.proxy = proxy
+        self.jobs = jobs
+        self.out = out
+        self.failed = 0
+
+    def run_line(self, lineno, line):
+        outcome = {'line': lineno}
+        try:
+            parsed = parse_line(line)
+            if parsed is None:
+                return None
+            method, args, kwargs, cmd_id = parsed
+            if cmd_id is not None:
+                outcome['id'] = cmd_id
+            outcome['method'] = method
+            outcome['result'] = call(self.proxy, method, args, kwargs)
+            outcome['ok'] = True
+        except Exception as e:
+            outcome.pop('result', None)
+            outcome['ok'] = False
+            outcome['error'] = _error(e)
+        return outcome
+
+    def emit(self, outcome):
+        if outcome is None:
+            return
+        if not outcome['ok']:
+            self.failed += 1
+        self.out.write(_dumps(outcome) + '\n')
+        self.out.flush()
+
+    def run(self, lines):
+        """Run lines, an iterable of text lines. Returns the failures."""
+        import concurrent.futures
+
+        # Bounded so that input is read as commands complete, not all
+        # at once, while keeping the workers busy.
+        window = 2 * self.jobs
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(self.jobs) as executor:
+            for lineno, line in enumerate(lines, 1):
+                if line.strip() == 'wait':
+                    while pending:
+                        self.emit(pending.popleft().result())
+                    continue
+                pending.append(executor.submit(self.run_line, lineno, line))
+                while pending and (len(pending) >= window
+                                   or pending[0].done()):
+                    self.emit(pending.popleft().result())
+            while pending:
+                self.emit(pending.popleft().result())
+        return self.failed
+
+
+def _list_methods(out):
+    import inspect
+
+    for name in commands():
+        method = getattr(LiteVexataAPIProxy, name)
+        params = list(inspect.signature(method).parameters.values())[1:]
+        doc = (inspect.getdoc(method) or '').split('\n', 1)[0]
+        line = '%s %s' % (name, ' '.join(param.name for param in params))
+        out.write('%-60s %s\n' % (line.strip(), doc) if doc
+                  else line.strip() + '\n')
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='vexatactl',
+        description='Call Vexata array REST API methods.',
+        epilog='"vexatactl methods" lists the commands.')
+    env = os.environ.get
+    parser.add_argument('--host', default=env('VEXATA_HOST'),
+                        help='Array hostname or IP ($VEXATA_HOST)')
+    parser.add_argument('--user', default=env('VEXATA_USER'),
+                        help='Management user ($VEXATA_USER)')
+    parser.add_argument('--password', default=env('VEXATA_PASSWORD'),
+                        help='Management password ($VEXATA_PASSWORD)')
+    parser.add_argument('--port', type=int,
+                        default=int(env('VEXATA_PORT') or 0) or None,
+                        help='HTTPS port ($VEXATA_PORT, default 443)')
+    parser.add_argument('--insecure', action='store_true',
+                        help='Do not verify the array certificate')
+    parser.add_argument('--ca-cert',
+                        help='CA bundle file or directory to verify the '
+                             'array certificate with')
+    parser.add_argument('--timeout', type=float,
+                        help='Seconds to wait for a response')
+    parser.add_argument('command', help='Proxy method, "batch" or '
+                                        '"methods"')
+    parser.add_argument('args', nargs=argparse.REMAINDER,
+                        help='Method arguments, positional or key=value')
+    return parser
+
+
+def _batch_parser():
+    parser = argparse.ArgumentParser(
+        prog='vexatactl batch',
+        description='Run commands read one per line, print JSON lines.')
+    parser.add_argument('-f', '--file', default='-',
+                        help='File to read commands from, - for stdin')
+    parser.add_argument('-j', '--jobs', type=int, default=4,
+                        help='Commands run at a time (default 4)')
+    return parser
+
+
+def main(argv=None):
+    parser = _parser()
+    opts = parser.parse_args(argv)
+    if opts.command == 'methods':
+        _list_methods(sys.stdout)
+        return 0
+    batch_opts = None
+    if opts.command == 'batch':
+        batch_opts = _batch_parser().parse_args(opts.args)
+        if batch_opts.jobs < 1:
+            parser.error('--jobs must be at least 1')
+    else:
+        try:
+            command = parse_command([opts.command] + opts.args)
+        except ValueError as e:
+            parser.error(str(e))
+    for name in ('host', 'user', 'password'):
+        if not getattr(opts, name):
+            parser.error('--%s or $VEXATA_%s is required'
+                         % (name, name.upper()))
+    proxy = LiteVexataAPIProxy(
+        opts.host, opts.user, opts.password, mgmt_port=opts.port,
+        verify_cert=not opts.insecure, cert_path=opts.ca_cert,
+        read_timeout=opts.timeout, raise_on_error=True,
+        pool_size=batch_opts.jobs if batch_opts else None)
+    with proxy:
+        if batch_opts is not None:
+            if batch_opts.file == '-':
+                failed = Batch(proxy, batch_opts.jobs, sys.stdout).run(
+                    sys.stdin)
+            else:
+                with open(batch_opts.file) as fh:
+                    failed = Batch(proxy, batch_opts.jobs,
+                                   sys.stdout).run(fh)
+            return 1 if failed else 0
+        method, args, kwargs = command
+        try:
+            result = getattr(proxy, method)(*args, **kwargs)
+            if method.startswith('iter_'):
+                for obj in result:
+                    sys.stdout.write(_dumps(obj) + '\n')
+            elif isinstance(result, collections.abc.Iterator):
+                sys.stdout.write(_dumps(list(result)) + '\n')
+            else:
+                sys.stdout.write(_dumps(result) + '\n')
+        except Exception as e:
+            sys.stderr.write('vexatactl: %s\n' % _error(e))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
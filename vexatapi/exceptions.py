@@ -0,0 +1,53 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Vexata API exceptions.
+
+"""
+
+
+class VexataAPIError(Exception):
+    """Base class of all vexatapi errors."""
+
+
+class VexataAPIStatusError(VexataAPIError):
+    """Array answered with an unexpected status code."""
+
+    def __init__(self, status_code, body=None, url=None):
+        self.status_code = status_code
+        self.body = body
+        self.url = url
+        super(VexataAPIStatusError, self).__init__(
+            'HTTP %s from %s: %s' % (status_code, url, body))
+
+    @classmethod
+    def from_response(cls, rsp):
+        body = rsp.content
+        if isinstance(body, bytes):
+            body = body.decode('utf-8', 'replace')
+        return cls(rsp.status_code, body, getattr(rsp, 'url', None))
+
+
+class VexataAPIConnectionError(VexataAPIError):
+    """Array could not be reached."""
+
+
+class VexataAPITimeout(VexataAPIError):
+    """Call did not complete within its timeout or deadline."""
+
+
+class CircuitOpenError(VexataAPIError):
+    """Call rejected without trying, the array is failing."""
@@ -0,0 +1,212 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Dependency-aware parallel execution of proxy calls.
+
+A plan is a list of Steps, each one a VexataAPIProxy call. Arguments may
+refer to the result of another step through a Ref, which also makes the
+step depend on it:
+
+    steps = [
+        Step('vg', 'create_vg', {'vg_name': 'vg1', 'vg_desc': '',
+                                 'vol_ids': [64, 65]}),
+        Step('eg', 'create_eg', {'eg_name': 'eg1', 'eg_desc': '',
+                                 'eg_tuple': (Ref('vg'), 0, 0)}),
+    ]
+    result = run_plan(proxy, steps)
+
+Steps run as soon as their dependencies succeeded, independent steps run
+in parallel. Dependents of a failed step are skipped.
+"""
+
+import collections
+import concurrent.futures
+
+from vexatapi.exceptions import VexataAPIError
+
+
+class StepError(VexataAPIError):
+    """Array call reported failure (returned None/False)."""
+
+
+class Ref(object):
+    """Placeholder for a field of the result of another step."""
+
+    def __init__(self, step, key='id'):
+        self.step = step
+        self.key = key
+
+    def __repr__(self):
+        return '<%s.%s>' % (self.step, self.key)
+
+    def resolve(self, results):
+        result = results[self.step]
+        return result if self.key is None else result[self.key]
+
+
+def _refs(value):
+    if isinstance(value, Ref):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            for ref in _refs(item):
+                yield ref
+    elif isinstance(value, (list, tuple, set)):
+        for item in value:
+            for ref in _refs(item):
+                yield ref
+
+
+def _resolve(value, results):
+    if isinstance(value, Ref):
+        return value.resolve(results)
+    elif isinstance(value, dict):
+        return dict((key, _resolve(item, results))
+                    for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        return type(value)(_resolve(item, results) for item in value)
+    return value
+
+
+class Step(object):
+
+    def __init__(self, name, method, kwargs=None, after=()):
+        """Init method.
+
+        :param name: Unique name of the step in its plan
+        :param method: Name of the VexataAPIProxy method to call
+        :param kwargs: Keyword arguments of the call, may contain Refs
+        :param after: Names of steps that must succeed first, in addition
+                      to the ones referenced by kwargs
+        """
+        self.name = name
+        self.method = method
+        self.kwargs = kwargs or {}
+        self.deps = set(after)
+        self.deps.update(ref.step for ref in _refs(self.kwargs))
+
+    def __repr__(self):
+        return '<Step %s>' % self.describe()
+
+    def describe(self):
+        args = ', '.join('%s=%r' % item
+                         for item in sorted(self.kwargs.items()))
+        return '%s: %s(%s)' % (self.name, self.method, args)
+
+
+class PlanResult(object):
+    """Outcome of run_plan()."""
+
+    def __init__(self, steps):
+        self.steps = collections.OrderedDict((step.name, step)
+                                             for step in steps)
+        self.results = {}
+        self.errors = {}
+        self.skipped = []
+
+    @property
+    def ok(self):
+        return not self.errors and not self.skipped
+
+
+def order(steps):
+    """Group steps in waves, every step only depends on earlier waves.
+
+    Raises ValueError on unknown or circular dependencies.
+    """
+    names = set(step.name for step in steps)
+    if len(names) != len(steps):
+        raise ValueError('Duplicate step names')
+    for step in steps:
+        unknown = step.deps - names
+        if unknown:
+            raise ValueError('Step %s depends on unknown %s'
+                             % (step.name, ', '.join(sorted(unknown))))
+    waves = []
+    done = set()
+    todo = list(steps)
+    while todo:
+        wave = [step for step in todo if step.deps <= done]
+        if not wave:
+            raise ValueError('Circular dependency between %s'
+                             % ', '.join(step.name for step in todo))
+        waves.append(wave)
+        done.update(step.name for step in wave)
+        todo = [step for step in todo if step.name not in done]
+    return waves
+
+
+def _call(proxy, step, kwargs):
+    result = getattr(proxy, step.method)(**kwargs)
+    if result is None or result is False:
+        raise StepError('%s failed' % step.describe())
+    return result
+
+
+def run_plan(proxy, steps, max_workers=8):
+    """Run steps on proxy, in dependency order and in parallel.
+
+    Returns a PlanResult with the result of every successful step, the
+    exception of every failed one and the names of the skipped ones.
+    """
+    order(steps)
+    result = PlanResult(steps)
+    # Steps waiting on each step, and count of unfinished deps per step,
+    # so that a completion only looks at its own dependents.
+    dependents = collections.defaultdict(list)
+    unfinished = {}
+    ready = collections.deque()
+    for step in steps:
+        unfinished[step.name] = len(step.deps)
+        for dep in step.deps:
+            dependents[dep].append(step)
+        if not step.deps:
+            ready.append(step)
+    skipped = set()
+
+    def skip(name):
+        todo = [name]
+        while todo:
+            for step in dependents[todo.pop()]:
+                if step.name not in skipped:
+                    skipped.add(step.name)
+                    result.skipped.append(step.name)
+                    todo.append(step.name)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        running = {}
+        while ready or running:
+            while ready:
+                step = ready.popleft()
+                kwargs = _resolve(step.kwargs, result.results)
+                future = executor.submit(_call, proxy, step, kwargs)
+                running[future] = step
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                try:
+                    result.results[step.name] = future.result()
+                except Exception as e:
+                    result.errors[step.name] = e
+                    skip(step.name)
+                    continue
+                for dependent in dependents[step.name]:
+                    unfinished[dependent.name] -= 1
+                    if (not unfinished[dependent.name]
+                            and dependent.name not in skipped):
+                        ready.append(dependent)
+    return result
@@ -0,0 +1,224 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Export path planning.
+
+A host sees a volume through an export group, the 3-tuple of a volume
+group, an initiator group and a port group. ExportPlanner computes the
+fewest calls exporting volumes to a host, preferring in order:
+
+1. an export group already covering the volumes, initiators and ports
+2. extending the volume group of the host's export group with modify_vg,
+   if no other export group uses that volume group
+3. reusing or extending (modify_ig) the host's initiator group, reusing
+   a volume group / port group with the same members, and only creating
+   the groups that are missing
+
+Volumes the host already sees through these ports are never exported to
+it again. Port groups with more ports than asked for are only reused
+with wider_pgs, as they expose the volumes through the other ports too.
+
+    planner = ExportPlanner(proxy)
+    result = planner.export_volumes([64, 65], ['10:00:00:90:fa:92:72:e4'],
+                                    [2, 3])
+"""
+
+import re
+
+from vexatapi.executor import (Ref, Step, run_plan)
+from vexatapi.inventory import Inventory
+
+
+class ExportPlanner(object):
+    MAX_WORKERS = 8
+
+    def __init__(self, proxy, inventory=None, max_workers=None):
+        """Init method.
+
+        :param proxy: VexataAPIProxy of the array
+        :param inventory: Inventory to plan against, None to fetch a
+                          fresh one for every plan
+        :param max_workers: Max calls in flight, None to use default
+                            (MAX_WORKERS)
+        """
+        self.proxy = proxy
+        self.inventory = inventory
+        self.max_workers = max_workers or self.MAX_WORKERS
+
+    @staticmethod
+    def _default_name(initiator_addrs):
+        return 'host_%s' % re.sub('[^0-9a-zA-Z]', '', initiator_addrs[0])
+
+    @staticmethod
+    def _members(group, key):
+        return set(group.get(key) or ())
+
+    def plan(self, vol_ids, initiator_addrs, port_ids, name=None,
+             inventory=None, wider_pgs=False):
+        """Compute the calls exporting vol_ids to a host.
+
+        :param vol_ids: Ids of the volumes to export
+        :param initiator_addrs: WWNs of the host initiators
+        :param port_ids: Ids of the SA ports to export through
+        :param name: Prefix of the names of created objects, None to
+                     derive it from the first initiator
+        :param inventory: Inventory to plan against, overrides the one
+                          given to __init__
+        :param wider_pgs: If no port group has exactly port_ids, reuse the
+                          smallest one holding them rather than create
+                          one, the volumes are also exported through its
+                          other ports
+        Returns a list of Steps, empty if nothing needs to change.
+        """
+        if not vol_ids or not initiator_addrs or not port_ids:
+            raise ValueError('Volumes, initiators and ports are required')
+        inv = inventory or self.inventory or Inventory.from_proxy(self.proxy)
+        name = name or self._default_name(initiator_addrs)
+        vols = set(vol_ids)
+        ports = set(port_ids)
+        steps = []
+
+        # Initiators, registering the unknown ones
+        ini_ids = set()
+        new_inis = []
+        for addr in initiator_addrs:
+            ini = inv.find_initiator_by_addr(addr)
+            if ini is not None:
+                ini_ids.add(ini['id'])
+            else:
+                step = Step('add_initiator_%d' % len(new_inis),
+                            'add_initiator',
+                            {'ini_name': '%s_%d' % (name, len(new_inis)),
+                             'ini_desc': '',
+                             'ini_addr': addr})
+                steps.append(step)
+                new_inis.append(Ref(step.name))
+
+        # Initiator group: exact match, else extend the largest one that
+        # only holds initiators of this host (an exact match of the known
+        # ones when some are new), else create.
+        ig = None
+        ig_id = None
+        ig_after = ()
+        if not new_inis:
+            for cand in inv.igs:
+                if self._members(cand, 'currInitiators') == ini_ids:
+                    ig = cand
+                    break
+        if ig is None:
+            subsets = [cand for cand in inv.igs
+                       if self._members(cand, 'currInitiators')
+                       and self._members(cand, 'currInitiators') <= ini_ids]
+            if subsets:
+                ig = max(subsets,
+                         key=lambda cand: len(cand['currInitiators']))
+                add = sorted(ini_ids - self._members(ig, 'currInitiators'))
+                steps.append(Step('modify_ig', 'modify_ig',
+                                  {'ig_id': ig['id'],
+                                   'ig_name': ig['name'],
+                                   'ig_desc': ig.get('description', ''),
+                                   'add_ini_ids': add + new_inis,
+                                   'rm_ini_ids': []}))
+                ig_after = ('modify_ig',)
+            elif ini_ids or new_inis:
+                steps.append(Step('create_ig', 'create_ig',
+                                  {'ig_name': '%s_ig' % name,
+                                   'ig_desc': '',
+                                   'ini_ids': sorted(ini_ids) + new_inis}))
+                ig_id = Ref('create_ig')
+        if ig is not None:
+            ig_id = ig['id']
+
+        # Port group: exact match, else the smallest superset if allowed,
+        # else create. Existing port groups are never modified, that would
+        # change the paths of other hosts.
+        pg = None
+        for cand in inv.pgs:
+            if self._members(cand, 'currPorts') == ports:
+                pg = cand
+                break
+        if pg is None and wider_pgs:
+            supersets = [cand for cand in inv.pgs
+                         if self._members(cand, 'currPorts') > ports]
+            if supersets:
+                pg = min(supersets, key=lambda cand: len(cand['currPorts']))
+        if pg is not None:
+            pg_id = pg['id']
+        else:
+            steps.append(Step('create_pg', 'create_pg',
+                              {'pg_name': '%s_pg' % name,
+                               'pg_desc': '',
+                               'saport_ids': sorted(ports)}))
+            pg_id = Ref('create_pg')
+
+        # Existing export groups of this host through these ports, only
+        # the volumes it does not see yet are exported.
+        if ig is not None and pg is not None:
+            host_egs = []
+            for eg in inv.egs:
+                eg_tuple = eg.get('exportGroup3Tuple') or {}
+                vg = inv.vgs.get(eg_tuple.get('vgId'))
+                if (vg is not None and eg_tuple.get('igId') == ig['id']
+                        and eg_tuple.get('pgId') == pg['id']):
+                    host_egs.append((eg, vg))
+            for eg, vg in host_egs:
+                vols -= self._members(vg, 'currVolumes')
+            if not vols:
+                return steps
+            for eg, vg in host_egs:
+                if inv.egs_of_vg(vg['id']) == set([eg['id']]):
+                    steps.append(Step('modify_vg', 'modify_vg',
+                                      {'vg_id': vg['id'],
+                                       'vg_name': vg['name'],
+                                       'vg_desc': vg.get('description', ''),
+                                       'add_vol_ids': sorted(vols),
+                                       'rm_vol_ids': []},
+                                      after=ig_after))
+                    return steps
+
+        # Volume group of the remaining volumes: exact match, else create
+        vg_id = None
+        for cand in inv.vgs:
+            if self._members(cand, 'currVolumes') == vols:
+                vg_id = cand['id']
+                break
+        if vg_id is None:
+            steps.append(Step('create_vg', 'create_vg',
+                              {'vg_name': '%s_vg' % name,
+                               'vg_desc': '',
+                               'vol_ids': sorted(vols)}))
+            vg_id = Ref('create_vg')
+
+        steps.append(Step('create_eg', 'create_eg',
+                          {'eg_name': '%s_eg' % name,
+                           'eg_desc': '',
+                           'eg_tuple': (vg_id, ig_id, pg_id)},
+                          after=ig_after))
+        return steps
+
+    def export_volumes(self, vol_ids, initiator_addrs, port_ids, name=None,
+                       inventory=None, wider_pgs=False, dry_run=False):
+        """Export vol_ids to a host with the fewest calls.
+
+        Takes the same arguments as plan(). Independent calls of the plan
+        run in parallel.
+        Returns the list of Steps if dry_run, else a PlanResult.
+        """
+        steps = self.plan(vol_ids, initiator_addrs, port_ids, name=name,
+                          inventory=inventory, wider_pgs=wider_pgs)
+        if dry_run:
+            return steps
+        return run_plan(self.proxy, steps, self.max_workers)
@@ -0,0 +1,198 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Concurrent operations across many Vexata arrays.
+
+    fleet = VexataFleet([VexataAPIProxy(ip, user, passwd) for ip in ips])
+    for res in fleet.imap('find_volume_by_uuid', vol_uuid):
+        if res.error is None and res.result:
+            print(res.array, res.result)
+"""
+
+import collections
+import concurrent.futures
+import threading
+import time
+
+from vexatapi import resilience
+from vexatapi.exceptions import VexataAPITimeout
+
+
+FleetResult = collections.namedtuple('FleetResult',
+                                     ['array', 'result', 'error', 'elapsed'])
+FleetResult.__doc__ = """Outcome of one call on one array.
+
+:param array: Name of the array in the fleet
+:param result: Return value of the call, None on error
+:param error: Exception raised by the call, None on success
+:param elapsed: Seconds spent in the call
+"""
+
+
+class FleetTimeoutError(VexataAPITimeout):
+    """Array did not answer within the per-array deadline."""
+
+
+class VexataFleet(object):
+    MAX_WORKERS = 16
+
+    def __init__(self,
+                 proxies=None,
+                 max_workers=None,
+                 timeout=None):
+        """Init method.
+
+        :param proxies: VexataAPIProxy instances, either a dict of
+                        name -> proxy or a list (named by mgmt_ip)
+        :param max_workers: Max arrays called in parallel, None to use
+                            default (MAX_WORKERS)
+        :param timeout: Per-array deadline in seconds, None for no deadline
+                        other than the proxy timeouts
+        """
+        self.max_workers = max_workers or self.MAX_WORKERS
+        self.timeout = timeout
+        self.proxies = collections.OrderedDict()
+        if isinstance(proxies, dict):
+            for name, proxy in proxies.items():
+                self.add(proxy, name)
+        else:
+            for proxy in proxies or ():
+                self.add(proxy)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def __iter__(self):
+        return iter(self.proxies)
+
+    def __getitem__(self, name):
+        return self.proxies[name]
+
+    def add(self, proxy, name=None):
+        name = name or proxy.ip
+        if name in self.proxies:
+            raise ValueError('Array %s already in fleet' % name)
+        self.proxies[name] = proxy
+        return name
+
+    def remove(self, name):
+        return self.proxies.pop(name)
+
+    def close(self):
+        for proxy in self.proxies.values():
+            proxy.close()
+
+    @staticmethod
+    def _call(proxy, method, args, kwargs):
+        if callable(method):
+            return method(proxy, *args, **kwargs)
+        return getattr(proxy, method)(*args, **kwargs)
+
+    def imap(self, method, *args, **kwargs):
+        """Call method on every array, yield FleetResults as they complete.
+
+        :param method: Name of a VexataAPIProxy method, or a callable
+                       taking the proxy as first argument
+        :param args, kwargs: Passed on to method
+        :param arrays: Keyword only, names of arrays to call, None for all
+        :param timeout: Keyword only, overrides the fleet deadline
+
+        Calls still running when their deadline passes are reported with
+        a FleetTimeoutError and their late results are discarded.
+        """
+        arrays = kwargs.pop('arrays', None)
+        timeout = kwargs.pop('timeout', self.timeout)
+        names = list(self.proxies) if arrays is None else list(arrays)
+        if not names:
+            return
+
+        started = {}
+        lock = threading.Lock()
+
+        def run(name):
+            start = time.monotonic()
+            with lock:
+                started[name] = start
+            if timeout is None:
+                result = self._call(self.proxies[name], method, args, kwargs)
+            else:
+                # Also bound the calls in the request path, so that a
+                # stuck array does not hold on to a worker.
+                with resilience.deadline(timeout):
+                    result = self._call(self.proxies[name], method,
+                                        args, kwargs)
+            return result, time.monotonic() - start
+
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(names)))
+        try:
+            pending = {}
+            for name in names:
+                pending[executor.submit(run, name)] = name
+            while pending:
+                wait = None
+                if timeout is not None:
+                    now = time.monotonic()
+                    with lock:
+                        running = [started[name] for name in
+                                   pending.values() if name in started]
+                    if running:
+                        wait = max(0, min(running) + timeout - now)
+                done, _ = concurrent.futures.wait(
+                    pending, timeout=wait,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    try:
+                        result, elapsed = future.result()
+                    except Exception as e:
+                        with lock:
+                            elapsed = time.monotonic() - started[name]
+                        yield FleetResult(name, None, e, elapsed)
+                    else:
+                        yield FleetResult(name, result, None, elapsed)
+                if timeout is None:
+                    continue
+                now = time.monotonic()
+                for future, name in list(pending.items()):
+                    with lock:
+                        start = started.get(name)
+                    if start is not None and now - start >= timeout:
+                        del pending[future]
+                        error = FleetTimeoutError(
+                            'Array %s timed out after %ss' % (name, timeout))
+                        yield FleetResult(name, None, error, now - start)
+        finally:
+            # Do not wait for calls that missed their deadline.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def map(self, method, *args, **kwargs):
+        """Call method on every array and wait for all of them.
+
+        Takes the same arguments as imap().
+        Returns an OrderedDict of array name -> FleetResult, in fleet order.
+        """
+        results = dict((res.array, res)
+                       for res in self.imap(method, *args, **kwargs))
+        return collections.OrderedDict(
+            (name, results[name]) for name in self.proxies
+            if name in results)
@@ -0,0 +1,225 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Request instrumentation.
+
+    metrics = Metrics()
+    proxy = VexataAPIProxy(ip, user, passwd, instrumentation=metrics)
+    ...
+    print(metrics.prometheus())
+
+Instrumentation hooks are called around every attempt sent to the array,
+with the URI reduced to its template, e.g.
+/api/storagearrays/{sa_id}/volumes/{vol_id}. Responses served from the
+ResponseCache do not reach the array and are not instrumented.
+"""
+
+import bisect
+import collections
+import functools
+import threading
+
+# Name of the id following a collection in a URI
+URI_PARAMS = {
+    'nodes': 'node_id',
+    'storagearrays': 'sa_id',
+    'volumes': 'vol_id',
+    'snapshots': 'snap_id',
+    'volumegroups': 'vg_id',
+    'snapshotgroups': 'snap_id',
+    'initiators': 'ini_id',
+    'initiatorgroups': 'ig_id',
+    'portgroups': 'pg_id',
+    'exportgroups': 'eg_id',
+    'ports': 'saport_id',
+    'storagearrayports': 'saport_id',
+}
+
+
+@functools.lru_cache(maxsize=1024)
+def uri_template(uri):
+    """Replace the ids in uri with their parameter names."""
+    parts = uri.split('/')
+    for i in range(1, len(parts)):
+        if parts[i].isdigit():
+            parts[i] = '{%s}' % URI_PARAMS.get(parts[i - 1], 'id')
+    return '/'.join(parts)
+
+
+class Instrumentation(object):
+    """Base class of instrumentation hooks, all hooks are no-ops.
+
+    Hooks are called from the thread (or task) making the call and must
+    be thread-safe.
+    """
+
+    def before_request(self, array, method, template, attempt):
+        """Called before an attempt is sent.
+
+        :param array: Management IP of the array
+        :param method: HTTP method
+        :param template: URI template
+        :param attempt: 0 for the first attempt, then 1, 2... for retries
+        """
+
+    def after_request(self, array, method, template, attempt,
+                      elapsed, status_code, size, error):
+        """Called once an attempt completed or failed.
+
+        :param elapsed: Seconds spent in the attempt
+        :param status_code: HTTP status, None if no response was received
+        :param size: Response body size in bytes, None if no response
+        :param error: VexataAPIError raised by the attempt, None if a
+                      response was received
+        Other parameters are the ones of before_request().
+        """
+
+
+class Metrics(Instrumentation):
+    """Request counters and latency histograms per array and endpoint."""
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+               1, 2.5, 5, 10, 30, 60, float('inf'))
+    PREFIX = 'vexatapi'
+
+    def __init__(self, buckets=None):
+        """Init method.
+
+        :param buckets: Latency histogram upper bounds in seconds, None to
+                        use default (BUCKETS)
+        """
+        buckets = sorted(buckets or self.BUCKETS)
+        if buckets[-1] != float('inf'):
+            buckets.append(float('inf'))
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # (array, method, template, status) -> count
+            self.requests = collections.Counter()
+            # (array, method, template, error class) -> count
+            self.errors = collections.Counter()
+            # (array, method, template) -> count
+            self.retries = collections.Counter()
+            # (array, method, template) -> [bucket counts], [sum, count]
+            self.latency = {}
+            self.latency_sum = collections.defaultdict(lambda: [0.0, 0])
+            self.response_bytes = collections.defaultdict(lambda: [0, 0])
+
+    def after_request(self, array, method, template, attempt,
+                      elapsed, status_code, size, error):
+        key = (array, method, template)
+        index = bisect.bisect_left(self.buckets, elapsed)
+        with self._lock:
+            self.requests[key + (status_code,)] += 1
+            if error is not None:
+                self.errors[key + (type(error).__name__,)] += 1
+            elif status_code >= 400:
+                self.errors[key + ('HTTP%d' % status_code,)] += 1
+            if attempt:
+                self.retries[key] += 1
+            counts = self.latency.get(key)
+            if counts is None:
+                counts = self.latency[key] = [0] * len(self.buckets)
+            counts[index] += 1
+            total = self.latency_sum[key]
+            total[0] += elapsed
+            total[1] += 1
+            if size is not None:
+                total = self.response_bytes[key]
+                total[0] += size
+                total[1] += 1
+
+    def quantile(self, q, array=None, method=None, template=None):
+        """Estimate a latency quantile (0 < q < 1) from the histograms.
+
+        Returns the upper bound of the bucket holding the quantile, None
+        if there was no matching request. array/method/template filter
+        the requests taken into account.
+        """
+        with self._lock:
+            merged = [0] * len(self.buckets)
+            for key, counts in self.latency.items():
+                if ((array is not None and key[0] != array)
+                        or (method is not None and key[1] != method)
+                        or (template is not None and key[2] != template)):
+                    continue
+                for i, count in enumerate(counts):
+                    merged[i] += count
+        total = sum(merged)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets, merged):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    @staticmethod
+    def _labels(**labels):
+        return ','.join('%s="%s"' % (name, str(value).replace('"', '\\"'))
+                        for name, value in labels.items())
+
+    def prometheus(self):
+        """Metrics in the Prometheus text exposition format."""
+        p = self.PREFIX
+        lines = []
+        with self._lock:
+            lines.append('# TYPE %s_requests_total counter' % p)
+            for (array, method, uri, status), count in \
+                    sorted(self.requests.items(), key=str):
+                lines.append('%s_requests_total{%s} %d' % (
+                    p, self._labels(array=array, method=method, uri=uri,
+                                    status=status or 'none'), count))
+            lines.append('# TYPE %s_request_errors_total counter' % p)
+            for (array, method, uri, error), count in \
+                    sorted(self.errors.items()):
+                lines.append('%s_request_errors_total{%s} %d' % (
+                    p, self._labels(array=array, method=method, uri=uri,
+                                    error=error), count))
+            lines.append('# TYPE %s_request_retries_total counter' % p)
+            for (array, method, uri), count in sorted(self.retries.items()):
+                lines.append('%s_request_retries_total{%s} %d' % (
+                    p, self._labels(array=array, method=method, uri=uri),
+                    count))
+            lines.append('# TYPE %s_request_duration_seconds histogram' % p)
+            for key in sorted(self.latency):
+                array, method, uri = key
+                labels = self._labels(array=array, method=method, uri=uri)
+                cumulative = 0
+                for bound, count in zip(self.buckets, self.latency[key]):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('%s_request_duration_seconds_bucket{%s,'
+                                 'le="%s"} %d' % (p, labels, le, cumulative))
+                total, count = self.latency_sum[key]
+                lines.append('%s_request_duration_seconds_sum{%s} %f'
+                             % (p, labels, total))
+                lines.append('%s_request_duration_seconds_count{%s} %d'
+                             % (p, labels, count))
+            lines.append('# TYPE %s_response_bytes summary' % p)
+            for key in sorted(self.response_bytes):
+                array, method, uri = key
+                labels = self._labels(array=array, method=method, uri=uri)
+                total, count = self.response_bytes[key]
+                lines.append('%s_response_bytes_sum{%s} %d'
+                             % (p, labels, total))
+                lines.append('%s_response_bytes_count{%s} %d'
+                             % (p, labels, count))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,257 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Indexed in-memory inventory of a Vexata array.
+
+    inv = Inventory.from_proxy(proxy, snapshots=True)
+    vol = inv.volumes.get(vol_uuid, 'voluuid')
+    egs = inv.egs_of_volume(vol['id'])
+
+The inventory is a point in time view built from one sweep of the list
+endpoints, lookups never call the array.
+"""
+
+import collections
+import concurrent.futures
+
+
+class Collection(object):
+    """Objects of one type, indexed by one or more keys."""
+
+    def __init__(self, items=(), keys=('id',)):
+        self.keys = tuple(keys)
+        self._items = collections.OrderedDict()
+        self._indexes = dict((key, {}) for key in self.keys)
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __contains__(self, item_id):
+        return item_id in self._items
+
+    def add(self, item):
+        """Add or replace an item, items are keyed by their 'id'."""
+        old = self._items.get(item['id'])
+        if old is not None:
+            self.remove(item['id'])
+        self._items[item['id']] = item
+        for key in self.keys:
+            value = item.get(key)
+            if value is not None:
+                self._indexes[key][value] = item
+
+    def remove(self, item_id):
+        item = self._items.pop(item_id, None)
+        if item is None:
+            return None
+        for key in self.keys:
+            value = item.get(key)
+            if self._indexes[key].get(value) is item:
+                del self._indexes[key][value]
+        return item
+
+    def get(self, value, key='id'):
+        """Item whose key equals value, None if not found."""
+        return self._indexes[key].get(value)
+
+    def ids(self):
+        return list(self._items)
+
+
+class Inventory(object):
+    # collection -> proxy method returning it
+    LIST_METHODS = collections.OrderedDict([
+        ('volumes', 'list_volumes'),
+        ('initiators', 'list_initiators'),
+        ('saports', 'list_saports'),
+        ('vgs', 'list_vgs'),
+        ('igs', 'list_igs'),
+        ('pgs', 'list_pgs'),
+        ('egs', 'list_egs'),
+    ])
+    # collection -> indexed keys
+    KEYS = {
+        'volumes': ('id', 'name', 'voluuid'),
+        'snapshots': ('id', 'name', 'voluuid'),
+        'initiators': ('id', 'name', 'memberId'),
+        'saports': ('id', 'name'),
+        'vgs': ('id', 'name', 'uuid'),
+        'igs': ('id', 'name', 'uuid'),
+        'pgs': ('id', 'name', 'uuid'),
+        'egs': ('id', 'name', 'uuid'),
+    }
+    MAX_WORKERS = 8
+
+    def __init__(self,
+                 volumes=(),
+                 snapshots=(),
+                 initiators=(),
+                 saports=(),
+                 vgs=(),
+                 igs=(),
+                 pgs=(),
+                 egs=()):
+        """Init method.
+
+        Each argument is the list returned by the matching list_* call.
+        Entries of volumes flagged as 'snapshot' go to snapshots.
+        """
+        self.volumes = Collection(keys=self.KEYS['volumes'])
+        self.snapshots = Collection(snapshots, self.KEYS['snapshots'])
+        for vol in volumes:
+            if vol.get('snapshot'):
+                self.snapshots.add(vol)
+            else:
+                self.volumes.add(vol)
+        self.initiators = Collection(initiators, self.KEYS['initiators'])
+        self.saports = Collection(saports, self.KEYS['saports'])
+        self.vgs = Collection(vgs, self.KEYS['vgs'])
+        self.igs = Collection(igs, self.KEYS['igs'])
+        self.pgs = Collection(pgs, self.KEYS['pgs'])
+        self.egs = Collection(egs, self.KEYS['egs'])
+        self.reindex()
+
+    @classmethod
+    def fetch(cls, proxy, names=None, max_workers=None):
+        """Fetch collections in parallel.
+
+        :param proxy: VexataAPIProxy of the array
+        :param names: Collections to fetch (keys of LIST_METHODS), None
+                      for all
+        :param max_workers: Max calls in flight, None to use default
+                            (MAX_WORKERS)
+        Returns a dict of name -> list, None for failed calls.
+        """
+        names = list(cls.LIST_METHODS) if names is None else list(names)
+        max_workers = max_workers or cls.MAX_WORKERS
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            futures = [executor.submit(getattr(proxy, cls.LIST_METHODS[name]))
+                       for name in names]
+            return dict((name, future.result())
+                        for name, future in zip(names, futures))
+
+    @classmethod
+    def from_proxy(cls, proxy, snapshots=False, max_workers=None):
+        """Build an inventory from one sweep of the list endpoints.
+
+        :param proxy: VexataAPIProxy of the array
+        :param snapshots: Also fetch the snapshots of every volume, one
+                          call per volume
+        :param max_workers: Max calls in flight, None to use default
+                            (MAX_WORKERS)
+        """
+        lists = cls.fetch(proxy, max_workers=max_workers)
+        for name, rsp in lists.items():
+            if rsp is None:
+                raise RuntimeError('%s failed on %s'
+                                   % (cls.LIST_METHODS[name], proxy.ip))
+        if snapshots:
+            vol_ids = [vol['id'] for vol in lists['volumes']
+                       if not vol.get('snapshot')]
+            snaps = []
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers or cls.MAX_WORKERS) as executor:
+                for rsp in executor.map(proxy.list_volsnaps, vol_ids):
+                    snaps.extend(rsp or ())
+            lists['snapshots'] = snaps
+        return cls(**lists)
+
+    def reindex(self):
+        """Rebuild the reverse indexes after the collections changed."""
+        self._vgs_by_volume = collections.defaultdict(set)
+        self._igs_by_initiator = collections.defaultdict(set)
+        self._pgs_by_saport = collections.defaultdict(set)
+        self._egs_by_vg = collections.defaultdict(set)
+        self._egs_by_ig = collections.defaultdict(set)
+        self._egs_by_pg = collections.defaultdict(set)
+        self._snapshots_by_volume = collections.defaultdict(set)
+        for vg in self.vgs:
+            for vol_id in vg.get('currVolumes') or ():
+                self._vgs_by_volume[vol_id].add(vg['id'])
+        for ig in self.igs:
+            for ini_id in ig.get('currInitiators') or ():
+                self._igs_by_initiator[ini_id].add(ig['id'])
+        for pg in self.pgs:
+            for port_id in pg.get('currPorts') or ():
+                self._pgs_by_saport[port_id].add(pg['id'])
+        for eg in self.egs:
+            eg_tuple = eg.get('exportGroup3Tuple') or {}
+            if 'vgId' in eg_tuple:
+                self._egs_by_vg[eg_tuple['vgId']].add(eg['id'])
+            if 'igId' in eg_tuple:
+                self._egs_by_ig[eg_tuple['igId']].add(eg['id'])
+            if 'pgId' in eg_tuple:
+                self._egs_by_pg[eg_tuple['pgId']].add(eg['id'])
+        for snap in self.snapshots:
+            if snap.get('parentVolumeId') is not None:
+                self._snapshots_by_volume[snap['parentVolumeId']].add(
+                    snap['id'])
+
+    # -----------------------------------------------------------------
+    # Lookups
+    # -----------------------------------------------------------------
+    def find_volume_by_uuid(self, vol_uuid):
+        return self.volumes.get(vol_uuid, 'voluuid')
+
+    def find_volsnap_by_uuid(self, snap_uuid):
+        return self.snapshots.get(snap_uuid, 'voluuid')
+
+    def find_initiator_by_addr(self, ini_addr):
+        return self.initiators.get(ini_addr, 'memberId')
+
+    def find_saport_by_wwn(self, wwn):
+        return self.saports.get(wwn, 'name')
+
+    # -----------------------------------------------------------------
+    # Reverse lookups, all return sets of ids
+    # -----------------------------------------------------------------
+    def snapshots_of_volume(self, vol_id):
+        return set(self._snapshots_by_volume.get(vol_id, ()))
+
+    def vgs_of_volume(self, vol_id):
+        return set(self._vgs_by_volume.get(vol_id, ()))
+
+    def igs_of_initiator(self, ini_id):
+        return set(self._igs_by_initiator.get(ini_id, ()))
+
+    def pgs_of_saport(self, saport_id):
+        return set(self._pgs_by_saport.get(saport_id, ()))
+
+    def egs_of_vg(self, vg_id):
+        return set(self._egs_by_vg.get(vg_id, ()))
+
+    def egs_of_ig(self, ig_id):
+        return set(self._egs_by_ig.get(ig_id, ()))
+
+    def egs_of_pg(self, pg_id):
+        return set(self._egs_by_pg.get(pg_id, ()))
+
+    def egs_of_volume(self, vol_id):
+        egs = set()
+        for vg_id in self._vgs_by_volume.get(vol_id, ()):
+            egs.update(self._egs_by_vg.get(vg_id, ()))
+        return egs
+
+    def egs_of_initiator(self, ini_id):
+        egs = set()
+        for ig_id in self._igs_by_initiator.get(ini_id, ()):
+            egs.update(self._egs_by_ig.get(ig_id, ()))
+        return egs
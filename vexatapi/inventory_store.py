@@ -0,0 +1,492 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Inventory of arrays persisted in SQLite, shared between processes.
+
+    store = InventoryStore('/var/cache/vexata/inventory.db')
+    stored = StoredInventory(store, proxy)
+    inv = stored.get()
+    vol = inv.volumes.get(vol_name, 'name')
+
+A process starting with a populated store answers lookups without
+calling the array. Collections are stored per array, each with the time
+it was last listed from the array and a generation bumped whenever one
+of its objects changes. get() first refreshes the collections older
+than max_age.
+
+Any number of processes may read the store at the same time, SQLite
+runs in WAL mode. A refresh leases the collections it lists so that one
+process at a time calls the array for them. The others keep reading the
+stored objects meanwhile, or wait for them if there are none yet.
+
+The list endpoints have no conditional requests: a refresh still lists
+whole collections, but only writes the objects that changed and the
+deletions. A StoredInventory then applies the objects changed since the
+generations it holds, without re-reading the rest.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from vexatapi.inventory import Inventory
+
+LOG = logging.getLogger(__name__)
+
+# Stored collections, snapshots are listed by list_volumes along with the
+# volumes and stored apart as they share the id space of the volumes.
+COLLECTIONS = ('volumes', 'snapshots', 'initiators', 'saports', 'vgs',
+               'igs', 'pgs', 'egs')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS collections (
+    array TEXT NOT NULL,
+    name TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    refreshed REAL NOT NULL,
+    -- Deletions up to this generation are forgotten
+    floor INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (array, name)
+);
+CREATE TABLE IF NOT EXISTS objects (
+    array TEXT NOT NULL,
+    name TEXT NOT NULL,
+    id NOT NULL,
+    generation INTEGER NOT NULL,
+    changed REAL NOT NULL,
+    digest BLOB,
+    -- JSON of the object, NULL once deleted
+    body TEXT,
+    PRIMARY KEY (array, name, id)
+);
+CREATE INDEX IF NOT EXISTS objects_generation
+    ON objects (array, name, generation);
+CREATE TABLE IF NOT EXISTS leases (
+    array TEXT NOT NULL,
+    name TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (array, name)
+);
+"""
+
+
+def array_key(proxy):
+    """Key of the array of a proxy in the store."""
+    return proxy._url('')
+
+
+def _stored_names(names):
+    """Stored collections of Inventory.LIST_METHODS names."""
+    stored = []
+    for name in names:
+        stored.append(name)
+        if name == 'volumes':
+            stored.append('snapshots')
+    return stored
+
+
+class InventoryStore(object):
+    # Seconds a stored collection is used without refreshing it
+    MAX_AGE = 60
+    # Seconds a refresh may take before another process takes over
+    LEASE = 120
+    # Seconds deletions are kept for StoredInventory.update(), past that
+    # an inventory holding an older generation reloads the collection.
+    TOMBSTONE_AGE = 86400
+    # Seconds between checks while waiting for another process' refresh
+    POLL_INTERVAL = 0.1
+    BUSY_TIMEOUT = 30
+
+    def __init__(self, path, lease=None, tombstone_age=None):
+        """Init method.
+
+        :param path: SQLite database file, created if missing. Keep it
+                     on a local filesystem, SQLite locking is unreliable
+                     on network filesystems.
+        :param lease: Seconds a refresh may take, None to use default
+                      (LEASE)
+        :param tombstone_age: Seconds deletions are remembered, None to
+                              use default (TOMBSTONE_AGE)
+        """
+        self.path = path
+        self.lease = lease or self.LEASE
+        self.tombstone_age = tombstone_age or self.TOMBSTONE_AGE
+        self.owner = '%s:%d:%s' % (socket.gethostname(), os.getpid(),
+                                   os.urandom(4).hex())
+        self._lock = threading.Lock()
+        # Transactions are explicit, one at a time per store
+        self._db = sqlite3.connect(path, timeout=self.BUSY_TIMEOUT,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @contextlib.contextmanager
+    def _transaction(self, write=False):
+        # Reads see one snapshot of the store, writes are serialized
+        # between processes from their start.
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+    def collections(self, array):
+        """Dict of stored collection -> (generation, refresh time)."""
+        with self._transaction() as db:
+            return self._collections(db, array)
+
+    @staticmethod
+    def _collections(db, array):
+        return dict((name, (generation, refreshed))
+                    for name, generation, refreshed in db.execute(
+                        'SELECT name, generation, refreshed '
+                        'FROM collections WHERE array = ?', (array,)))
+
+    @staticmethod
+    def _objects(db, array, name, since=None):
+        sql = ('SELECT body FROM objects WHERE array = ? AND name = ? '
+               'AND body IS NOT NULL')
+        args = (array, name)
+        if since is not None:
+            sql += ' AND generation > ?'
+            args += (since,)
+        return [json.loads(body)
+                for body, in db.execute(sql + ' ORDER BY id', args)]
+
+    def load(self, array, names=COLLECTIONS):
+        """Stored objects of an array.
+
+        :param array: array_key() of the array
+        :param names: Stored collections to load
+        Returns (dict of name -> list of objects, dict of name ->
+        generation), collections never stored are left out.
+        """
+        with self._transaction() as db:
+            stored = self._collections(db, array)
+            lists = {}
+            generations = {}
+            for name in names:
+                if name in stored:
+                    lists[name] = self._objects(db, array, name)
+                    generations[name] = stored[name][0]
+            return lists, generations
+
+    def changes(self, array, since):
+        """Objects changed after the given generations.
+
+        :param array: array_key() of the array
+        :param since: Dict of stored collection -> generation held
+        Returns a dict of name -> (generation, objects, deleted ids) of
+        the collections whose generation moved. Deleted ids are None when
+        deletions that old are forgotten, objects are then the whole
+        collection.
+        """
+        changes = {}
+        with self._transaction() as db:
+            for name, generation, floor in db.execute(
+                    'SELECT name, generation, floor FROM collections '
+                    'WHERE array = ?', (array,)).fetchall():
+                held = since.get(name)
+                if held is None or held == generation:
+                    continue
+                if held < floor:
+                    changes[name] = (generation,
+                                     self._objects(db, array, name), None)
+                    continue
+                deleted = [obj_id for obj_id, in db.execute(
+                    'SELECT id FROM objects WHERE array = ? AND name = ? '
+                    'AND generation > ? AND body IS NULL',
+                    (array, name, held))]
+                changes[name] = (generation,
+                                 self._objects(db, array, name, held),
+                                 deleted)
+        return changes
+
+    @staticmethod
+    def _encode(items):
+        rows = {}
+        for item in items:
+            body = json.dumps(item, sort_keys=True, separators=(',', ':'))
+            digest = hashlib.blake2b(body.encode('utf-8'),
+                                     digest_size=16).digest()
+            rows[item['id']] = (digest, body)
+        return rows
+
+    def save(self, array, lists, now=None):
+        """Store collections listed from an array.
+
+        Only the objects that changed, and the deletions, are written,
+        the generation of a collection only moves if some were.
+
+        :param array: array_key() of the array
+        :param lists: Dict of stored collection -> list of objects
+        :param now: Time of the listing, None for now
+        Returns a dict of name -> generation.
+        """
+        now = time.time() if now is None else now
+        # Encoded before taking the write lock of the database
+        encoded = dict((name, self._encode(items))
+                       for name, items in lists.items())
+        generations = {}
+        with self._transaction(write=True) as db:
+            for name, rows in encoded.items():
+                row = db.execute('SELECT generation FROM collections '
+                                 'WHERE array = ? AND name = ?',
+                                 (array, name)).fetchone()
+                generation = (row[0] if row else 0) + 1
+                digests = dict(db.execute(
+                    'SELECT id, digest FROM objects WHERE array = ? '
+                    'AND name = ? AND body IS NOT NULL', (array, name)))
+                upserts = [(array, name, obj_id, generation, now, digest,
+                            body)
+                           for obj_id, (digest, body) in rows.items()
+                           if digests.get(obj_id) != digest]
+                deleted = [(generation, now, array, name, obj_id)
+                           for obj_id in digests if obj_id not in rows]
+                if upserts or deleted or row is None:
+                    db.executemany('INSERT OR REPLACE INTO objects '
+                                   'VALUES (?, ?, ?, ?, ?, ?, ?)', upserts)
+                    db.executemany('UPDATE objects SET generation = ?, '
+                                   'changed = ?, digest = NULL, body = NULL '
+                                   'WHERE array = ? AND name = ? AND id = ?',
+                                   deleted)
+                else:
+                    generation -= 1
+                db.execute('INSERT INTO collections '
+                           '(array, name, generation, refreshed) '
+                           'VALUES (?, ?, ?, ?) '
+                           'ON CONFLICT (array, name) DO UPDATE SET '
+                           'generation = excluded.generation, '
+                           'refreshed = excluded.refreshed',
+                           (array, name, generation, now))
+                self._purge(db, array, name, now)
+                generations[name] = generation
+        return generations
+
+    def _purge(self, db, array, name, now):
+        """Forget the deletions older than tombstone_age."""
+        floor, = db.execute('SELECT MAX(generation) FROM objects '
+                            'WHERE array = ? AND name = ? AND body IS NULL '
+                            'AND changed < ?',
+                            (array, name, now - self.tombstone_age)
+                            ).fetchone()
+        if floor is None:
+            return
+        db.execute('DELETE FROM objects WHERE array = ? AND name = ? '
+                   'AND body IS NULL AND generation <= ?',
+                   (array, name, floor))
+        db.execute('UPDATE collections SET floor = MAX(floor, ?) '
+                   'WHERE array = ? AND name = ?', (floor, array, name))
+
+    # -----------------------------------------------------------------
+    # Refresh from the array
+    # -----------------------------------------------------------------
+    @staticmethod
+    def _stale(stored, name, max_age, now):
+        for stored_name in _stored_names([name]):
+            if stored_name not in stored:
+                return True
+            if now - stored[stored_name][1] >= max_age:
+                return True
+        return False
+
+    def _acquire(self, array, names, max_age):
+        """Lease the collections of names still stale, return them."""
+        now = time.time()
+        leased = []
+        with self._transaction(write=True) as db:
+            stored = self._collections(db, array)
+            for name in names:
+                if not self._stale(stored, name, max_age, now):
+                    continue
+                row = db.execute('SELECT owner, expires FROM leases '
+                                 'WHERE array = ? AND name = ?',
+                                 (array, name)).fetchone()
+                if row is not None and row[0] != self.owner \
+                        and row[1] > now:
+                    continue
+                db.execute('INSERT OR REPLACE INTO leases '
+                           'VALUES (?, ?, ?, ?)',
+                           (array, name, self.owner, now + self.lease))
+                leased.append(name)
+        return leased
+
+    def _release(self, array, names):
+        with self._transaction(write=True) as db:
+            db.executemany('DELETE FROM leases WHERE array = ? AND name = ? '
+                           'AND owner = ?',
+                           [(array, name, self.owner) for name in names])
+
+    def _fetch(self, proxy, array, names, max_workers):
+        now = time.time()
+        lists = {}
+        for name, items in Inventory.fetch(proxy, names,
+                                           max_workers).items():
+            if items is None:
+                LOG.warning('%s failed on %s, keeping the stored %s',
+                            Inventory.LIST_METHODS[name], proxy.ip, name)
+            elif name == 'volumes':
+                lists['volumes'] = [vol for vol in items
+                                    if not vol.get('snapshot')]
+                lists['snapshots'] = [vol for vol in items
+                                      if vol.get('snapshot')]
+            else:
+                lists[name] = items
+        if lists:
+            self.save(array, lists, now)
+        return list(lists)
+
+    def refresh(self, proxy, collections=None, max_age=None,
+                max_workers=None, wait=True):
+        """List from the array the collections older than max_age.
+
+        Collections being refreshed by another process are skipped, or
+        waited for if never stored and wait is set.
+
+        :param proxy: VexataAPIProxy of the array
+        :param collections: Collections to refresh (keys of
+                            Inventory.LIST_METHODS), None for all
+        :param max_age: Seconds since the last refresh past which a
+                        collection is refreshed, None to use default
+                        (MAX_AGE), 0 to always refresh
+        :param max_workers: Max list calls in flight
+        :param wait: Wait up to lease seconds for the collections never
+                     stored that another process is listing
+        Returns the list of stored collections refreshed by this call.
+        """
+        array = array_key(proxy)
+        names = list(Inventory.LIST_METHODS if collections is None
+                     else collections)
+        max_age = self.MAX_AGE if max_age is None else max_age
+        give_up_at = time.monotonic() + self.lease
+        refreshed = []
+        tried = set()
+        while True:
+            stored = self.collections(array)
+            now = time.time()
+            stale = [name for name in names if name not in tried
+                     and self._stale(stored, name, max_age, now)]
+            if not stale:
+                return refreshed
+            leased = self._acquire(array, stale, max_age)
+            if leased:
+                try:
+                    refreshed.extend(self._fetch(proxy, array, leased,
+                                                 max_workers))
+                finally:
+                    tried.update(leased)
+                    self._release(array, leased)
+                continue
+            missing = [name for name in stale
+                       if not set(_stored_names([name])) <= set(stored)]
+            if not missing or not wait or time.monotonic() > give_up_at:
+                return refreshed
+            time.sleep(self.POLL_INTERVAL)
+
+
+class StoredInventory(object):
+    """Inventory of one array, kept in step with an InventoryStore.
+
+    The Inventory is updated in place, as with InventorySync.
+    """
+
+    def __init__(self, store, proxy, collections=None, max_age=None,
+                 max_workers=None):
+        """Init method.
+
+        :param store: InventoryStore
+        :param proxy: VexataAPIProxy of the array
+        :param collections: Collections to keep (keys of
+                            Inventory.LIST_METHODS), None for all
+        :param max_age: Seconds a collection is used before get()
+                        refreshes it, None to use default
+                        (InventoryStore.MAX_AGE)
+        :param max_workers: Max list calls in flight per refresh
+        """
+        self.store = store
+        self.proxy = proxy
+        self.array = array_key(proxy)
+        self.collections = (list(Inventory.LIST_METHODS)
+                            if collections is None else list(collections))
+        self.max_age = store.MAX_AGE if max_age is None else max_age
+        self.max_workers = max_workers
+        self.inventory = None
+        # Stored collection -> generation held by the inventory
+        self.generations = {}
+        self._lock = threading.Lock()
+
+    def update(self):
+        """Apply the changes found in the store, never calls the array.
+
+        Returns the list of stored collections that changed.
+        """
+        names = _stored_names(self.collections)
+        with self._lock:
+            if self.inventory is None:
+                lists, self.generations = self.store.load(self.array,
+                                                          names)
+                self.inventory = Inventory(**lists)
+                return sorted(lists)
+            since = dict((name, self.generations.get(name, 0))
+                         for name in names)
+            changes = self.store.changes(self.array, since)
+            inv = self.inventory
+            for name, (generation, objects, deleted) in changes.items():
+                current = getattr(inv, name)
+                if deleted is None:
+                    deleted = current.ids()
+                for obj_id in deleted:
+                    current.remove(obj_id)
+                for obj in objects:
+                    current.add(obj)
+                self.generations[name] = generation
+            if changes:
+                inv.reindex()
+            return sorted(changes)
+
+    def get(self, max_age=None):
+        """Inventory whose collections are at most max_age seconds old.
+
+        Older collections are first refreshed from the array, by this
+        process or another one.
+        """
+        self.store.refresh(self.proxy, self.collections,
+                           self.max_age if max_age is None else max_age,
+                           self.max_workers)
+        self.update()
+        return self.inventory
@@ -0,0 +1,100 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Incremental parsing of JSON arrays.
+
+    parser = ArrayParser()
+    for chunk in rsp.iter_content(65536):
+        for item in parser.feed(chunk):
+            handle(item)
+    parser.close()
+
+Only the items of the top-level array are decoded, one at a time, so
+memory use is bounded by the largest item rather than the whole body.
+"""
+
+import codecs
+import json
+import re
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class ArrayParser(object):
+    # States, what the parser expects next
+    START = 0       # '['
+    FIRST = 1       # item or ']'
+    ITEM = 2        # item
+    NEXT = 3        # ',' or ']'
+    DONE = 4
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._state = self.START
+
+    def feed(self, chunk):
+        """Parse chunk (bytes), return the list of items it completed."""
+        buf = self._buf + self._utf8.decode(chunk)
+        items = []
+        pos = 0
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos == len(buf):
+                break
+            char = buf[pos]
+            if self._state == self.START:
+                if char != '[':
+                    raise ValueError('Expected a JSON array')
+                self._state = self.FIRST
+                pos += 1
+            elif self._state == self.DONE:
+                raise ValueError('Extra data after JSON array')
+            elif char == ']' and self._state in (self.FIRST, self.NEXT):
+                self._state = self.DONE
+                pos += 1
+            elif self._state == self.NEXT:
+                if char != ',':
+                    raise ValueError('Expected "," or "]" at %r'
+                                     % buf[pos:pos + 20])
+                self._state = self.ITEM
+                pos += 1
+            else:
+                try:
+                    item, end = self._decoder.raw_decode(buf, pos)
+                except ValueError:
+                    # Incomplete item, wait for more data
+                    break
+                after = _WHITESPACE.match(buf, end).end()
+                if after == len(buf) or buf[after] not in ',]':
+                    # A number may continue in the next chunk
+                    break
+                items.append(item)
+                self._state = self.NEXT
+                pos = end
+        self._buf = buf[pos:]
+        return items
+
+    def close(self):
+        """Parse the end of the body, return the remaining items.
+
+        Raises ValueError if the body was not a complete JSON array.
+        """
+        items = self.feed(self._utf8.decode(b'', final=True).encode())
+        if self._state != self.DONE or self._buf:
+            raise ValueError('Truncated JSON array')
+        return items
@@ -0,0 +1,229 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Array-wide LUN mappings, indexed by volume and by host.
+
+    lunmap = LunMapCrawler(proxy)
+    lunmap.refresh()
+    for path in lunmap.paths_of_volume(64):
+        print(path.initiator_wwn, path.port_wwn, path.host_lun_id)
+
+list_lun_mappings() answers for one initiator/port pair. The crawler
+only asks for the pairs an export group can map, the initiators of its
+initiator group times the ports of its port group, in parallel.
+
+Every refresh() re-reads the groups, and only re-fetches the pairs whose
+export groups or volume group members changed since the last refresh.
+"""
+
+import collections
+import concurrent.futures
+import logging
+import threading
+
+from vexatapi.inventory import Inventory
+
+LOG = logging.getLogger(__name__)
+
+LunPath = collections.namedtuple('LunPath',
+                                 ['volume_id', 'initiator_id', 'saport_id',
+                                  'host_lun_id', 'initiator_wwn',
+                                  'port_wwn'])
+LunPath.__doc__ = """Volume seen by an initiator through an array port.
+
+:param volume_id: Volume id
+:param initiator_id: Initiator id
+:param saport_id: Storage array port id
+:param host_lun_id: LUN of the volume on that path
+:param initiator_wwn: WWN of the initiator
+:param port_wwn: WWN of the array port
+"""
+
+
+class LunMapCrawler(object):
+    # Collections deciding which pairs are mapped
+    GROUPS = ('vgs', 'igs', 'pgs', 'egs')
+    MAX_WORKERS = 16
+
+    def __init__(self, proxy, max_workers=None):
+        """Init method.
+
+        :param proxy: VexataAPIProxy of the array
+        :param max_workers: Max list_lun_mappings calls in flight, None to
+                            use default (MAX_WORKERS)
+        """
+        self.proxy = proxy
+        self.max_workers = max_workers or self.MAX_WORKERS
+        # (initiator id, port id) -> LunPaths of the pair
+        self._paths = {}
+        # (initiator id, port id) -> export groups mapping the pair, as
+        # of the last successful fetch of the pair
+        self._signatures = {}
+        self._paths_by_volume = collections.defaultdict(set)
+        self._ports_by_initiator = collections.defaultdict(set)
+        # IG id -> initiator ids
+        self._igs = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def mapped_pairs(inventory):
+        """(initiator id, port id) -> signature of the pairs to crawl.
+
+        The signature changes whenever the export groups of the pair, or
+        the members of their volume groups, change.
+        """
+        pairs = collections.defaultdict(set)
+        for eg in inventory.egs:
+            eg_tuple = eg.get('exportGroup3Tuple') or {}
+            vg = inventory.vgs.get(eg_tuple.get('vgId'))
+            ig = inventory.igs.get(eg_tuple.get('igId'))
+            pg = inventory.pgs.get(eg_tuple.get('pgId'))
+            if vg is None or ig is None or pg is None:
+                continue
+            volumes = tuple(vg.get('currVolumes') or ())
+            for ini_id in ig.get('currInitiators') or ():
+                for port_id in pg.get('currPorts') or ():
+                    pairs[(ini_id, port_id)].add((eg['id'], vg['id'],
+                                                  volumes))
+        return dict((pair, frozenset(eg_keys))
+                    for pair, eg_keys in pairs.items())
+
+    def _fetch(self, pair):
+        mappings = self.proxy.list_lun_mappings(*pair)
+        if mappings is None:
+            raise RuntimeError('list_lun_mappings%s failed on %s'
+                               % (pair, self.proxy.ip))
+        paths = []
+        for itn in mappings:
+            for mapping in itn['volumeMappings'] or ():
+                paths.append(LunPath(mapping['volumeId'], pair[0], pair[1],
+                                     mapping['hostLunId'],
+                                     itn.get('initiatorWwn'),
+                                     itn.get('portWwn')))
+        return tuple(paths)
+
+    def _set_paths(self, pair, paths):
+        """Replace the paths of pair in the indexes, lock held."""
+        for path in self._paths.pop(pair, ()):
+            vol_paths = self._paths_by_volume[path.volume_id]
+            vol_paths.discard(path)
+            if not vol_paths:
+                del self._paths_by_volume[path.volume_id]
+        ports = self._ports_by_initiator[pair[0]]
+        if paths:
+            self._paths[pair] = paths
+            for path in paths:
+                self._paths_by_volume[path.volume_id].add(path)
+            ports.add(pair[1])
+        else:
+            ports.discard(pair[1])
+            if not ports:
+                del self._ports_by_initiator[pair[0]]
+
+    def refresh(self, inventory=None, force=False):
+        """Bring the indexes up to date with the array.
+
+        :param inventory: Inventory with current vgs, igs, pgs and egs,
+                          e.g. of an InventorySync, None to fetch them
+        :param force: Re-fetch all mapped pairs, not only changed ones
+        Returns a dict of (initiator id, port id) -> exception of the
+        pairs that could not be fetched. Their previous paths are kept,
+        and they are fetched again on the next refresh.
+        """
+        if inventory is None:
+            lists = Inventory.fetch(self.proxy, self.GROUPS)
+            for name, rsp in lists.items():
+                if rsp is None:
+                    raise RuntimeError('%s failed on %s'
+                                       % (Inventory.LIST_METHODS[name],
+                                          self.proxy.ip))
+            inventory = Inventory(**lists)
+        pairs = self.mapped_pairs(inventory)
+        with self._lock:
+            stale = [pair for pair in set(self._paths) | set(self._signatures)
+                     if pair not in pairs]
+            changed = [pair for pair, signature in pairs.items()
+                       if force or self._signatures.get(pair) != signature]
+        errors = {}
+        fetched = {}
+        if changed:
+            with concurrent.futures.ThreadPoolExecutor(
+                    min(self.max_workers, len(changed))) as executor:
+                futures = dict((executor.submit(self._fetch, pair), pair)
+                               for pair in changed)
+                for future in concurrent.futures.as_completed(futures):
+                    pair = futures[future]
+                    try:
+                        fetched[pair] = future.result()
+                    except Exception as e:
+                        LOG.warning('LUN mappings of initiator %s port %s '
+                                    'failed: %s', pair[0], pair[1], e)
+                        errors[pair] = e
+        with self._lock:
+            for pair in stale:
+                self._set_paths(pair, ())
+                self._signatures.pop(pair, None)
+            for pair, paths in fetched.items():
+                self._set_paths(pair, paths)
+                self._signatures[pair] = pairs[pair]
+            for pair in errors:
+                self._signatures.pop(pair, None)
+            self._igs = dict((ig['id'], set(ig.get('currInitiators') or ()))
+                             for ig in inventory.igs)
+        return errors
+
+    # -----------------------------------------------------------------
+    # Lookups, as of the last refresh
+    # -----------------------------------------------------------------
+    def pairs(self):
+        """(initiator id, port id) of the pairs with mapped volumes."""
+        with self._lock:
+            return set(self._paths)
+
+    def paths_of_pair(self, ini_id, saport_id):
+        with self._lock:
+            return set(self._paths.get((ini_id, saport_id), ()))
+
+    def paths_of_volume(self, vol_id):
+        """LunPaths through which vol_id is seen."""
+        with self._lock:
+            return set(self._paths_by_volume.get(vol_id, ()))
+
+    def initiators_of_volume(self, vol_id):
+        with self._lock:
+            return set(path.initiator_id
+                       for path in self._paths_by_volume.get(vol_id, ()))
+
+    def paths_of_initiator(self, ini_id):
+        """LunPaths of all the volumes seen by an initiator."""
+        with self._lock:
+            paths = set()
+            for port_id in self._ports_by_initiator.get(ini_id, ()):
+                paths.update(self._paths[(ini_id, port_id)])
+            return paths
+
+    def volumes_of_initiator(self, ini_id):
+        return set(path.volume_id
+                   for path in self.paths_of_initiator(ini_id))
+
+    def volumes_of_ig(self, ig_id):
+        """Volumes seen by any initiator of a host's initiator group."""
+        with self._lock:
+            ini_ids = set(self._igs.get(ig_id, ()))
+        vol_ids = set()
+        for ini_id in ini_ids:
+            vol_ids.update(self.volumes_of_initiator(ini_id))
+        return vol_ids
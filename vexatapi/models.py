@@ -0,0 +1,282 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Compact typed models of the objects returned by the array.
+
+    proxy = VexataAPIProxy(ip, user, passwd, models=True)
+    vols = sorted(proxy.list_volumes(), key=lambda vol: vol.size_MiB)
+
+Models keep the frequently used fields in __slots__ attributes, with
+enum-like strings (state, type, WWNs) interned. Other fields are kept as
+a compact JSON string, decoded on access. Models also remain read-only
+mappings of the JSON keys, so code written against the raw dicts
+(vol['voluuid'], vg.get('currVolumes')) works unchanged.
+"""
+
+import array
+import json
+import sys
+
+from vexatapi.instrumentation import uri_template
+
+
+class Model(object):
+    __slots__ = ('_extra',)
+    # (attribute, JSON key) of the fields decoded into attributes
+    FIELDS = ()
+    # Attributes whose string values are interned
+    INTERN = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # JSON key -> attribute, including computed ones
+        cls._ATTRS = dict((key, attr) for attr, key in cls.FIELDS)
+        cls._ATTRS.update(getattr(cls, 'COMPUTED', {}))
+
+    @classmethod
+    def from_json(cls, obj):
+        """Model of the decoded JSON object obj."""
+        cls = cls._class_of(obj)
+        self = cls.__new__(cls)
+        obj = dict(obj)
+        self._decode(obj)
+        self._extra = (json.dumps(obj, separators=(',', ':'))
+                       if obj else None)
+        return self
+
+    @classmethod
+    def _class_of(cls, obj):
+        """Model class of obj, cls or one of its subclasses."""
+        return cls
+
+    def _decode(self, obj):
+        """Set the attributes from obj, popping the keys used."""
+        for attr, key in self.FIELDS:
+            value = obj.pop(key, None)
+            if attr in self.INTERN and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, attr, value)
+
+    @property
+    def extra(self):
+        """Fields without an attribute, decoded on every access."""
+        return json.loads(self._extra) if self._extra else {}
+
+    def to_json(self):
+        """Decoded JSON object of the model, as returned by the array."""
+        obj = self.extra
+        for key, attr in self._ATTRS.items():
+            value = getattr(self, attr)
+            if value is not None:
+                obj[key] = value
+        return obj
+
+    # Read-only mapping of the JSON keys, fields missing from the array
+    # response read as None.
+    def __getitem__(self, key):
+        attr = self._ATTRS.get(key)
+        if attr is not None:
+            return getattr(self, attr)
+        return self.extra[key]
+
+    def get(self, key, default=None):
+        attr = self._ATTRS.get(key)
+        if attr is not None:
+            value = getattr(self, attr)
+        else:
+            value = self.extra.get(key)
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return key in self._ATTRS or key in self.extra
+
+    def keys(self):
+        return self.to_json().keys()
+
+    def __eq__(self, other):
+        if isinstance(other, Model):
+            other = other.to_json()
+        if not isinstance(other, dict):
+            return NotImplemented
+        return self.to_json() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+            '%s=%r' % (attr, getattr(self, attr))
+            for attr, _ in self.FIELDS[:3]))
+
+
+class Volume(Model):
+    FIELDS = (('id', 'id'),
+              ('name', 'name'),
+              ('description', 'description'),
+              ('size_MiB', 'volSize'),
+              ('uuid', 'voluuid'),
+              ('snapshot', 'snapshot'),
+              ('state', 'state'))
+    INTERN = ('state',)
+    __slots__ = tuple(attr for attr, _ in FIELDS)
+
+    @classmethod
+    def _class_of(cls, obj):
+        # Volume lists include the snapshots
+        if cls is Volume and obj.get('snapshot'):
+            return Snapshot
+        return cls
+
+
+class Snapshot(Volume):
+    FIELDS = Volume.FIELDS + (('parent_volume_id', 'parentVolumeId'),)
+    __slots__ = ('parent_volume_id',)
+
+
+class Initiator(Model):
+    FIELDS = (('id', 'id'),
+              ('name', 'name'),
+              ('description', 'description'),
+              ('address', 'memberId'),
+              ('type', 'initiatorType'))
+    INTERN = ('type',)
+    __slots__ = tuple(attr for attr, _ in FIELDS)
+
+
+class SAPort(Model):
+    FIELDS = (('id', 'id'),
+              ('name', 'name'),
+              ('state', 'state'),
+              ('type', 'type'),
+              ('name_type', 'nameType'))
+    INTERN = ('name', 'state', 'type', 'name_type')
+    __slots__ = tuple(attr for attr, _ in FIELDS)
+
+
+class VolumeGroup(Model):
+    FIELDS = (('id', 'id'),
+              ('name', 'name'),
+              ('description', 'description'),
+              ('volume_ids', 'currVolumes'),
+              ('num_volumes', 'numOfVols'),
+              ('export_group_ids', 'exportGroups'))
+    __slots__ = tuple(attr for attr, _ in FIELDS)
+
+
+class InitiatorGroup(Model):
+    FIELDS = (('id', 'id'),
+              ('name', 'name'),
+              ('description', 'description'),
+              ('initiator_ids', 'currInitiators'),
+              ('export_group_ids', 'exportGroups'))
+    __slots__ = tuple(attr for attr, _ in FIELDS)
+
+
+class PortGroup(Model):
+    FIELDS = (('id', 'id'),
+              ('name', 'name'),
+              ('description', 'description'),
+              ('saport_ids', 'currPorts'),
+              ('export_group_ids', 'exportGroups'))
+    __slots__ = tuple(attr for attr, _ in FIELDS)
+
+
+class ExportGroup(Model):
+    FIELDS = (('id', 'id'),
+              ('name', 'name'),
+              ('description', 'description'))
+    COMPUTED = {'exportGroup3Tuple': 'eg_tuple'}
+    __slots__ = tuple(attr for attr, _ in FIELDS) + ('vg_id', 'ig_id',
+                                                      'pg_id')
+
+    def _decode(self, obj):
+        super(ExportGroup, self)._decode(obj)
+        eg_tuple = obj.pop('exportGroup3Tuple', None) or {}
+        self.vg_id = eg_tuple.get('vgId')
+        self.ig_id = eg_tuple.get('igId')
+        self.pg_id = eg_tuple.get('pgId')
+
+    @property
+    def eg_tuple(self):
+        return {'vgId': self.vg_id, 'igId': self.ig_id, 'pgId': self.pg_id}
+
+
+class LunMapping(Model):
+    """Volumes mapped to one initiator/port (IT nexus).
+
+    Volume ids and host LUN ids are kept in arrays, volume_ids[i] is
+    mapped as host_lun_ids[i].
+    """
+    FIELDS = (('itn_id', 'itnId'),
+              ('initiator_wwn', 'initiatorWwn'),
+              ('port_wwn', 'portWwn'))
+    INTERN = ('initiator_wwn', 'port_wwn')
+    COMPUTED = {'volumeMappings': 'volume_mappings'}
+    __slots__ = tuple(attr for attr, _ in FIELDS) + ('volume_ids',
+                                                      'host_lun_ids')
+
+    def _decode(self, obj):
+        super(LunMapping, self)._decode(obj)
+        mappings = obj.pop('volumeMappings', None) or ()
+        self.volume_ids = array.array('q', [m['volumeId'] for m in mappings])
+        self.host_lun_ids = array.array('q', [m['hostLunId']
+                                              for m in mappings])
+
+    @property
+    def volume_mappings(self):
+        return [{'volumeId': vol_id, 'hostLunId': lun_id}
+                for vol_id, lun_id in zip(self.volume_ids,
+                                          self.host_lun_ids)]
+
+
+# URI template -> model of the objects it returns
+URI_MODELS = {
+    '/api/storagearrays/{sa_id}/volumes': Volume,
+    '/api/storagearrays/{sa_id}/volumes/{vol_id}': Volume,
+    '/api/storagearrays/{sa_id}/volumes/{vol_id}/snapshots': Snapshot,
+    '/api/storagearrays/{sa_id}/snapshots/{snap_id}/clones': Volume,
+    '/api/storagearrays/{sa_id}/initiators': Initiator,
+    '/api/storagearrays/{sa_id}/storagearrayports': SAPort,
+    '/api/storagearrays/{sa_id}/volumegroups': VolumeGroup,
+    '/api/storagearrays/{sa_id}/volumegroups/{vg_id}': VolumeGroup,
+    '/api/storagearrays/{sa_id}/volumegroups/{vg_id}/snapshots':
+        VolumeGroup,
+    '/api/storagearrays/{sa_id}/volumegroups/{vg_id}/snapshots/{snap_id}':
+        VolumeGroup,
+    '/api/storagearrays/{sa_id}/snapshotgroups/{snap_id}/clones':
+        VolumeGroup,
+    '/api/storagearrays/{sa_id}/initiatorgroups': InitiatorGroup,
+    '/api/storagearrays/{sa_id}/initiatorgroups/{ig_id}': InitiatorGroup,
+    '/api/storagearrays/{sa_id}/portgroups': PortGroup,
+    '/api/storagearrays/{sa_id}/portgroups/{pg_id}': PortGroup,
+    '/api/storagearrays/{sa_id}/exportgroups': ExportGroup,
+    '/api/storagearrays/{sa_id}/exportgroups/{eg_id}': ExportGroup,
+    '/api/storagearrays/{sa_id}/initiators/{ini_id}/ports/{saport_id}':
+        LunMapping,
+}
+
+
+def decode(uri, result):
+    """Models of the JSON result of a call to uri.
+
+    Results of URIs without a model, and empty results, are returned as
+    they are.
+    """
+    cls = URI_MODELS.get(uri_template(uri))
+    if cls is None or not result:
+        return result
+    if isinstance(result, list):
+        return [cls.from_json(obj) for obj in result]
+    return cls.from_json(result)
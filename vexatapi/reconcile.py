@@ -0,0 +1,431 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Declarative configuration of an array.
+
+    spec = {
+        'volumes': [
+            {'name': 'db1', 'size_MiB': 10240,
+             'snapshots': [{'name': 'db1_gold'}]},
+            {'name': 'db1_test', 'clone_of': 'db1_gold'},
+        ],
+        'initiators': [{'name': 'host1_0',
+                        'address': '10:00:00:90:fa:92:72:e4'}],
+        'vgs': [{'name': 'db_vg', 'volumes': ['db1', 'db1_test']}],
+        'igs': [{'name': 'host1_ig', 'initiators': ['host1_0']}],
+        'pgs': [{'name': 'fabric_a', 'ports': ['20:02:3c:91:2b:00:73:00']}],
+        'egs': [{'name': 'db_eg', 'vg': 'db_vg', 'ig': 'host1_ig',
+                 'pg': 'fabric_a'}],
+    }
+    for step in Reconciler(proxy).apply(spec, dry_run=True):
+        print(step.describe())
+    result = Reconciler(proxy).apply(spec)
+
+Objects are matched by name, initiators by address. The plan only
+holds the calls needed to go from the live state to the spec: creating
+missing objects, growing volumes, changing group members and export
+group tuples. With prune, objects of the collections present in the
+spec but missing from it are deleted, as are unlisted snapshots of the
+volumes that list theirs.
+
+Groups may refer to objects of the array that are not in the spec by
+name, ports by name (WWN) or id. Volume descriptions are only set at
+creation and volumes are never shrunk.
+
+The plan runs with vexatapi.executor.run_plan: creations before the
+groups using them, export groups deleted or moved before their groups,
+members removed from groups before being deleted, and independent
+calls in parallel.
+"""
+
+import collections
+
+from vexatapi.executor import (Ref, Step, run_plan)
+from vexatapi.inventory import Inventory
+
+COLLECTIONS = ('volumes', 'initiators', 'vgs', 'igs', 'pgs', 'egs')
+
+
+class _Planner(object):
+    """Steps taking an inventory to a spec."""
+
+    def __init__(self, spec, inventory, prune):
+        unknown = set(spec) - set(COLLECTIONS)
+        if unknown:
+            raise ValueError('Unknown spec collections %s'
+                             % ', '.join(sorted(unknown)))
+        self.inv = inventory
+        self.prune = prune
+        self.present = set(spec)
+        self.spec = {}
+        for name in COLLECTIONS:
+            self.spec[name] = self._by_name(name, spec.get(name) or ())
+        self.steps = []
+        # ids and Refs of the objects of the spec, by name
+        self._vol_ids = {}
+        self._snap_ids = {}
+        self._ini_ids = {}
+        self._group_ids = {'vgs': {}, 'igs': {}, 'pgs': {}}
+        # Snapshot name -> name of its volume in the spec
+        self._snap_parents = {}
+        for vol in self.spec['volumes'].values():
+            for snap in vol.get('snapshots') or ():
+                if snap['name'] in self._snap_parents:
+                    raise ValueError('Duplicate snapshot %s' % snap['name'])
+                self._snap_parents[snap['name']] = vol['name']
+        # (kind, id) -> steps after which the object is no longer used by
+        # a group or an export group, and can be deleted
+        self._released = collections.defaultdict(list)
+        self._resolving = set()
+
+    @staticmethod
+    def _by_name(collection, items):
+        by_name = collections.OrderedDict()
+        for item in items:
+            if 'name' not in item:
+                raise ValueError('%s entry without a name: %r'
+                                 % (collection, item))
+            if item['name'] in by_name:
+                raise ValueError('Duplicate %s name %s'
+                                 % (collection, item['name']))
+            by_name[item['name']] = item
+        return by_name
+
+    def _step(self, name, method, kwargs, after=()):
+        self.steps.append(Step(name, method, kwargs, after))
+        return name
+
+    @staticmethod
+    def _ids(members):
+        return set(member for member in members
+                   if not isinstance(member, Ref))
+
+    # -----------------------------------------------------------------
+    # Volumes & snapshots
+    # -----------------------------------------------------------------
+    def _volume(self, name):
+        """id or Ref of volume name of the spec."""
+        if name in self._vol_ids:
+            return self._vol_ids[name]
+        if name in self._resolving:
+            raise ValueError('Volume %s is a clone of itself' % name)
+        self._resolving.add(name)
+        vol = self.spec['volumes'][name]
+        live = self.inv.volumes.get(name, 'name')
+        desc = vol.get('description', '')
+        if live is not None:
+            vol_id = live['id']
+            size = vol.get('size_MiB')
+            if size is not None and size != live['volSize']:
+                if size < live['volSize']:
+                    raise ValueError('Cannot shrink volume %s from %s to '
+                                     '%s MiB' % (name, live['volSize'],
+                                                 size))
+                self._step('grow_volume:%s' % name, 'grow_volume',
+                           {'orig_vol_name': name,
+                            'orig_vol_desc': live.get('description', ''),
+                            'orig_vol_id': vol_id,
+                            'new_size_MiB': size})
+        elif vol.get('clone_of'):
+            snap_name = vol['clone_of']
+            if snap_name not in self._snap_parents:
+                raise ValueError('Volume %s is a clone of unknown snapshot '
+                                 '%s' % (name, snap_name))
+            snap_id = self._snapshot(self._snap_parents[snap_name],
+                                     snap_name)
+            vol_id = Ref(self._step('clone_volsnap:%s' % name,
+                                    'clone_volsnap_to_new_volume',
+                                    {'snap_id': snap_id, 'vol_name': name,
+                                     'vol_desc': desc}))
+        else:
+            if vol.get('size_MiB') is None:
+                raise ValueError('Volume %s needs size_MiB or clone_of'
+                                 % name)
+            vol_id = Ref(self._step('create_volume:%s' % name,
+                                    'create_volume',
+                                    {'vol_name': name, 'vol_desc': desc,
+                                     'vol_size_MiB': vol['size_MiB']}))
+        self._resolving.discard(name)
+        self._vol_ids[name] = vol_id
+        return vol_id
+
+    def _live_snapshots(self, vol_id):
+        if isinstance(vol_id, Ref):
+            return {}
+        snaps = (self.inv.snapshots.get(snap_id)
+                 for snap_id in self.inv.snapshots_of_volume(vol_id))
+        return dict((snap['name'], snap) for snap in snaps)
+
+    def _snapshot(self, vol_name, snap_name):
+        key = (vol_name, snap_name)
+        if key not in self._snap_ids:
+            vol_id = self._volume(vol_name)
+            live = self._live_snapshots(vol_id).get(snap_name)
+            if live is not None:
+                self._snap_ids[key] = live['id']
+            else:
+                snap = [snap for snap in
+                        self.spec['volumes'][vol_name]['snapshots']
+                        if snap['name'] == snap_name][0]
+                self._snap_ids[key] = Ref(self._step(
+                    'create_volsnap:%s/%s' % key, 'create_volsnap',
+                    {'parent_vol_id': vol_id, 'snap_name': snap_name,
+                     'snap_desc': snap.get('description', '')}))
+        return self._snap_ids[key]
+
+    def volumes(self):
+        for name, vol in self.spec['volumes'].items():
+            self._volume(name)
+            for snap in vol.get('snapshots') or ():
+                self._snapshot(name, snap['name'])
+
+    # -----------------------------------------------------------------
+    # Initiators & groups
+    # -----------------------------------------------------------------
+    def initiators(self):
+        for name, ini in self.spec['initiators'].items():
+            if 'address' not in ini:
+                raise ValueError('Initiator %s without an address' % name)
+            live = self.inv.find_initiator_by_addr(ini['address'])
+            if live is not None:
+                self._ini_ids[name] = live['id']
+            else:
+                self._ini_ids[name] = Ref(self._step(
+                    'add_initiator:%s' % name, 'add_initiator',
+                    {'ini_name': name,
+                     'ini_desc': ini.get('description', ''),
+                     'ini_addr': ini['address']}))
+
+    def _member(self, kind, name):
+        """id or Ref of a group member, of the spec or of the array."""
+        if kind == 'volumes':
+            if name in self.spec['volumes']:
+                return self._volume(name)
+            live = self.inv.volumes.get(name, 'name')
+        elif kind == 'initiators':
+            if name in self._ini_ids:
+                return self._ini_ids[name]
+            live = (self.inv.initiators.get(name, 'name')
+                    or self.inv.find_initiator_by_addr(name))
+        else:
+            live = (self.inv.saports.get(name, 'name')
+                    or self.inv.saports.get(name))
+        if live is None:
+            raise ValueError('Unknown %s %s' % (kind[:-1], name))
+        return live['id']
+
+    # collection -> (member collection, spec key, members key, method
+    # suffix, argument prefix, modify add/rm arguments, member kind)
+    GROUPS = collections.OrderedDict([
+        ('vgs', ('volumes', 'volumes', 'currVolumes', 'vg', 'vol_ids',
+                 'add_vol_ids', 'rm_vol_ids', 'vol')),
+        ('igs', ('initiators', 'initiators', 'currInitiators', 'ig',
+                 'ini_ids', 'add_ini_ids', 'rm_ini_ids', 'ini')),
+        ('pgs', ('saports', 'ports', 'currPorts', 'pg', 'saport_ids',
+                 'add_port_ids', 'rm_port_ids', 'port')),
+    ])
+
+    def groups(self):
+        for collection, (kind, spec_key, members_key, prefix, create_arg,
+                         add_arg, rm_arg, member_kind) in self.GROUPS.items():
+            live_groups = getattr(self.inv, collection)
+            for name, group in self.spec[collection].items():
+                members = [self._member(kind, member)
+                           for member in group.get(spec_key) or ()]
+                live = live_groups.get(name, 'name')
+                desc = group.get('description')
+                if live is None:
+                    step = self._step(
+                        'create_%s:%s' % (prefix, name),
+                        'create_%s' % prefix,
+                        {'%s_name' % prefix: name,
+                         '%s_desc' % prefix: desc or '',
+                         create_arg: members})
+                    self._group_ids[collection][name] = Ref(step)
+                    continue
+                self._group_ids[collection][name] = live['id']
+                current = set(live.get(members_key) or ())
+                add = [member for member in members
+                       if isinstance(member, Ref) or member not in current]
+                rm = sorted(current - self._ids(members))
+                if desc is None:
+                    desc = live.get('description', '')
+                if not add and not rm and desc == live.get('description',
+                                                           ''):
+                    continue
+                step = self._step(
+                    'modify_%s:%s' % (prefix, name), 'modify_%s' % prefix,
+                    {'%s_id' % prefix: live['id'],
+                     '%s_name' % prefix: name,
+                     '%s_desc' % prefix: desc,
+                     add_arg: add, rm_arg: rm})
+                for member_id in rm:
+                    self._released[(member_kind, member_id)].append(step)
+
+    def _group(self, collection, name):
+        if name in self._group_ids[collection]:
+            return self._group_ids[collection][name]
+        live = getattr(self.inv, collection).get(name, 'name')
+        if live is None:
+            raise ValueError('Unknown %s %s' % (collection[:-1], name))
+        return live['id']
+
+    def egs(self):
+        for name, eg in self.spec['egs'].items():
+            try:
+                eg_tuple = (self._group('vgs', eg['vg']),
+                            self._group('igs', eg['ig']),
+                            self._group('pgs', eg['pg']))
+            except KeyError as e:
+                raise ValueError('Export group %s without %s'
+                                 % (name, e.args[0]))
+            live = self.inv.egs.get(name, 'name')
+            desc = eg.get('description')
+            if live is None:
+                self._step('create_eg:%s' % name, 'create_eg',
+                           {'eg_name': name, 'eg_desc': desc or '',
+                            'eg_tuple': eg_tuple})
+                continue
+            live_tuple = live.get('exportGroup3Tuple') or {}
+            current = (live_tuple.get('vgId'), live_tuple.get('igId'),
+                       live_tuple.get('pgId'))
+            if desc is None:
+                desc = live.get('description', '')
+            if eg_tuple == current and desc == live.get('description', ''):
+                continue
+            step = self._step('modify_eg:%s' % name, 'modify_eg',
+                              {'eg_id': live['id'], 'eg_name': name,
+                               'eg_desc': desc, 'vg_id': eg_tuple[0],
+                               'ig_id': eg_tuple[1], 'pg_id': eg_tuple[2]})
+            for kind, old, new in zip(('vg', 'ig', 'pg'), current,
+                                      eg_tuple):
+                if old != new:
+                    self._released[(kind, old)].append(step)
+
+    # -----------------------------------------------------------------
+    # Deletions
+    # -----------------------------------------------------------------
+    def _delete(self, name, method, kwargs, kind, obj_id, after=()):
+        after = list(after) + self._released.get((kind, obj_id), [])
+        return self._step(name, method, kwargs, after)
+
+    def prune_objects(self):
+        if 'egs' in self.present:
+            for eg in self.inv.egs:
+                if eg['name'] in self.spec['egs']:
+                    continue
+                step = self._delete('delete_eg:%s' % eg['name'],
+                                    'delete_eg', {'eg_id': eg['id']},
+                                    'eg', eg['id'])
+                eg_tuple = eg.get('exportGroup3Tuple') or {}
+                for kind in ('vg', 'ig', 'pg'):
+                    self._released[(kind, eg_tuple.get('%sId' % kind))] \
+                        .append(step)
+        for collection, (_, _, members_key, prefix, _, _, _,
+                         member_kind) in self.GROUPS.items():
+            if collection not in self.present:
+                continue
+            for group in getattr(self.inv, collection):
+                if group['name'] in self.spec[collection]:
+                    continue
+                step = self._delete(
+                    'delete_%s:%s' % (prefix, group['name']),
+                    'delete_%s' % prefix, {'%s_id' % prefix: group['id']},
+                    prefix, group['id'])
+                for member_id in group.get(members_key) or ():
+                    self._released[(member_kind, member_id)].append(step)
+        snaps_by_volume = collections.defaultdict(list)
+        for snap in self.inv.snapshots:
+            snaps_by_volume[snap.get('parentVolumeId')].append(snap)
+        for vol in self.inv.volumes:
+            spec_vol = self.spec['volumes'].get(vol['name'])
+            if spec_vol is None and 'volumes' not in self.present:
+                continue
+            if spec_vol is not None and 'snapshots' not in spec_vol:
+                continue
+            keep = set(snap['name']
+                       for snap in (spec_vol or {}).get('snapshots') or ())
+            snap_steps = [
+                self._step('delete_volsnap:%s/%s' % (vol['name'],
+                                                     snap['name']),
+                           'delete_volsnap',
+                           {'parent_vol_id': vol['id'],
+                            'snap_id': snap['id']})
+                for snap in snaps_by_volume[vol['id']]
+                if snap['name'] not in keep]
+            if spec_vol is None:
+                self._delete('delete_volume:%s' % vol['name'],
+                             'delete_volume', {'vol_id': vol['id']},
+                             'vol', vol['id'], after=snap_steps)
+        if 'initiators' in self.present:
+            addrs = set(ini['address']
+                        for ini in self.spec['initiators'].values())
+            for ini in self.inv.initiators:
+                if ini.get('memberId') in addrs:
+                    continue
+                self._delete('remove_initiator:%s' % ini['name'],
+                             'remove_initiator', {'ini_id': ini['id']},
+                             'ini', ini['id'])
+
+    def plan(self):
+        self.volumes()
+        self.initiators()
+        self.groups()
+        self.egs()
+        if self.prune:
+            self.prune_objects()
+        return self.steps
+
+
+class Reconciler(object):
+    MAX_WORKERS = 16
+
+    def __init__(self, proxy, max_workers=None):
+        """Init method.
+
+        :param proxy: VexataAPIProxy of the array
+        :param max_workers: Max calls in flight, None to use default
+                            (MAX_WORKERS)
+        """
+        self.proxy = proxy
+        self.max_workers = max_workers or self.MAX_WORKERS
+
+    def plan(self, spec, inventory=None, prune=False):
+        """Compute the calls taking the array to spec.
+
+        :param spec: Dict of collection (COLLECTIONS) -> list of objects
+        :param inventory: Inventory of the live state, None to fetch it
+        :param prune: Delete the objects of the collections of spec that
+                      are not in it
+        Returns a list of Steps, empty if the array matches spec. Raises
+        ValueError if spec is invalid or cannot be reached.
+        """
+        if inventory is None:
+            inventory = Inventory.from_proxy(self.proxy,
+                                             max_workers=self.max_workers)
+        return _Planner(spec, inventory, prune).plan()
+
+    def apply(self, spec, inventory=None, prune=False, dry_run=False):
+        """Take the array to spec, with the fewest calls.
+
+        Takes the same arguments as plan(). Independent calls of the plan
+        run in parallel.
+        Returns the list of Steps if dry_run, else a PlanResult.
+        """
+        steps = self.plan(spec, inventory=inventory, prune=prune)
+        if dry_run:
+            return steps
+        return run_plan(self.proxy, steps, self.max_workers)
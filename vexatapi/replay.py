@@ -0,0 +1,172 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Record the traffic of a proxy, replay it later without an array.
+
+    with TrafficLog('traffic.jsonl.gz', TrafficLog.RECORD) as log:
+        proxy = VexataAPIProxy(ip, user, passwd, traffic=log)
+        run_workload(proxy)
+
+    with TrafficLog('traffic.jsonl.gz', TrafficLog.REPLAY, speed=1) as log:
+        proxy = VexataAPIProxy(ip, user, passwd, traffic=log)
+        run_workload(proxy)
+
+Every attempt sent by the proxy is logged as one JSON line: method, URI,
+params/body, then either the status and body of the response or the
+error raised, along with its start time and duration. Logs whose name
+ends in .gz are gzip compressed. Responses served from the ResponseCache
+do not reach the array and are not logged.
+
+A replayed request is answered with the next response recorded for the
+same method, URI and params/body; once those are exhausted the last one
+is served again, so that polling loops can outlast the recording. With
+a speed, replies follow the recorded timeline: a request is answered no
+sooner than its recorded duration, nor before its recorded offset from
+the first request plus that duration.
+"""
+
+import collections
+import gzip
+import json
+import threading
+import time
+
+from vexatapi import exceptions
+from vexatapi.lite import _Response
+
+
+class ReplayError(exceptions.VexataAPIError):
+    """Request was not part of the replayed log."""
+
+
+def _key(method, uri, data):
+    return (method, uri, json.dumps(data, sort_keys=True))
+
+
+class TrafficLog(object):
+    RECORD = 'record'
+    REPLAY = 'replay'
+
+    def __init__(self, path, mode, speed=None):
+        """Init method.
+
+        :param path: Log file, gzip compressed if it ends in .gz
+        :param mode: RECORD to log the requests sent to the array, REPLAY
+                     to answer them from the log
+        :param speed: Replay pacing, 1 to keep the recorded timing, 2
+                      for twice as fast..., None to answer without delay
+        """
+        if mode not in (self.RECORD, self.REPLAY):
+            raise ValueError('Unknown traffic log mode %r' % mode)
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._file = None
+        # (method, uri, data) -> recorded entries, oldest first
+        self._entries = {}
+        # Recorded start of the first request, and time.monotonic() when
+        # the first one was replayed
+        self._first_start = None
+        self._replay_start = None
+        opener = gzip.open if path.endswith('.gz') else open
+        if mode == self.RECORD:
+            self._file = opener(path, 'wt', encoding='utf-8')
+        else:
+            with opener(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    key = _key(entry['method'], entry['uri'], entry['data'])
+                    self._entries.setdefault(
+                        key, collections.deque()).append(entry)
+                    if (self._first_start is None
+                            or entry['start'] < self._first_start):
+                        self._first_start = entry['start']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def replaying(self):
+        return self.mode == self.REPLAY
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def record(self, method, uri, data, start, elapsed, rsp, error):
+        """Log one attempt.
+
+        :param start: time.time() when the attempt was sent
+        :param elapsed: Seconds spent in the attempt
+        :param rsp: Response, None if error
+        :param error: VexataAPIError raised by the attempt, None if a
+                      response was received
+        """
+        entry = {'method': method, 'uri': uri, 'data': data,
+                 'start': round(start, 6), 'elapsed': round(elapsed, 6)}
+        if error is None:
+            entry['status'] = rsp.status_code
+            entry['body'] = rsp.content.decode('utf-8', 'replace')
+        else:
+            entry['error'] = type(error).__name__
+            entry['message'] = str(error)
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._file is None:
+                raise ValueError('Traffic log %s is closed' % self.path)
+            self._file.write(line)
+
+    def replay(self, method, uri, data):
+        """Recorded outcome of the request.
+
+        Returns (delay, response, error) where delay is the seconds to
+        wait before answering, and either response or error (the error
+        to raise) is None. Raises ReplayError if no such request was
+        recorded.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries.get(_key(method, uri, data))
+            if not entries:
+                raise ReplayError('%s %s: not in traffic log %s'
+                                  % (method, uri, self.path))
+            entry = entries[0]
+            if len(entries) > 1:
+                entries.popleft()
+            if self._replay_start is None:
+                self._replay_start = now
+        delay = 0
+        if self.speed:
+            # Answered when recorded, relative to the first request, but
+            # never quicker than recorded
+            answered = (entry['start'] - self._first_start
+                        + entry['elapsed'])
+            delay = max(entry['elapsed'] / self.speed,
+                        self._replay_start + answered / self.speed - now)
+        if 'error' in entry:
+            error = getattr(exceptions, entry['error'], None)
+            if not (isinstance(error, type)
+                    and issubclass(error, exceptions.VexataAPIError)):
+                error = exceptions.VexataAPIError
+            return delay, None, error(entry['message'])
+        rsp = _Response(entry['status'], entry['body'].encode('utf-8'), uri)
+        return delay, rsp, None
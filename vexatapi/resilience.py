@@ -0,0 +1,194 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Retries, deadlines and circuit breaking for the request path.
+
+    proxy = VexataAPIProxy(ip, user, passwd,
+                           retry=RetryPolicy(attempts=4),
+                           breaker=CircuitBreaker(),
+                           deadline=30)
+    with deadline(5):
+        # Both calls together must complete within 5 seconds
+        vols = proxy.list_volumes()
+        vgs = proxy.list_vgs()
+"""
+
+import contextlib
+import contextvars
+import random
+import threading
+import time
+
+from vexatapi.exceptions import CircuitOpenError
+
+# Absolute time.monotonic() deadline of the current context, shared by
+# threads (each has its own context) and asyncio tasks.
+_deadline = contextvars.ContextVar('vexatapi_deadline', default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Calls made within the block must complete within seconds.
+
+    Nested blocks can only shorten the deadline of the outer block.
+    """
+    at = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        at = min(at, outer)
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def deadline_at(seconds=None):
+    """Absolute deadline of a call starting now.
+
+    :param seconds: Per-call deadline, None for no per-call deadline
+    Returns the earlier of the per-call and the context deadlines, None
+    if there is neither.
+    """
+    at = _deadline.get()
+    if seconds is not None:
+        call_at = time.monotonic() + seconds
+        at = call_at if at is None else min(at, call_at)
+    return at
+
+
+class RetryPolicy(object):
+    ATTEMPTS = 3
+    BACKOFF = 0.5
+    MAX_BACKOFF = 10
+    # Only idempotent requests are retried. DELETE is left out by default,
+    # a retried DELETE whose first attempt did succeed would fail with 404.
+    METHODS = ('GET', 'PUT')
+    STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self,
+                 attempts=None,
+                 backoff=None,
+                 max_backoff=None,
+                 methods=None,
+                 statuses=None):
+        """Init method.
+
+        :param attempts: Max attempts per call including the first one,
+                         None to use default (ATTEMPTS)
+        :param backoff: Base delay in seconds, doubled on every retry,
+                        None to use default (BACKOFF)
+        :param max_backoff: Max delay in seconds, None to use default
+                            (MAX_BACKOFF)
+        :param methods: HTTP methods to retry, None to use default
+                        (METHODS)
+        :param statuses: Status codes to retry, None to use default
+                         (STATUSES). Connection errors and timeouts are
+                         always retried.
+        """
+        self.attempts = attempts or self.ATTEMPTS
+        self.backoff = self.BACKOFF if backoff is None else backoff
+        self.max_backoff = (self.MAX_BACKOFF if max_backoff is None
+                            else max_backoff)
+        self.methods = frozenset(methods or self.METHODS)
+        self.statuses = frozenset(statuses or self.STATUSES)
+
+    def retryable(self, method, attempt, status_code=None):
+        """Whether attempt (0 based) of method may be followed by another.
+
+        :param status_code: Status of the failed attempt, None if it
+                            raised a connection error or timeout
+        """
+        if method not in self.methods or attempt + 1 >= self.attempts:
+            return False
+        return status_code is None or status_code in self.statuses
+
+    def delay(self, attempt):
+        """Seconds to wait before retrying attempt, with full jitter."""
+        cap = min(self.max_backoff, self.backoff * (2 ** attempt))
+        return random.uniform(0, cap)
+
+
+class CircuitBreaker(object):
+    """Fails calls fast while an array keeps failing.
+
+    After failure_threshold consecutive failures the circuit opens and
+    calls raise CircuitOpenError. After reset_timeout one probe call is
+    let through, its outcome closes or re-opens the circuit. A probe
+    whose outcome is still unknown reset_timeout later is given up on,
+    and another probe is let through, right away if the probe call was
+    interrupted (release_probe()).
+    Share one breaker between all proxies of the same array.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+    FAILURE_THRESHOLD = 5
+    RESET_TIMEOUT = 30
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = (failure_threshold
+                                  or self.FAILURE_THRESHOLD)
+        self.reset_timeout = (self.RESET_TIMEOUT if reset_timeout is None
+                              else reset_timeout)
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = None
+        self._probe_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go to the array."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                if now - self._opened_at >= self.reset_timeout:
+                    self.state = self.HALF_OPEN
+                    self._probe_at = now
+                    return
+            elif (self._probe_at is None
+                  or now - self._probe_at >= self.reset_timeout):
+                # The probe was released or never reported back
+                self._probe_at = now
+                return
+            # Open, or half-open with the probe call in flight
+            raise CircuitOpenError('Circuit %s after %d failures'
+                                   % (self.state, self.failures))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def release_probe(self):
+        """Let another probe through, the call ended without an outcome.
+
+        For calls cancelled or interrupted before the array answered,
+        which say nothing about its health.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if (self.state == self.HALF_OPEN
+                    or self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
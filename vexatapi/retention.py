@@ -0,0 +1,405 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Scheduled snapshots of volumes and volume groups, with retention.
+
+    sched = RetentionScheduler(proxy, state_path='/var/lib/app/retain.json')
+    for vol_id in vol_ids:
+        sched.protect(VOLUME, vol_id, [HOURLY, DAILY])
+    sched.start()
+    ...
+    sched.stop()
+
+Each (object, policy) pair takes one snapshot per policy interval, at a
+fixed offset within the interval derived from a hash of the pair, which
+spreads the snapshots of many objects across the whole interval.
+Snapshots are named <prefix>-<vol|vg><id>-<policy>-<cycle> where cycle
+numbers the intervals, only the snapshots named this way are pruned.
+
+The last cycle handled per pair is saved to state_path. After a restart
+a pair whose cycle was missed is snapshotted right away, once. Snapshots
+are listed before one is created, so a snapshot taken just before a
+crash, while its cycle was not saved yet, is not taken twice.
+"""
+
+import collections
+import concurrent.futures
+import functools
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+
+from vexatapi.exceptions import VexataAPIError
+
+LOG = logging.getLogger(__name__)
+
+VOLUME = 'volume'
+VG = 'vg'
+
+
+class Policy(collections.namedtuple('Policy', ['name', 'interval', 'keep'])):
+    """Snapshot schedule and retention.
+
+    :param name: Part of the snapshot names, unique per protected object
+    :param interval: Seconds between snapshots
+    :param keep: Number of snapshots kept, at least 1, older ones are
+                 deleted
+    """
+    __slots__ = ()
+
+    def __new__(cls, name, interval, keep):
+        if interval <= 0:
+            raise ValueError('Policy %s: interval must be positive, got %r'
+                             % (name, interval))
+        if keep < 1:
+            raise ValueError('Policy %s: keep must be at least 1, got %r'
+                             % (name, keep))
+        return super(Policy, cls).__new__(cls, name, interval, keep)
+
+
+HOURLY = Policy('hourly', 3600, 24)
+DAILY = Policy('daily', 86400, 7)
+WEEKLY = Policy('weekly', 7 * 86400, 4)
+
+RetentionResult = collections.namedtuple(
+    'RetentionResult',
+    ['kind', 'id', 'policy', 'cycle', 'created', 'pruned', 'error'])
+RetentionResult.__doc__ = """Outcome of one scheduled snapshot.
+
+:param kind: VOLUME or VG
+:param id: Volume or volume group id
+:param policy: Policy name
+:param cycle: Interval number of the snapshot
+:param created: Id of the snapshot created, None if it already existed
+                or on error
+:param pruned: Ids of the expired snapshots deleted
+:param error: Exception raised, None on success
+"""
+
+
+class RetentionError(VexataAPIError):
+    """Array call of a scheduled snapshot failed."""
+
+
+class RetentionScheduler(object):
+    PREFIX = 'retain'
+    MAX_WORKERS = 16
+    # Longest sleep of the scheduler loop
+    MAX_WAIT = 60
+    # Min seconds between two saves of the state file
+    SAVE_INTERVAL = 10
+    # Seconds before a failed snapshot is retried, within its interval
+    RETRY_DELAY = 300
+
+    def __init__(self,
+                 proxy,
+                 state_path=None,
+                 prefix=None,
+                 max_workers=None):
+        """Init method.
+
+        :param proxy: VexataAPIProxy of the array
+        :param state_path: JSON file keeping the last cycle handled per
+                           (object, policy), None to keep it in memory
+        :param prefix: Prefix of the snapshot names, None to use default
+                       (PREFIX)
+        :param max_workers: Max snapshots in progress, None to use
+                            default (MAX_WORKERS)
+        """
+        self.proxy = proxy
+        self.state_path = state_path
+        self.prefix = prefix or self.PREFIX
+        self.max_workers = max_workers or self.MAX_WORKERS
+        # (kind, id) -> {policy name: Policy}
+        self._policies = {}
+        # 'kind:id:policy' -> last cycle handled
+        self._cycles = {}
+        # (due time, key, generation, cycle, kind, id, policy name)
+        self._heap = []
+        # key -> generation of its live heap entry, the other entries of
+        # the key are stale and dropped when popped
+        self._generations = {}
+        self._next_generation = itertools.count()
+        # Keys whose snapshot is in progress, rescheduled once done
+        self._running = set()
+        self._dirty = False
+        self._saved_at = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        if state_path is not None and os.path.exists(state_path):
+            with open(state_path) as f:
+                self._cycles = json.load(f)['cycles']
+
+    @staticmethod
+    def _key(kind, obj_id, policy_name):
+        return '%s:%s:%s' % (kind, obj_id, policy_name)
+
+    @staticmethod
+    def _offset(key, interval):
+        """Stable offset of key within the interval."""
+        return zlib.crc32(key.encode()) / float(2 ** 32) * interval
+
+    def _cycle(self, key, policy, now):
+        offset = self._offset(key, policy.interval)
+        return int((now - offset) // policy.interval)
+
+    def _slot(self, key, policy, cycle):
+        return self._offset(key, policy.interval) + cycle * policy.interval
+
+    def _tag(self, kind, obj_id, policy_name):
+        return '%s-%s%s-%s-' % (self.prefix,
+                                'vol' if kind == VOLUME else 'vg',
+                                obj_id, policy_name)
+
+    def protect(self, kind, obj_id, policies):
+        """Snapshot an object on the schedule of each policy.
+
+        :param kind: VOLUME or VG
+        :param obj_id: Volume or volume group id
+        :param policies: Policies, replace those of an earlier call
+        The first snapshot is taken in the next interval of each policy.
+        """
+        if kind not in (VOLUME, VG):
+            raise ValueError('Unknown object kind %r' % kind)
+        now = time.time()
+        with self._lock:
+            old = self._policies.get((kind, obj_id), {})
+            self._policies[(kind, obj_id)] = collections.OrderedDict(
+                (policy.name, policy) for policy in policies)
+            for name in old:
+                self._generations.pop(self._key(kind, obj_id, name), None)
+            for policy in policies:
+                self._schedule(kind, obj_id, policy, now)
+        self._wake.set()
+
+    def unprotect(self, kind, obj_id):
+        """Stop snapshotting an object, its snapshots are left as is."""
+        with self._lock:
+            policies = self._policies.pop((kind, obj_id), {})
+            for name in policies:
+                key = self._key(kind, obj_id, name)
+                self._generations.pop(key, None)
+                if self._cycles.pop(key, None) is not None:
+                    self._dirty = True
+
+    def _schedule(self, kind, obj_id, policy, now, retry_cycle=None):
+        # Called with the lock held
+        key = self._key(kind, obj_id, policy.name)
+        if key in self._running:
+            # Rescheduled with the policy of the time once done
+            return
+        cycle = self._cycle(key, policy, now)
+        last = self._cycles.get(key)
+        if last is None:
+            # Newly protected, start with the next interval rather than
+            # snapshot everything at once.
+            self._cycles[key] = last = cycle
+            self._dirty = True
+        if retry_cycle == cycle:
+            # Failed, retry within the same interval
+            due = now + min(self.RETRY_DELAY, policy.interval / 4.0)
+        elif last < cycle:
+            # Missed while not running
+            due = now
+        else:
+            cycle += 1
+            due = self._slot(key, policy, cycle)
+        # Supersedes the entry already in the heap, if any
+        generation = self._generations[key] = next(self._next_generation)
+        heapq.heappush(self._heap, (due, key, generation, cycle, kind,
+                                    obj_id, policy.name))
+
+    def _pop_due(self, now):
+        jobs = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                (_, key, generation, cycle, kind, obj_id,
+                 name) = heapq.heappop(self._heap)
+                if self._generations.get(key) != generation:
+                    # Rescheduled or unprotected since
+                    continue
+                del self._generations[key]
+                policy = self._policies.get((kind, obj_id), {}).get(name)
+                if policy is None:
+                    continue
+                self._running.add(key)
+                # Late by more than an interval, take the current cycle
+                cycle = max(cycle, self._cycle(key, policy, now))
+                jobs.append((kind, obj_id, policy, cycle))
+        return jobs
+
+    def _snapshot(self, kind, obj_id, policy, cycle):
+        """Take the snapshot of cycle unless it exists, prune expired ones.
+
+        Returns a RetentionResult, errors included.
+        """
+        proxy = self.proxy
+        tag = self._tag(kind, obj_id, policy.name)
+        created = None
+        pruned = []
+        try:
+            if kind == VOLUME:
+                snaps = proxy.list_volsnaps(obj_id)
+            else:
+                snaps = proxy.list_vgsnaps(obj_id)
+            if snaps is None:
+                raise RetentionError('Cannot list snapshots of %s %s'
+                                     % (kind, obj_id))
+            # cycle -> snapshot id
+            cycles = {}
+            for snap in snaps:
+                name = snap['name']
+                if name.startswith(tag) and name[len(tag):].isdigit():
+                    cycles[int(name[len(tag):])] = snap['id']
+            if cycle not in cycles:
+                name = tag + str(cycle)
+                desc = 'Retention snapshot (%s)' % policy.name
+                if kind == VOLUME:
+                    snap = proxy.create_volsnap(obj_id, name, desc)
+                else:
+                    snap = proxy.create_vgsnap(obj_id, name, desc)
+                if snap is None:
+                    raise RetentionError('Cannot snapshot %s %s'
+                                         % (kind, obj_id))
+                created = cycles[cycle] = snap['id']
+            for old in sorted(cycles)[:-policy.keep]:
+                if kind == VOLUME:
+                    deleted = proxy.delete_volsnap(obj_id, cycles[old])
+                else:
+                    deleted = proxy.delete_vgsnap(obj_id, cycles[old])
+                if deleted:
+                    pruned.append(cycles[old])
+                else:
+                    LOG.warning('Cannot delete expired snapshot %s of %s %s',
+                                cycles[old], kind, obj_id)
+        except Exception as e:
+            LOG.warning('%s snapshot of %s %s failed: %s',
+                        policy.name, kind, obj_id, e)
+            return RetentionResult(kind, obj_id, policy.name, cycle,
+                                   created, pruned, e)
+        return RetentionResult(kind, obj_id, policy.name, cycle,
+                               created, pruned, None)
+
+    def _done(self, policy, future):
+        self._finish(policy, future.result())
+        self._wake.set()
+
+    def _finish(self, policy, result):
+        key = self._key(result.kind, result.id, policy.name)
+        with self._lock:
+            self._running.discard(key)
+            # Protected again while running, go on with the new policy
+            policy = self._policies.get((result.kind, result.id),
+                                        {}).get(policy.name)
+            if policy is None:
+                return
+            retry_cycle = None
+            if result.error is None:
+                if result.cycle > self._cycles.get(key, -1):
+                    self._cycles[key] = result.cycle
+                    self._dirty = True
+            else:
+                retry_cycle = result.cycle
+            self._schedule(result.kind, result.id, policy, time.time(),
+                           retry_cycle)
+
+    def save(self, force=True):
+        """Write the state file, if any and if changed.
+
+        :param force: Write even if saved less than SAVE_INTERVAL ago
+        """
+        if self.state_path is None:
+            return
+        with self._lock:
+            if not self._dirty or (not force and time.monotonic()
+                                   - self._saved_at < self.SAVE_INTERVAL):
+                return
+            data = json.dumps({'cycles': self._cycles})
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        tmp = '%s.tmp' % self.state_path
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, self.state_path)
+
+    def run_due(self):
+        """Take the snapshots due now and wait for them, e.g. from cron.
+
+        Returns the list of RetentionResults.
+        """
+        jobs = self._pop_due(time.time())
+        results = []
+        if jobs:
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers) as executor:
+                futures = [(job[2], executor.submit(self._snapshot, *job))
+                           for job in jobs]
+                for policy, future in futures:
+                    result = future.result()
+                    self._finish(policy, result)
+                    results.append(result)
+        self.save()
+        return results
+
+    def run(self):
+        """Take the snapshots as they are due, until stop()."""
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers)
+        try:
+            while not self._stop.is_set():
+                self._wake.clear()
+                for job in self._pop_due(time.time()):
+                    future = executor.submit(self._snapshot, *job)
+                    future.add_done_callback(
+                        functools.partial(self._done, job[2]))
+                try:
+                    self.save(force=False)
+                except OSError:
+                    LOG.exception('Cannot save retention state to %s',
+                                  self.state_path)
+                with self._lock:
+                    wait = self.MAX_WAIT
+                    if self._heap:
+                        wait = min(wait, self._heap[0][0] - time.time())
+                self._wake.wait(max(0, wait))
+        finally:
+            executor.shutdown(wait=True)
+            self.save()
+
+    def start(self):
+        """Run in a background daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run, name='vexata-retention-%s' % self.proxy.ip)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop scheduling, wait for the snapshots in progress."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,153 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Coalescing of identical concurrent reads.
+
+    flights = SingleFlight()
+    proxy = VexataAPIProxy(ip, user, passwd, coalesce=flights)
+
+While a GET is in flight, identical GETs (same array, URI and params)
+made through proxies sharing the SingleFlight wait for its result
+instead of sending their own request. Threads share requests with
+threads, and tasks with the tasks of the same event loop. Shared results
+must be treated as read-only.
+
+A write through any of the proxies detaches the GETs in flight, later
+GETs send a new request so that they see the write.
+"""
+
+import asyncio
+import functools
+import threading
+import time
+
+from vexatapi.exceptions import VexataAPITimeout
+
+
+class _Flight(object):
+    __slots__ = ('event', 'result', 'error', 'task', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = self.error = self.task = None
+        self.waiters = 0
+
+
+def _remaining(deadline_at):
+    if deadline_at is None:
+        return None
+    return max(0, deadline_at - time.monotonic())
+
+
+class SingleFlight(object):
+
+    def __init__(self):
+        """Init method."""
+        # Calls answered by the request of another call
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._flights)
+
+    def forget(self):
+        """Calls made from now on do not join the requests in flight."""
+        with self._lock:
+            self._flights.clear()
+
+    def _land(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def do(self, key, fn, deadline_at=None):
+        """Return fn(), shared with the concurrent calls of the same key.
+
+        The first caller runs fn(), later callers wait for its result or
+        exception.
+
+        :param key: Hashable, equal for calls that may share a result
+        :param deadline_at: time.monotonic() deadline of the call,
+                            VexataAPITimeout is raised past it
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = self._flights[key] = _Flight()
+                    break
+                self.coalesced += 1
+            if not flight.event.wait(_remaining(deadline_at)):
+                raise VexataAPITimeout('Deadline exceeded waiting for a '
+                                       'shared request')
+            if flight.error is None:
+                return flight.result
+            if isinstance(flight.error, Exception):
+                raise flight.error
+            # The caller was interrupted (KeyboardInterrupt...), the
+            # request may not have completed, send it again
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._land(key, flight)
+            flight.event.set()
+
+    async def do_async(self, key, fn, deadline_at=None):
+        """Coroutine version of do(), fn() returns an awaitable.
+
+        fn() runs in a task of its own so that cancelling one caller
+        does not cancel the others, it is cancelled once all its callers
+        are.
+        """
+        loop = asyncio.get_running_loop()
+        # Tasks are bound to their loop
+        key = (loop, key)
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                flight.task = loop.create_task(fn())
+                flight.task.add_done_callback(
+                    functools.partial(self._landed, key, flight))
+            else:
+                self.coalesced += 1
+            flight.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(flight.task),
+                                          _remaining(deadline_at))
+        except asyncio.TimeoutError:
+            if flight.task.done():
+                raise
+            raise VexataAPITimeout('Deadline exceeded waiting for a '
+                                   'shared request') from None
+        finally:
+            with self._lock:
+                flight.waiters -= 1
+                if not flight.waiters and not flight.task.done():
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+                    flight.task.cancel()
+
+    def _landed(self, key, flight, task):
+        self._land(key, flight)
+        if not task.cancelled():
+            # Retrieve the exception, all callers may be gone
+            task.exception()
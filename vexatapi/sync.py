@@ -0,0 +1,233 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Incremental inventory sync with change events.
+
+    sync = InventorySync(proxy, collections=('volumes', 'vgs', 'egs'))
+    sync.subscribe(on_change, collections=('volumes',))
+    sync.start()
+    ...
+    sync.stop()
+
+Every poll fetches the collections, diffs them against the local
+Inventory and emits one ChangeEvent per added, removed or modified
+object. The poll interval shrinks while the array is changing and grows
+back while it is idle.
+"""
+
+import collections
+import concurrent.futures
+import logging
+import threading
+
+from vexatapi.inventory import Inventory
+
+LOG = logging.getLogger(__name__)
+
+ADDED = 'added'
+REMOVED = 'removed'
+MODIFIED = 'modified'
+
+ChangeEvent = collections.namedtuple('ChangeEvent',
+                                     ['collection', 'kind', 'id',
+                                      'old', 'new'])
+ChangeEvent.__doc__ = """Change of one object between two polls.
+
+:param collection: Inventory collection, e.g. 'volumes'
+:param kind: ADDED, REMOVED or MODIFIED
+:param id: Object id
+:param old: Object before the change, None if added
+:param new: Object after the change, None if removed
+"""
+
+
+class InventorySync(object):
+    MIN_INTERVAL = 5
+    MAX_INTERVAL = 120
+    # Interval multipliers applied after a poll with/without changes
+    SPEEDUP = 0.5
+    BACKOFF = 1.5
+
+    def __init__(self,
+                 proxy,
+                 collections=None,
+                 min_interval=None,
+                 max_interval=None,
+                 max_workers=None):
+        """Init method.
+
+        :param proxy: VexataAPIProxy of the array
+        :param collections: Collections to sync (keys of
+                            Inventory.LIST_METHODS), None for all.
+                            Snapshots listed by list_volumes are synced
+                            with 'volumes'.
+        :param min_interval: Shortest poll interval in seconds, None to
+                             use default (MIN_INTERVAL)
+        :param max_interval: Longest poll interval in seconds, None to
+                             use default (MAX_INTERVAL)
+        :param max_workers: Max list calls in flight per poll
+        """
+        self.proxy = proxy
+        self.collections = (list(Inventory.LIST_METHODS)
+                            if collections is None else list(collections))
+        self.min_interval = min_interval or self.MIN_INTERVAL
+        self.max_interval = max_interval or self.MAX_INTERVAL
+        self.max_workers = max_workers
+        self.interval = self.min_interval
+        self.inventory = Inventory()
+        self.synced = False
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback, collections=None):
+        """Call callback(events) with the events of every poll.
+
+        :param callback: Called with a non-empty list of ChangeEvents
+        :param collections: Only pass events of these collections, None
+                            for all
+        """
+        collections = None if collections is None else set(collections)
+        self._subscribers.append((callback, collections))
+
+    def unsubscribe(self, callback):
+        self._subscribers = [(cb, names) for cb, names in self._subscribers
+                             if cb is not callback]
+
+    def _list(self, name):
+        method = Inventory.LIST_METHODS[name]
+        try:
+            return getattr(self.proxy, method)()
+        except Exception:
+            LOG.warning('%s failed on %s, %s left as is', method,
+                        self.proxy.ip, name, exc_info=True)
+            return None
+
+    def _fetch(self):
+        """Inventory.fetch() of the collections, failures are None."""
+        max_workers = self.max_workers or Inventory.MAX_WORKERS
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            return dict(zip(self.collections,
+                            executor.map(self._list, self.collections)))
+
+    @staticmethod
+    def _diff(name, current, fetched):
+        events = []
+        seen = set()
+        for new in fetched:
+            item_id = new['id']
+            seen.add(item_id)
+            old = current.get(item_id)
+            if old is None:
+                events.append(ChangeEvent(name, ADDED, item_id, None, new))
+            elif old != new:
+                events.append(ChangeEvent(name, MODIFIED, item_id, old, new))
+        for item_id in current.ids():
+            if item_id not in seen:
+                events.append(ChangeEvent(name, REMOVED, item_id,
+                                          current.get(item_id), None))
+        return events
+
+    def poll(self):
+        """Fetch the collections once and apply the changes.
+
+        Collections whose list call failed or raised are logged and left
+        untouched for this poll. Returns the list of ChangeEvents.
+        """
+        with self._lock:
+            lists = self._fetch()
+            inv = self.inventory
+            events = []
+            for name, fetched in lists.items():
+                if fetched is None:
+                    continue
+                if name == 'volumes':
+                    snaps = [vol for vol in fetched if vol.get('snapshot')]
+                    vols = [vol for vol in fetched if not vol.get('snapshot')]
+                    events.extend(self._diff('volumes', inv.volumes, vols))
+                    events.extend(self._diff('snapshots', inv.snapshots,
+                                             snaps))
+                else:
+                    events.extend(self._diff(name, getattr(inv, name),
+                                             fetched))
+            for event in events:
+                current = getattr(inv, event.collection)
+                if event.kind == REMOVED:
+                    current.remove(event.id)
+                else:
+                    current.add(event.new)
+            if events:
+                inv.reindex()
+            # The initial load is a change from nothing, still notify
+            # but do not treat it as churn.
+            if events and self.synced:
+                self.interval = max(self.min_interval,
+                                    self.interval * self.SPEEDUP)
+            else:
+                self.interval = min(self.max_interval,
+                                    self.interval * self.BACKOFF)
+            self.synced = True
+        if events:
+            self._notify(events)
+        return events
+
+    def _notify(self, events):
+        for callback, names in list(self._subscribers):
+            if names is not None:
+                selected = [event for event in events
+                            if event.collection in names]
+            else:
+                selected = events
+            if selected:
+                callback(selected)
+
+    def events(self):
+        """Poll until stop(), yield ChangeEvents as they come.
+
+        A failed poll is logged and retried after the longest interval.
+        """
+        while not self._stop.is_set():
+            try:
+                events = self.poll()
+            except Exception:
+                LOG.exception('Inventory poll of %s failed', self.proxy.ip)
+                self._stop.wait(self.max_interval)
+                continue
+            for event in events:
+                yield event
+            self._stop.wait(self.interval)
+
+    def run(self):
+        """Poll until stop(), changes are passed to the subscribers."""
+        for _ in self.events():
+            pass
+
+    def start(self):
+        """Run in a background daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run,
+                                        name='vexata-sync-%s' % self.proxy.ip)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
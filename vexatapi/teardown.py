@@ -0,0 +1,351 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Cascading deletes and garbage collection of unused objects.
+
+    teardown = Teardown(proxy)
+    teardown.cascade_delete(VOLUME, 64)
+    teardown.sweep(pattern='ci-*', kinds=GC_KINDS + ('snapshots',),
+                   older_than=86400)
+
+cascade_delete() deletes an object along with what depends on it:
+
+- a volume: its snapshots and their clones, recursively. The volume
+  leaves the VGs it belongs to, and VGs left empty are deleted with
+  their export groups.
+- a VG, IG or PG: its export groups, and with members, its volumes (as
+  above) or its initiators that belong to no other IG.
+- an export group: only itself.
+
+sweep() collects unused objects: export groups whose volume group is
+empty or whose groups are missing, empty VGs, IGs and PGs that are
+empty or in no export group and, if asked for, snapshots without
+clones. Objects can be restricted by name pattern and, for snapshots,
+by age.
+
+Deletions run with vexatapi.executor.run_plan, export groups before
+their groups, clones before their snapshot, snapshots and group
+membership before their volume, and independent deletions in parallel.
+"""
+
+import collections
+import datetime
+import fnmatch
+import math
+import time
+
+from vexatapi.executor import (Step, run_plan)
+from vexatapi.inventory import Inventory
+
+VOLUME = 'volume'
+VG = 'vg'
+IG = 'ig'
+PG = 'pg'
+EG = 'eg'
+
+# Collections swept by default, 'snapshots' may also be given
+GC_KINDS = ('egs', 'vgs', 'igs', 'pgs')
+# Larger createdTime values are in milliseconds, in seconds they would
+# be past year 5000
+MAX_SECONDS = 1e11
+
+
+def _created_time(obj):
+    """createdTime of obj in seconds since the epoch, None if unknown.
+
+    Arrays report it in seconds or milliseconds, or as an ISO 8601
+    string, naive strings are taken as UTC.
+    """
+    value = obj.get('createdTime')
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            try:
+                when = datetime.datetime.fromisoformat(
+                    value.strip().replace('Z', '+00:00'))
+            except ValueError:
+                return None
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=datetime.timezone.utc)
+            return when.timestamp()
+    if (isinstance(value, bool) or not isinstance(value, (int, float))
+            or not math.isfinite(value) or value <= 0):
+        return None
+    if value > MAX_SECONDS:
+        value /= 1000.0
+    return float(value)
+
+
+class _Closure(object):
+    """Objects to delete, and the steps deleting them in order."""
+
+    def __init__(self, inventory, clones=True):
+        self.inv = inventory
+        self.clones = clones
+        self.volumes = set()
+        self.snapshots = set()
+        self.vgs = set()
+        self.igs = set()
+        self.pgs = set()
+        self.egs = set()
+        self.initiators = set()
+        self._clones_of = collections.defaultdict(set)
+        for vol in inventory.volumes:
+            if vol.get('parentSnapshotId') is not None:
+                self._clones_of[vol['parentSnapshotId']].add(vol['id'])
+
+    def clones_of(self, snap_id):
+        return set(self._clones_of.get(snap_id, ()))
+
+    def add_volume(self, vol_id):
+        if vol_id in self.volumes:
+            return
+        self.volumes.add(vol_id)
+        for snap_id in self.inv.snapshots_of_volume(vol_id):
+            self.add_snapshot(snap_id)
+
+    def add_snapshot(self, snap_id):
+        if snap_id in self.snapshots:
+            return
+        self.snapshots.add(snap_id)
+        if self.clones:
+            for vol_id in self.clones_of(snap_id):
+                self.add_volume(vol_id)
+
+    def add_group(self, kind, group_id, members=False):
+        groups = getattr(self, kind + 's')
+        if group_id in groups:
+            return
+        groups.add(group_id)
+        self.egs.update(getattr(self.inv, 'egs_of_' + kind)(group_id))
+        if not members:
+            return
+        group = getattr(self.inv, kind + 's').get(group_id)
+        if kind == VG:
+            for vol_id in group.get('currVolumes') or ():
+                self.add_volume(vol_id)
+        elif kind == IG:
+            for ini_id in group.get('currInitiators') or ():
+                if self.inv.igs_of_initiator(ini_id) <= self.igs:
+                    self.initiators.add(ini_id)
+
+    def add(self, kind, obj_id, members=False):
+        if kind == VOLUME:
+            self.add_volume(obj_id)
+        elif kind == EG:
+            self.egs.add(obj_id)
+        elif kind in (VG, IG, PG):
+            self.add_group(kind, obj_id, members)
+        else:
+            raise ValueError('Unknown kind %r' % kind)
+
+    def close(self):
+        """Add the VGs emptied by the volume deletions."""
+        for vol_id in list(self.volumes):
+            for vg_id in self.inv.vgs_of_volume(vol_id):
+                vg = self.inv.vgs.get(vg_id)
+                if set(vg.get('currVolumes') or ()) <= self.volumes:
+                    self.add_group(VG, vg_id)
+
+    def steps(self):
+        self.close()
+        inv = self.inv
+        steps = []
+        released = collections.defaultdict(list)
+        for eg_id in sorted(self.egs):
+            name = 'delete_eg:%d' % eg_id
+            steps.append(Step(name, 'delete_eg', {'eg_id': eg_id}))
+            released[(EG, eg_id)].append(name)
+        for kind in (VG, IG, PG):
+            for group_id in sorted(getattr(self, kind + 's')):
+                name = 'delete_%s:%d' % (kind, group_id)
+                after = [dep for eg_id in getattr(inv, 'egs_of_' + kind)(
+                    group_id) for dep in released[(EG, eg_id)]]
+                steps.append(Step(name, 'delete_%s' % kind,
+                                  {'%s_id' % kind: group_id}, after=after))
+                group = getattr(inv, kind + 's').get(group_id)
+                members = {VG: 'currVolumes', IG: 'currInitiators',
+                           PG: 'currPorts'}[kind]
+                for member_id in group.get(members) or ():
+                    released[(kind + '_member', member_id)].append(name)
+        # Volumes leaving the VGs that remain
+        leaving = collections.defaultdict(list)
+        for vol_id in self.volumes:
+            for vg_id in inv.vgs_of_volume(vol_id):
+                if vg_id not in self.vgs:
+                    leaving[vg_id].append(vol_id)
+        for vg_id, vol_ids in sorted(leaving.items()):
+            vg = inv.vgs.get(vg_id)
+            name = 'modify_vg:%d' % vg_id
+            steps.append(Step(name, 'modify_vg',
+                              {'vg_id': vg_id, 'vg_name': vg['name'],
+                               'vg_desc': vg.get('description', ''),
+                               'add_vol_ids': [],
+                               'rm_vol_ids': sorted(vol_ids)}))
+            for vol_id in vol_ids:
+                released[(VG + '_member', vol_id)].append(name)
+        for snap_id in sorted(self.snapshots):
+            snap = inv.snapshots.get(snap_id)
+            after = ['delete_volume:%d' % vol_id
+                     for vol_id in self.clones_of(snap_id)
+                     if vol_id in self.volumes]
+            steps.append(Step('delete_volsnap:%d' % snap_id,
+                              'delete_volsnap',
+                              {'parent_vol_id': snap['parentVolumeId'],
+                               'snap_id': snap_id}, after=after))
+        for vol_id in sorted(self.volumes):
+            after = ['delete_volsnap:%d' % snap_id
+                     for snap_id in inv.snapshots_of_volume(vol_id)]
+            after.extend(released[(VG + '_member', vol_id)])
+            steps.append(Step('delete_volume:%d' % vol_id, 'delete_volume',
+                              {'vol_id': vol_id}, after=after))
+        for ini_id in sorted(self.initiators):
+            steps.append(Step('remove_initiator:%d' % ini_id,
+                              'remove_initiator', {'ini_id': ini_id},
+                              after=released[(IG + '_member', ini_id)]))
+        return steps
+
+
+class Teardown(object):
+    MAX_WORKERS = 16
+
+    def __init__(self, proxy, max_workers=None):
+        """Init method.
+
+        :param proxy: VexataAPIProxy of the array
+        :param max_workers: Max calls in flight, None to use default
+                            (MAX_WORKERS)
+        """
+        self.proxy = proxy
+        self.max_workers = max_workers or self.MAX_WORKERS
+
+    def _inventory(self, inventory):
+        if inventory is not None:
+            return inventory
+        # Snapshots are listed along with the volumes
+        return Inventory.from_proxy(self.proxy,
+                                    max_workers=self.max_workers)
+
+    def _run(self, steps, dry_run):
+        if dry_run:
+            return steps
+        return run_plan(self.proxy, steps, self.max_workers)
+
+    def plan_cascade(self, objects, inventory=None, members=False,
+                     clones=True):
+        """Compute the deletions of objects and their dependents.
+
+        :param objects: (kind, id) pairs, kind is one of VOLUME, VG, IG,
+                        PG and EG
+        :param inventory: Inventory of the live state, None to fetch it
+        :param members: Also delete the volumes of VGs and the initiators
+                        of IGs that are in no other IG
+        :param clones: Also delete the clones of deleted snapshots
+        Returns a list of Steps.
+        """
+        inv = self._inventory(inventory)
+        closure = _Closure(inv, clones)
+        collections_of = {VOLUME: inv.volumes, VG: inv.vgs, IG: inv.igs,
+                          PG: inv.pgs, EG: inv.egs}
+        for kind, obj_id in objects:
+            if kind not in collections_of:
+                raise ValueError('Unknown kind %r' % kind)
+            if obj_id not in collections_of[kind]:
+                raise ValueError('No %s %s on %s' % (kind, obj_id,
+                                                     self.proxy.ip))
+            closure.add(kind, obj_id, members)
+        return closure.steps()
+
+    def cascade_delete(self, kind, obj_id, inventory=None, members=False,
+                       clones=True, dry_run=False):
+        """Delete an object and its dependents in dependency order.
+
+        Takes the same arguments as plan_cascade() for one object.
+        Returns the list of Steps if dry_run, else a PlanResult.
+        """
+        steps = self.plan_cascade([(kind, obj_id)], inventory=inventory,
+                                  members=members, clones=clones)
+        return self._run(steps, dry_run)
+
+    def plan_sweep(self, inventory=None, kinds=GC_KINDS, pattern=None,
+                   older_than=None):
+        """Compute the deletions of unused objects.
+
+        :param inventory: Inventory of the live state, None to fetch it
+        :param kinds: Collections to sweep, among 'egs', 'vgs', 'igs',
+                      'pgs' and 'snapshots'
+        :param pattern: Only collect objects whose name matches this
+                        fnmatch pattern, None for all
+        :param older_than: Only collect snapshots created more than this
+                           many seconds ago, None for all. Snapshots
+                           of unknown creation time are not collected.
+        Returns a list of Steps.
+        """
+        inv = self._inventory(inventory)
+        closure = _Closure(inv, clones=False)
+        unknown = set(kinds) - set(GC_KINDS + ('snapshots',))
+        if unknown:
+            raise ValueError('Unknown kinds %s' % ', '.join(sorted(unknown)))
+
+        def matches(obj):
+            return pattern is None or fnmatch.fnmatchcase(
+                obj.get('name') or '', pattern)
+
+        if 'egs' in kinds:
+            for eg in inv.egs:
+                eg_tuple = eg.get('exportGroup3Tuple') or {}
+                vg = inv.vgs.get(eg_tuple.get('vgId'))
+                if (vg is None or eg_tuple.get('igId') not in inv.igs
+                        or eg_tuple.get('pgId') not in inv.pgs
+                        or not vg.get('currVolumes')) and matches(eg):
+                    closure.add(EG, eg['id'])
+        for kind, members_key in ((VG, 'currVolumes'),
+                                  (IG, 'currInitiators'),
+                                  (PG, 'currPorts')):
+            if kind + 's' not in kinds:
+                continue
+            for group in getattr(inv, kind + 's'):
+                if not matches(group):
+                    continue
+                if not group.get(members_key):
+                    closure.add(kind, group['id'])
+                elif kind != VG and not getattr(inv, 'egs_of_' + kind)(
+                        group['id']):
+                    closure.add(kind, group['id'])
+        if 'snapshots' in kinds:
+            now = time.time()
+            for snap in inv.snapshots:
+                if closure.clones_of(snap['id']) or not matches(snap):
+                    continue
+                if older_than is not None:
+                    created = _created_time(snap)
+                    # Of unknown age, rather kept
+                    if created is None or now - created < older_than:
+                        continue
+                closure.add_snapshot(snap['id'])
+        return closure.steps()
+
+    def sweep(self, inventory=None, kinds=GC_KINDS, pattern=None,
+              older_than=None, dry_run=False):
+        """Delete unused objects in dependency order.
+
+        Takes the same arguments as plan_sweep().
+        Returns the list of Steps if dry_run, else a PlanResult.
+        """
+        steps = self.plan_sweep(inventory=inventory, kinds=kinds,
+                                pattern=pattern, older_than=older_than)
+        return self._run(steps, dry_run)
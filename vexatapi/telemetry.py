@@ -0,0 +1,526 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Hardware telemetry of a fleet of arrays, kept in bounded memory.
+
+    collector = TelemetryCollector(fleet, interval=5)
+    collector.start()
+    ...
+    times, temps = collector.store.query('array1', 'sensors.temp0.value',
+                                         since=time.time() - 86400,
+                                         window=3600, stat=MAX)
+    collector.store.to_csv('array1.csv', 'array1', window=300)
+
+Every interval the collector calls sensors(), iocs(), node() and
+drivegroups() on all arrays concurrently. The numeric fields of the
+responses are flattened into metrics named after their path, e.g.
+'iocs.1.cpuLoad' (list items are named by their 'name' or 'id').
+
+Samples go to bounded ring buffers holding one array('d') column per
+metric. Rollup tiers keep the min, max and average of every metric over
+longer windows, by default 6 hours of samples, 2 days of 5 minute
+windows and 92 days of hourly windows, about 101 KB per metric once
+full (see TelemetryStore). Queries return numpy arrays when numpy is
+installed (views of one copy of the ring, no per-sample Python
+objects), array.array otherwise.
+"""
+
+import array
+import bisect
+import concurrent.futures
+import csv
+import logging
+import math
+import threading
+import time
+
+try:
+    import numpy
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+from vexatapi import resilience
+
+LOG = logging.getLogger(__name__)
+
+SOURCES = ('sensors', 'iocs', 'node', 'drivegroups')
+MIN = 'min'
+MAX = 'max'
+AVG = 'avg'
+STATS = (MIN, MAX, AVG)
+
+_NAN = float('nan')
+
+
+def flatten(obj, prefix='', metrics=None):
+    """Dict of metric path -> float of the numeric fields of obj.
+
+    Items of lists are named by their 'name' or 'id' field, or by their
+    position. 'id' fields are identifiers, not metrics, and are skipped.
+    """
+    if metrics is None:
+        metrics = {}
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key != 'id':
+                flatten(value, '%s.%s' % (prefix, key) if prefix else key,
+                        metrics)
+    elif isinstance(obj, list):
+        for i, item in enumerate(obj):
+            label = i
+            if isinstance(item, dict):
+                label = item.get('name', item.get('id', i))
+            label = str(label)
+            flatten(item, '%s.%s' % (prefix, label) if prefix else label,
+                    metrics)
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        metrics[prefix] = float(obj)
+    return metrics
+
+
+def _view(values):
+    """numpy view of an array('d'), or values itself without numpy."""
+    if HAS_NUMPY:
+        return numpy.frombuffer(values, dtype=numpy.float64)
+    return values
+
+
+class Ring(object):
+    """Fixed number of samples of a growing set of metrics.
+
+    Timestamps and the values of each metric are kept in array('d')
+    columns, which grow with the samples up to capacity slots, the
+    oldest sample is then overwritten. Metrics missing from a sample
+    read as NaN.
+    """
+
+    def __init__(self, capacity):
+        """Init method.
+
+        :param capacity: Samples kept
+        """
+        self.capacity = capacity
+        self.size = 0
+        # Slot of the next sample
+        self._pos = 0
+        self._times = array.array('d')
+        self._columns = {}
+
+    def __len__(self):
+        return self.size
+
+    def metrics(self):
+        return list(self._columns)
+
+    def append(self, t, values):
+        """Add the sample of time t, values is a dict metric -> float."""
+        pos = self._pos
+        if self.size < self.capacity:
+            # Not full, columns hold size slots and pos is size
+            self._times.append(t)
+            for name, column in self._columns.items():
+                column.append(values.get(name, _NAN))
+            for name in values:
+                if name not in self._columns:
+                    column = array.array('d', [_NAN]) * pos
+                    column.append(values[name])
+                    self._columns[name] = column
+        else:
+            self._times[pos] = t
+            for name, column in self._columns.items():
+                column[pos] = values.get(name, _NAN)
+            for name in values:
+                if name not in self._columns:
+                    column = array.array('d', [_NAN]) * self.capacity
+                    column[pos] = values[name]
+                    self._columns[name] = column
+        self._pos = (pos + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def _ordered(self, column):
+        """Copy of a column, oldest sample first."""
+        if self.size < self.capacity:
+            return column[:self.size]
+        return column[self._pos:] + column[:self._pos]
+
+    def times(self):
+        return self._ordered(self._times)
+
+    def column(self, name):
+        """Values of metric name, oldest first, KeyError if unknown."""
+        return self._ordered(self._columns[name])
+
+    def span(self, since=None, until=None):
+        """(times, start, end) of the samples in [since, until).
+
+        Timestamps are assumed to increase, as samples are appended.
+        """
+        times = self.times()
+        start = 0 if since is None else bisect.bisect_left(times, since)
+        end = len(times) if until is None else bisect.bisect_left(times,
+                                                                  until)
+        return times, start, end
+
+
+class _Rollup(object):
+    """Ring of the min/max/avg of metrics over windows of seconds."""
+
+    def __init__(self, window, capacity):
+        self.window = window
+        self.ring = Ring(capacity)
+        self._bucket = None
+        # Metric -> [min, max, sum, count] of the current window
+        self._acc = {}
+
+    def add(self, t, values):
+        bucket = int(t // self.window)
+        if bucket != self._bucket:
+            self.flush()
+            self._bucket = bucket
+        for name, value in values.items():
+            if math.isnan(value):
+                continue
+            acc = self._acc.get(name)
+            if acc is None:
+                self._acc[name] = [value, value, value, 1]
+            else:
+                if value < acc[0]:
+                    acc[0] = value
+                if value > acc[1]:
+                    acc[1] = value
+                acc[2] += value
+                acc[3] += 1
+
+    def flush(self):
+        """Store the current window, if any sample was added to it."""
+        if not self._acc:
+            return
+        values = {}
+        for name, (low, high, total, count) in self._acc.items():
+            values['%s:%s' % (name, MIN)] = low
+            values['%s:%s' % (name, MAX)] = high
+            values['%s:%s' % (name, AVG)] = total / count
+        self.ring.append(self._bucket * self.window, values)
+        self._acc = {}
+
+
+class _History(object):
+    """Telemetry of one array."""
+
+    def __init__(self, raw_capacity, rollups):
+        self.raw = Ring(raw_capacity)
+        self.rollups = dict((window, _Rollup(window, capacity))
+                            for window, capacity in rollups)
+
+
+class TelemetryStore(object):
+    """Samples and rollups of the metrics of several arrays.
+
+    A metric costs 8 bytes per raw sample kept and 24 per rollup window
+    kept (min, max and average), about 101 KB with the defaults: 34.5
+    KB of raw samples, 14 KB for the 5 minute tier and 53 KB for the
+    hourly one. With max_metrics metrics that is 104 MB per array.
+    Memory grows with the samples held, the full cost is reached once
+    every ring has wrapped, after 92 days by default.
+    """
+    # Samples kept at full resolution, 6 hours every 5s
+    RAW_CAPACITY = 4320
+    # (window seconds, windows kept): 2 days of 5 minutes, 92 days of
+    # hours
+    ROLLUPS = ((300, 576), (3600, 2208))
+    # Metrics kept per array, later ones are dropped
+    MAX_METRICS = 1024
+
+    def __init__(self, raw_capacity=None, rollups=None, max_metrics=None):
+        """Init method.
+
+        :param raw_capacity: Samples kept per array, None to use default
+                             (RAW_CAPACITY)
+        :param rollups: (window seconds, windows kept) of the rollup tiers,
+                        None to use default (ROLLUPS)
+        :param max_metrics: Max metrics per array, None to use default
+                            (MAX_METRICS)
+        """
+        self.raw_capacity = raw_capacity or self.RAW_CAPACITY
+        self.rollups = tuple(self.ROLLUPS if rollups is None else rollups)
+        self.max_metrics = max_metrics or self.MAX_METRICS
+        self._histories = {}
+        self._lock = threading.Lock()
+
+    def arrays(self):
+        with self._lock:
+            return list(self._histories)
+
+    def windows(self):
+        """Windows of the rollup tiers, in seconds."""
+        return [window for window, _ in self.rollups]
+
+    def metrics(self, array_name):
+        with self._lock:
+            return self._histories[array_name].raw.metrics()
+
+    def add(self, array_name, t, values):
+        """Record a sample of an array.
+
+        :param t: time.time() of the sample, samples of an array must be
+                  added in time order
+        :param values: Dict of metric -> float
+        """
+        with self._lock:
+            history = self._histories.get(array_name)
+            if history is None:
+                history = self._histories[array_name] = _History(
+                    self.raw_capacity, self.rollups)
+            known = set(history.raw.metrics())
+            new = [name for name in values if name not in known]
+            room = self.max_metrics - len(known)
+            if len(new) > room:
+                LOG.warning('%s: dropping %d metrics over max_metrics',
+                            array_name, len(new) - room)
+                drop = set(new[room:])
+                values = dict((name, value)
+                              for name, value in values.items()
+                              if name not in drop)
+            history.raw.append(t, values)
+            for rollup in history.rollups.values():
+                rollup.add(t, values)
+
+    def _ring(self, history, window):
+        if window is None:
+            return history.raw
+        rollup = history.rollups.get(window)
+        if rollup is None:
+            raise ValueError('No %ss rollup, windows are %s'
+                             % (window, self.windows()))
+        return rollup.ring
+
+    @staticmethod
+    def _column(window, metric, stat):
+        if window is None:
+            return metric
+        if stat not in STATS:
+            raise ValueError('Unknown stat %r' % stat)
+        return '%s:%s' % (metric, stat)
+
+    def query(self, array_name, metric, since=None, until=None,
+              window=None, stat=AVG):
+        """(times, values) of a metric between since and until.
+
+        :param window: Seconds of the rollup tier to read, None for the
+                       raw samples
+        :param stat: MIN, MAX or AVG of the windows, ignored for the raw
+                     samples
+        Both are numpy arrays when numpy is installed, array('d')
+        otherwise. Rollup windows are stored once complete, times are
+        the start of the windows.
+        """
+        times, values = self.frame(array_name, [metric], since, until,
+                                   window, stat)
+        return times, values[metric]
+
+    def frame(self, array_name, metrics=None, since=None, until=None,
+              window=None, stat=AVG):
+        """(times, dict of metric -> values) of several metrics.
+
+        :param metrics: Metrics to read, None for all
+        Takes the same other arguments as query().
+        """
+        with self._lock:
+            ring = self._ring(self._histories[array_name], window)
+            if metrics is None and window is None:
+                metrics = sorted(ring.metrics())
+            elif metrics is None:
+                # Rollup columns are named <metric>:<stat>
+                metrics = sorted(set(name.rsplit(':', 1)[0]
+                                     for name in ring.metrics()))
+            times, start, end = ring.span(since, until)
+            columns = {}
+            for metric in metrics:
+                try:
+                    values = ring.column(self._column(window, metric, stat))
+                except KeyError:
+                    values = array.array('d', [_NAN]) * len(times)
+                columns[metric] = _view(values[start:end])
+        return _view(times[start:end]), columns
+
+    def to_csv(self, path_or_file, array_name, metrics=None, since=None,
+               until=None, window=None, stat=AVG):
+        """Write metrics as CSV, one row per sample, time first.
+
+        Takes the same arguments as frame(), missing values are left
+        empty.
+        """
+        times, columns = self.frame(array_name, metrics, since, until,
+                                    window, stat)
+        names = list(columns)
+        if isinstance(path_or_file, str):
+            f = open(path_or_file, 'w', newline='')
+        else:
+            f = path_or_file
+        try:
+            writer = csv.writer(f)
+            writer.writerow(['time'] + names)
+            values = [columns[name] for name in names]
+            for i, t in enumerate(times):
+                writer.writerow([repr(float(t))] + [
+                    '' if math.isnan(column[i]) else repr(float(column[i]))
+                    for column in values])
+        finally:
+            if f is not path_or_file:
+                f.close()
+
+    def to_npz(self, path_or_file, array_name, metrics=None, since=None,
+               until=None, window=None, stat=AVG):
+        """Write metrics as a numpy .npz, 'time' and one array per metric.
+
+        Takes the same arguments as frame(), requires numpy.
+        """
+        if not HAS_NUMPY:
+            raise RuntimeError('numpy is required to export to npz')
+        times, columns = self.frame(array_name, metrics, since, until,
+                                    window, stat)
+        arrays = dict(columns)
+        arrays['time'] = times
+        numpy.savez_compressed(path_or_file, **arrays)
+
+
+def downsample(times, values, window, stat=AVG):
+    """Vectorized rollup of (times, values) over windows of seconds.
+
+    Returns (window start times, stat of the values in each window),
+    NaN values are ignored. Requires numpy.
+    """
+    if not HAS_NUMPY:
+        raise RuntimeError('numpy is required to downsample')
+    if stat not in STATS:
+        raise ValueError('Unknown stat %r' % stat)
+    times = numpy.asarray(times, dtype=numpy.float64)
+    values = numpy.asarray(values, dtype=numpy.float64)
+    keep = ~numpy.isnan(values)
+    times, values = times[keep], values[keep]
+    if not len(times):
+        return times, values
+    buckets = numpy.floor_divide(times, window)
+    starts = numpy.flatnonzero(numpy.diff(buckets, prepend=numpy.nan))
+    if stat == MIN:
+        result = numpy.minimum.reduceat(values, starts)
+    elif stat == MAX:
+        result = numpy.maximum.reduceat(values, starts)
+    else:
+        counts = numpy.diff(numpy.append(starts, len(values)))
+        result = numpy.add.reduceat(values, starts) / counts
+    return buckets[starts] * window, result
+
+
+class TelemetryCollector(object):
+    INTERVAL = 5
+    MAX_WORKERS = 16
+
+    def __init__(self, fleet, interval=None, sources=None, store=None,
+                 max_workers=None):
+        """Init method.
+
+        :param fleet: vexatapi.fleet.VexataFleet of the arrays to sample
+        :param interval: Seconds between samples, None to use default
+                         (INTERVAL)
+        :param sources: Proxy methods to sample, None for SOURCES
+        :param store: TelemetryStore to record to, None for a new one
+        :param max_workers: Max calls in parallel, None to use default
+                            (MAX_WORKERS)
+        """
+        self.fleet = fleet
+        self.interval = interval or self.INTERVAL
+        self.sources = tuple(sources or SOURCES)
+        self.store = TelemetryStore() if store is None else store
+        self.max_workers = max_workers or self.MAX_WORKERS
+        self._executor = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _call(self, name, source):
+        # A sample later than the next one is useless
+        with resilience.deadline(self.interval):
+            return getattr(self.fleet[name], source)()
+
+    def sample(self):
+        """Sample all arrays once, now.
+
+        Returns a dict of (array, source) -> exception of the calls that
+        failed, the metrics of the other calls are recorded.
+        """
+        t = time.time()
+        executor = self._executor
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers)
+        try:
+            futures = dict(((name, source),
+                            executor.submit(self._call, name, source))
+                           for name in self.fleet for source in self.sources)
+            metrics = dict((name, {}) for name in self.fleet)
+            errors = {}
+            for (name, source), future in futures.items():
+                try:
+                    result = future.result()
+                except Exception as e:
+                    LOG.warning('%s: %s() failed: %s', name, source, e)
+                    errors[(name, source)] = e
+                else:
+                    flatten(result, source, metrics[name])
+        finally:
+            if executor is not self._executor:
+                executor.shutdown(wait=True)
+        for name, values in metrics.items():
+            if values:
+                self.store.add(name, t, values)
+        return errors
+
+    def run(self):
+        """Sample every interval, until stop()."""
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers)
+        try:
+            next_at = time.monotonic()
+            while not self._stop.is_set():
+                self.sample()
+                # Skip the samples missed by a slow round
+                now = time.monotonic()
+                next_at += self.interval
+                if next_at < now:
+                    next_at = now + self.interval - (
+                        (now - next_at) % self.interval)
+                self._stop.wait(next_at - now)
+        finally:
+            executor, self._executor = self._executor, None
+            executor.shutdown(wait=True)
+
+    def start(self):
+        """Run in a background daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run,
+                                        name='vexata-telemetry')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop sampling, wait for the round in progress."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -18,11 +18,22 @@ Vexata REST API proxy.
 
 """
 
-try:
-    import requests
-    HAS_REQUESTS = True
-except ImportError:
-    HAS_REQUESTS = False
+import functools
+import importlib.util
+import threading
+import time
+
+from vexatapi import models as vexata_models
+from vexatapi import resilience
+from vexatapi.exceptions import (VexataAPIConnectionError, VexataAPIError,
+                                 VexataAPIStatusError, VexataAPITimeout)
+from vexatapi.instrumentation import uri_template
+from vexatapi.jsonstream import ArrayParser
+
+# requests is only imported once a session is needed: it takes longer to
+# import than the rest of vexatapi, which short-lived processes using
+# another transport (see vexatapi.lite) would pay for nothing.
+HAS_REQUESTS = importlib.util.find_spec('requests') is not None
 
 
 class VexataAPIProxy(object):
@@ -35,6 +46,14 @@ class VexataAPIProxy(object):
     POST_OK = 201
     POST_OK_204 = 204
     PUT_OK = 200
+    # Arrays only serve HTTPS, 'http' is for test servers
+    SCHEME = 'https'
+    # Connection pool & timeout defaults
+    POOL_SIZE = 10
+    CONNECT_TIMEOUT = 10
+    READ_TIMEOUT = 120
+    # Bytes read at a time by the iter_* methods
+    STREAM_CHUNK = 64 * 1024
 
     def __init__(self,
                  mgmt_ip,
@@ -42,7 +61,20 @@ class VexataAPIProxy(object):
                  mgmt_passwd,
                  mgmt_port=None,
                  verify_cert=True,
-                 cert_path=None):
+                 cert_path=None,
+                 pool_size=None,
+                 connect_timeout=None,
+                 read_timeout=None,
+                 cache=None,
+                 retry=None,
+                 breaker=None,
+                 deadline=None,
+                 raise_on_error=False,
+                 instrumentation=None,
+                 traffic=None,
+                 models=False,
+                 admission=None,
+                 coalesce=None):
         """Init method.
 
         :param mgmt_ip: Hostname or IP of the Vexata array
@@ -51,76 +83,402 @@ class VexataAPIProxy(object):
         :param mgmt_port: HTTPS port, None to use default (443)
         :param verify_cert: Whether to verify certificates for HTTPS
         :param cert_path: Directory where certificates may be found
+        :param pool_size: Max keep-alive connections to the array, None to
+                          use default (POOL_SIZE)
+        :param connect_timeout: Seconds to wait for a connection, None to
+                                use default (CONNECT_TIMEOUT)
+        :param read_timeout: Seconds to wait for a response, None to use
+                             default (READ_TIMEOUT)
+        :param cache: vexatapi.cache.ResponseCache for list responses,
+                      None to disable caching
+        :param retry: vexatapi.resilience.RetryPolicy, None to never retry
+        :param breaker: vexatapi.resilience.CircuitBreaker of the array,
+                        None to always try calls
+        :param deadline: Seconds a call may take including retries, None
+                         for no deadline other than the timeouts
+        :param raise_on_error: Raise VexataAPIStatusError on unexpected
+                               status codes instead of returning
+                               None/False
+        :param instrumentation: vexatapi.instrumentation.Instrumentation,
+                                or a list of them, called around every
+                                request sent to the array
+        :param traffic: vexatapi.replay.TrafficLog to record the requests
+                        sent to the array to, or to replay responses from
+                        instead of sending requests
+        :param models: Return vexatapi.models objects instead of dicts
+        :param admission: vexatapi.admission.AdmissionController of the
+                          array, None to send calls right away
+        :param coalesce: vexatapi.singleflight.SingleFlight through which
+                         identical concurrent GETs share one request, None
+                         to send each GET
         """
-        # TODO(sandeep): timeout for requests
         self.ip = mgmt_ip
         self.user = mgmt_user
         self.passwd = mgmt_passwd
         self.port = mgmt_port
         self.verify_cert = verify_cert
         self.cert_path = cert_path
+        self.pool_size = pool_size or self.POOL_SIZE
+        self.timeout = (connect_timeout or self.CONNECT_TIMEOUT,
+                        read_timeout or self.READ_TIMEOUT)
+        self.cache = cache
+        self.retry = retry
+        self.breaker = breaker
+        self.deadline = deadline
+        self.raise_on_error = raise_on_error
+        if instrumentation is None:
+            self._instruments = ()
+        elif isinstance(instrumentation, (list, tuple)):
+            self._instruments = tuple(instrumentation)
+        else:
+            self._instruments = (instrumentation,)
+        self.traffic = traffic
+        self.models = models
+        self.admission = admission
+        self.coalesce = coalesce
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close all pooled connections to the array.
+
+        The proxy remains usable, a new pool is created on the next call.
+        """
+        with self._session_lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
 
     def _url(self, uri):
         port = ':%d' % self.port if self.port is not None else ''
-        return ('https://%(ip)s%(port)s%(uri)s'
-                % {'ip': self.ip, 'port': port, 'uri': uri})
+        return ('%(scheme)s://%(ip)s%(port)s%(uri)s'
+                % {'scheme': self.SCHEME, 'ip': self.ip, 'port': port,
+                   'uri': uri})
 
-    def _request(self, method, uri, data=None):
-        assert method in ('GET', 'POST', 'PUT', 'DELETE')
+    def _verify(self):
         if self.verify_cert:
-            verify = self.cert_path or True
-        else:
-            verify = False
+            return self.cert_path or True
+        return False
+
+    def _new_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        session.auth = (self.user, self.passwd)
+        # Single host, so a single pool; block instead of opening
+        # throwaway connections once pool_size requests are in flight.
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=self.pool_size,
+                              pool_block=True)
+        session.mount('%s://' % self.SCHEME, adapter)
+        return session
+
+    def _get_session(self):
+        session = self._session
+        if session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._new_session()
+                session = self._session
+        return session
+
+    def _send(self, method, uri, data, timeout, stream=False):
+        """Send one request to the array.
+
+        With stream, the body is left to be read from the response.
+        Raises VexataAPITimeout or VexataAPIConnectionError if no response
+        was received.
+        """
+        import requests
+
+        session = self._get_session()
         if method == 'GET':
-            rsp = requests.request(method,
-                                   self._url(uri),
-                                   params=data,
-                                   auth=(self.user, self.passwd),
-                                   verify=verify)
+            kwargs = {'params': data}
         else:
-            rsp = requests.request(method,
+            kwargs = {'json': data}
+        try:
+            # verify is passed per request, a session-level value is
+            # overridden by REQUESTS_CA_BUNDLE from the environment.
+            return session.request(method,
                                    self._url(uri),
-                                   json=data,
-                                   auth=(self.user, self.passwd),
-                                   verify=verify)
-        return rsp
-
-    def _get(self, uri, data=None, exp_rsp_code=None):
-        rsp = self._request('GET', uri, data)
+                                   verify=self._verify(),
+                                   timeout=timeout,
+                                   stream=stream,
+                                   **kwargs)
+        except requests.exceptions.Timeout as e:
+            raise VexataAPITimeout('%s %s: %s' % (method, uri, e)) from e
+        except requests.exceptions.RequestException as e:
+            raise VexataAPIConnectionError('%s %s: %s'
+                                           % (method, uri, e)) from e
+
+    # The retry loop of _request is driven by the two helpers below, they
+    # are shared with AsyncVexataAPIProxy.
+    def _attempt_timeout(self, method, uri, deadline_at):
+        """(connect, read) timeout of the next attempt.
+
+        Raises VexataAPITimeout past the deadline and CircuitOpenError if
+        the breaker rejects the attempt.
+        """
+        timeout = self.timeout
+        if deadline_at is not None:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise VexataAPITimeout('%s %s: deadline exceeded'
+                                       % (method, uri))
+            timeout = (min(timeout[0], remaining), min(timeout[1], remaining))
+        if self.breaker is not None:
+            self.breaker.before_call()
+        return timeout
+
+    def _retry_delay(self, method, attempt, deadline_at, rsp, error):
+        """Record the outcome of an attempt.
+
+        Returns the seconds to wait before retrying, None not to retry.
+        """
+        status_code = rsp.status_code if error is None else None
+        if self.breaker is not None:
+            if error is not None or status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+        if (self.retry is None
+                or not self.retry.retryable(method, attempt, status_code)):
+            return None
+        delay = self.retry.delay(attempt)
+        if deadline_at is not None and \
+                time.monotonic() + delay >= deadline_at:
+            return None
+        return delay
+
+    def _before_send(self, method, uri, attempt):
+        template = uri_template(uri)
+        for instrument in self._instruments:
+            instrument.before_request(self.ip, method, template, attempt)
+        return time.perf_counter()
+
+    def _after_send(self, method, uri, attempt, start, rsp, error,
+                    stream=False):
+        elapsed = time.perf_counter() - start
+        template = uri_template(uri)
+        if error is None:
+            # The body of a streamed response has not been read yet
+            status_code = rsp.status_code
+            size = None if stream else len(rsp.content)
+        else:
+            status_code = size = None
+        for instrument in self._instruments:
+            instrument.after_request(self.ip, method, template, attempt,
+                                     elapsed, status_code, size, error)
+
+    def _traffic_send(self, method, uri, data, timeout):
+        """_send() recording to, or replaying from, the traffic log."""
+        if self.traffic.replaying:
+            delay, rsp, error = self.traffic.replay(method, uri, data)
+            if delay:
+                time.sleep(delay)
+            if error is not None:
+                raise error
+            return rsp
+        start, t0 = time.time(), time.perf_counter()
+        rsp = error = None
+        try:
+            rsp = self._send(method, uri, data, timeout)
+            return rsp
+        except VexataAPIError as e:
+            error = e
+            raise
+        finally:
+            if rsp is not None or error is not None:
+                self.traffic.record(method, uri, data, start,
+                                    time.perf_counter() - t0, rsp, error)
+
+    def _request(self, method, uri, data=None, stream=False):
+        assert method in ('GET', 'POST', 'PUT', 'DELETE')
+        deadline_at = resilience.deadline_at(self.deadline)
+        attempt = 0
+        while True:
+            ticket = None
+            if self.admission is not None:
+                ticket = self.admission.acquire(method, uri, deadline_at)
+            try:
+                timeout = self._attempt_timeout(method, uri, deadline_at)
+                rsp = error = None
+                if self._instruments:
+                    start = self._before_send(method, uri, attempt)
+                try:
+                    if self.traffic is None:
+                        rsp = self._send(method, uri, data, timeout, stream)
+                    else:
+                        rsp = self._traffic_send(method, uri, data, timeout)
+                except VexataAPIError as e:
+                    error = e
+                except BaseException:
+                    # Cancelled or interrupted, not an array failure, but
+                    # a half-open breaker would otherwise hold its probe
+                    # slot until reset_timeout.
+                    if self.breaker is not None:
+                        self.breaker.release_probe()
+                    raise
+                if self._instruments:
+                    self._after_send(method, uri, attempt, start, rsp, error,
+                                     stream)
+                delay = self._retry_delay(method, attempt, deadline_at,
+                                          rsp, error)
+            finally:
+                if ticket is not None:
+                    self.admission.release(ticket)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return rsp
+            if rsp is not None:
+                # Release the connection of an unread streamed response
+                rsp.close()
+            time.sleep(delay)
+            attempt += 1
+
+    # Response handling is kept apart from the transport so that it can be
+    # shared with AsyncVexataAPIProxy.
+    def _unexpected(self, rsp, result):
+        if self.raise_on_error:
+            raise VexataAPIStatusError.from_response(rsp)
+        return result
+
+    def _get_result(self, rsp, exp_rsp_code=None):
         rsp_code = exp_rsp_code or self.GET_OK
         if rsp.status_code != rsp_code:
-            # TODO(sandeep): raise exception
-            return None
+            return self._unexpected(rsp, None)
         return rsp.json()
 
-    def _post(self, uri, data, exp_rsp_code=None):
-        rsp = self._request('POST', uri, data=data)
+    def _post_result(self, rsp, exp_rsp_code=None):
         rsp_code = exp_rsp_code or self.POST_OK
         if rsp.status_code != rsp_code:
-            # TODO(sandeep): raise exception
-            return None
+            return self._unexpected(rsp, None)
         if exp_rsp_code == self.POST_OK_204:
             # No response body
             return {}
         else:
             return rsp.json()
 
-    def _put(self, uri, data, exp_rsp_code=None):
-        rsp = self._request('PUT', uri, data=data)
+    def _put_result(self, rsp, exp_rsp_code=None):
         rsp_code = exp_rsp_code or self.PUT_OK
         if rsp.status_code != rsp_code:
-            # TODO(sandeep): raise exception
-            return None
+            return self._unexpected(rsp, None)
         return rsp.json()
 
-    def _delete(self, uri, exp_rsp_code=None):
-        rsp = self._request('DELETE', uri)
+    def _delete_result(self, rsp, exp_rsp_code=None):
         rsp_code = exp_rsp_code or self.DELETE_OK
         if rsp.status_code != rsp_code:
-            # TODO(sandeep): raise exception
-            return False
+            return self._unexpected(rsp, False)
         return True
 
+    def _decode(self, uri, result):
+        if self.models and result:
+            return vexata_models.decode(uri, result)
+        return result
+
+    def _invalidate(self, uri):
+        if self.cache is not None:
+            self.cache.invalidate(uri)
+        if self.coalesce is not None:
+            self.coalesce.forget()
+
+    def _flight_key(self, uri, data, exp_rsp_code):
+        # Calls share a request only if they would return the same result
+        params = tuple(sorted(data.items())) if data else None
+        return (self.ip, self.port, self.user, uri, params, exp_rsp_code,
+                self.models, self.raise_on_error)
+
+    def _get(self, uri, data=None, exp_rsp_code=None):
+        token = None
+        if self.cache is not None:
+            hit, result, token = self.cache.lookup(uri, data)
+            if hit:
+                return result
+        if self.coalesce is None:
+            return self._fetch(uri, data, exp_rsp_code, token)
+        return self.coalesce.do(
+            self._flight_key(uri, data, exp_rsp_code),
+            functools.partial(self._fetch, uri, data, exp_rsp_code, token),
+            resilience.deadline_at(self.deadline))
+
+    def _fetch(self, uri, data, exp_rsp_code, token):
+        """GET uri from the array, cache the result with token."""
+        rsp = self._request('GET', uri, data)
+        result = self._decode(uri, self._get_result(rsp, exp_rsp_code))
+        if token is not None and result is not None:
+            self.cache.store(uri, data, result, token)
+        return result
+
+    def _iter(self, uri, data=None, exp_rsp_code=None):
+        """Generator of the items of the list at uri.
+
+        Items are parsed as the body is received, without holding the
+        whole list in memory. As an empty iteration cannot tell failure
+        apart from an empty list, unexpected status codes always raise
+        VexataAPIStatusError.
+        """
+        if self.cache is not None:
+            hit, result, _ = self.cache.lookup(uri, data)
+            if hit:
+                yield from result
+                return
+        rsp = self._request('GET', uri, data, stream=True)
+        try:
+            if rsp.status_code != (exp_rsp_code or self.GET_OK):
+                raise VexataAPIStatusError.from_response(rsp)
+            parser = ArrayParser()
+            for chunk in self._chunks(uri, rsp):
+                for item in parser.feed(chunk):
+                    yield self._decode(uri, item)
+            for item in parser.close():
+                yield self._decode(uri, item)
+        finally:
+            rsp.close()
+
+    def _chunks(self, uri, rsp):
+        """Body of a streamed GET response, STREAM_CHUNK bytes at a time.
+
+        Raises VexataAPITimeout or VexataAPIConnectionError if the body
+        could not be read.
+        """
+        import requests
+
+        try:
+            yield from rsp.iter_content(self.STREAM_CHUNK)
+        except requests.exceptions.Timeout as e:
+            raise VexataAPITimeout('GET %s: %s' % (uri, e)) from e
+        except requests.exceptions.RequestException as e:
+            raise VexataAPIConnectionError('GET %s: %s' % (uri, e)) from e
+
+    def _post(self, uri, data, exp_rsp_code=None):
+        try:
+            rsp = self._request('POST', uri, data=data)
+        finally:
+            self._invalidate(uri)
+        return self._decode(uri, self._post_result(rsp, exp_rsp_code))
+
+    def _put(self, uri, data, exp_rsp_code=None):
+        try:
+            rsp = self._request('PUT', uri, data=data)
+        finally:
+            self._invalidate(uri)
+        return self._decode(uri, self._put_result(rsp, exp_rsp_code))
+
+    def _delete(self, uri, exp_rsp_code=None):
+        try:
+            rsp = self._request('DELETE', uri)
+        finally:
+            self._invalidate(uri)
+        return self._delete_result(rsp, exp_rsp_code)
+
     def test_connection(self):
         uri = '/api/mgmtping'
         return self._get(uri) is not None
@@ -158,6 +516,11 @@ class VexataAPIProxy(object):
                % {'sa_id': self.SA_ID})
         return self._get(uri)
 
+    def iter_volumes(self):
+        """Like list_volumes(), yields volumes as they are received."""
+        uri = ('/api/storagearrays/%(sa_id)d/volumes'
+               % {'sa_id': self.SA_ID})
+        return self._iter(uri)
 
     def find_volume_by_uuid(self,
                             volume_uuid):
@@ -213,16 +576,27 @@ class VexataAPIProxy(object):
         # returns [{"id": 72, "parentVolumeId": 64, "snapshot": true, ...}, ...]
         return self._get(uri)
 
+    def iter_volsnaps(self, vol_id):
+        """Like list_volsnaps(), yields snapshots as they are received."""
+        uri = ('/api/storagearrays/%(sa_id)d/volumes/%(vol_id)d'
+               '/snapshots'
+               % {'sa_id': self.SA_ID, 'vol_id': vol_id})
+        return self._iter(uri)
+
     def find_volsnap_by_uuid(self,
                              parent_vol_id,
                              snap_uuid):
         uri = ('/api/storagearrays/%(sa_id)d/volumes/%(vol_id)d/snapshots'
                % {'sa_id': self.SA_ID, 'vol_id': parent_vol_id})
         rsp = self._get(uri)
+        return self._match_volsnap_uuid(rsp, snap_uuid)
+
+    @staticmethod
+    def _match_volsnap_uuid(rsp, snap_uuid):
         if rsp is None:
             return None
         # REST API does not support request filtered by snap UUID.
-        matches = filter(lambda snap: snap['voluuid'] == snap_uuid, rsp)
+        matches = [snap for snap in rsp if snap['voluuid'] == snap_uuid]
         # returns a list of snaps, ideally singleton
         return matches
 
@@ -286,6 +660,12 @@ class VexataAPIProxy(object):
         #   'initiatorType': 'FC', ... }]
         return self._get(uri)
 
+    def iter_initiators(self):
+        """Like list_initiators(), yields initiators as received."""
+        uri = ('/api/storagearrays/%(sa_id)d/initiators'
+               % {'sa_id': self.SA_ID})
+        return self._iter(uri)
+
     def add_initiator(self,
                       ini_name,
                       ini_desc,
@@ -0,0 +1,308 @@
+# Copyright (c) 2018 Vexata Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Wait for objects of an array to reach a state.
+
+    waiter = Waiter(proxy)
+    proxy.grow_volume(name, desc, vol_id, 2048)
+    vol = waiter.wait_until(has_fields(volSize=2048, state='ONLINE'),
+                            'volumes', vol_id, timeout=300)
+    clone = waiter.wait_until(has_fields(state='ONLINE'), 'volumes',
+                              vol_uuid, key='voluuid')
+    waiter.wait_until(lambda vol: vol is None, 'volumes', vol_id)
+
+All the waits on a collection of the array share one poll: every round
+lists the collection once and checks the predicates of all its waiters
+against it. Polls start MIN_INTERVAL after a wait begins and back off
+up to MAX_INTERVAL while nothing changes.
+
+Use a proxy without a ResponseCache, or with a TTL of 0 for the
+collections waited on, cached lists would hide the changes.
+"""
+
+import asyncio
+import collections
+import logging
+import threading
+import time
+
+from vexatapi import resilience
+from vexatapi.exceptions import VexataAPITimeout
+from vexatapi.inventory import Inventory
+
+LOG = logging.getLogger(__name__)
+
+
+def has_fields(**fields):
+    """Predicate true once an object exists and has the given fields."""
+    def predicate(obj):
+        return obj is not None and all(obj.get(key) == value
+                                       for key, value in fields.items())
+    return predicate
+
+
+class _Wait(object):
+    __slots__ = ('collection', 'obj_id', 'key', 'predicate', 'done',
+                 'result', 'error', 'event', 'future', 'loop')
+
+    def __init__(self, collection, obj_id, key, predicate, loop=None):
+        self.collection = collection
+        self.obj_id = obj_id
+        self.key = key
+        self.predicate = predicate
+        self.done = False
+        self.result = self.error = None
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+            self.future = None
+        else:
+            self.event = None
+            self.future = loop.create_future()
+
+    def finish(self, result=None, error=None):
+        self.done = True
+        self.result = result
+        self.error = error
+        if self.loop is None:
+            self.event.set()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self._resolve)
+            except RuntimeError:
+                # Event loop closed, nothing awaits the future any more
+                pass
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class Waiter(object):
+    MIN_INTERVAL = 1
+    MAX_INTERVAL = 30
+    # Interval multiplier after a poll without changes
+    BACKOFF = 1.5
+
+    def __init__(self, proxy, min_interval=None, max_interval=None):
+        """Init method.
+
+        :param proxy: VexataAPIProxy of the array
+        :param min_interval: Seconds between polls while objects change,
+                             None to use default (MIN_INTERVAL)
+        :param max_interval: Longest seconds between polls, None to use
+                             default (MAX_INTERVAL)
+        """
+        self.proxy = proxy
+        self.min_interval = min_interval or self.MIN_INTERVAL
+        self.max_interval = max_interval or self.MAX_INTERVAL
+        # Number of collections listed
+        self.polls = 0
+        self._waits = collections.defaultdict(list)
+        # collection -> [next poll time, interval, last listing]
+        self._schedule = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def _start(self, wait):
+        if wait.collection not in Inventory.LIST_METHODS:
+            raise ValueError('Unknown collection %r' % wait.collection)
+        with self._cond:
+            self._waits[wait.collection].append(wait)
+            first_at = time.monotonic() + self.min_interval
+            entry = self._schedule.get(wait.collection)
+            if entry is None:
+                self._schedule[wait.collection] = [first_at,
+                                                   self.min_interval, None]
+            else:
+                # A new wait usually follows a change, poll again soon
+                entry[0] = min(entry[0], first_at)
+                entry[1] = self.min_interval
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='vexata-waiter-%s'
+                    % self.proxy.ip)
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify()
+
+    def _cancel(self, wait):
+        with self._cond:
+            waits = self._waits.get(wait.collection)
+            if waits and wait in waits:
+                waits.remove(wait)
+
+    def _timeout(self, wait):
+        return VexataAPITimeout('%s %s of %s did not reach the expected '
+                                'state' % (wait.collection, wait.obj_id,
+                                           self.proxy.ip))
+
+    def wait_until(self, predicate, collection, obj_id=None, key='id',
+                   timeout=None):
+        """Wait until predicate is true, return what it was called with.
+
+        :param predicate: Called with the object whose key is obj_id, None
+                          while there is none, or with the list of the
+                          collection if obj_id is None
+        :param collection: Inventory collection listing the object, e.g.
+                           'volumes' (also for snapshots), 'vgs'
+        :param key: Field matched against obj_id
+        :param timeout: Seconds to wait, None for no limit other than the
+                        context deadline (vexatapi.resilience.deadline)
+        Raises VexataAPITimeout past the deadline, and what predicate
+        raises.
+        """
+        deadline_at = resilience.deadline_at(timeout)
+        wait = _Wait(collection, obj_id, key, predicate)
+        self._start(wait)
+        remaining = None
+        if deadline_at is not None:
+            remaining = max(0, deadline_at - time.monotonic())
+        if not wait.event.wait(remaining):
+            self._cancel(wait)
+            if not wait.done:
+                raise self._timeout(wait)
+        return wait.outcome()
+
+    async def wait_until_async(self, predicate, collection, obj_id=None,
+                               key='id', timeout=None):
+        """Coroutine version of wait_until().
+
+        The polls still go through the proxy of the Waiter, from its
+        thread, the event loop is not blocked.
+        """
+        deadline_at = resilience.deadline_at(timeout)
+        wait = _Wait(collection, obj_id, key, predicate,
+                     asyncio.get_running_loop())
+        self._start(wait)
+        remaining = None
+        if deadline_at is not None:
+            remaining = max(0, deadline_at - time.monotonic())
+        try:
+            await asyncio.wait_for(asyncio.shield(wait.future), remaining)
+        except asyncio.TimeoutError:
+            self._cancel(wait)
+            if not wait.done:
+                raise self._timeout(wait) from None
+        except asyncio.CancelledError:
+            self._cancel(wait)
+            raise
+        return wait.outcome()
+
+    # -----------------------------------------------------------------
+    # Poller thread
+    # -----------------------------------------------------------------
+    def _due(self):
+        """Collections to poll now and seconds until the next poll,
+        lock held.
+        """
+        now = time.monotonic()
+        due = []
+        wake_at = None
+        for collection, entry in list(self._schedule.items()):
+            if not self._waits.get(collection):
+                del self._schedule[collection]
+                self._waits.pop(collection, None)
+            elif entry[0] <= now:
+                due.append(collection)
+            elif wake_at is None or entry[0] < wake_at:
+                wake_at = entry[0]
+        return due, None if wake_at is None else wake_at - now
+
+    def _fail(self, collections, error):
+        """Finish the waits on collections with error."""
+        with self._cond:
+            for collection in collections:
+                for wait in self._waits.pop(collection, ()):
+                    wait.finish(None, error)
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    due, wait = self._due()
+                    if not due and not self._schedule:
+                        # Nothing left to wait for, a new wait restarts
+                        # us
+                        self._thread = None
+                        return
+                    if not due:
+                        self._cond.wait(wait)
+                        continue
+                for collection in due:
+                    try:
+                        self._poll(collection)
+                    except Exception as e:
+                        LOG.exception('Polling %s of %s failed',
+                                      collection, self.proxy.ip)
+                        self._fail([collection], e)
+        except BaseException as e:
+            # The waits would otherwise hang until their timeout
+            with self._cond:
+                self._fail(list(self._waits), e)
+            raise
+        finally:
+            with self._cond:
+                # Unless a wait started another thread since we exited
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def _poll(self, collection):
+        method = Inventory.LIST_METHODS[collection]
+        try:
+            listing = getattr(self.proxy, method)()
+        except Exception as e:
+            LOG.warning('%s() on %s failed: %s', method, self.proxy.ip, e)
+            listing = None
+        self.polls += 1
+        with self._cond:
+            entry = self._schedule[collection]
+            waits = list(self._waits.get(collection, ()))
+        finished = []
+        if listing is not None:
+            indexes = {}
+            for wait in waits:
+                if wait.obj_id is None:
+                    value = listing
+                else:
+                    index = indexes.get(wait.key)
+                    if index is None:
+                        index = indexes[wait.key] = dict(
+                            (obj.get(wait.key), obj) for obj in listing)
+                    value = index.get(wait.obj_id)
+                try:
+                    if wait.predicate(value):
+                        finished.append((wait, value, None))
+                except Exception as e:
+                    finished.append((wait, None, e))
+        with self._cond:
+            for wait, value, error in finished:
+                if wait in self._waits[collection]:
+                    self._waits[collection].remove(wait)
+                wait.finish(value, error)
+            changed = listing is not None and listing != entry[2]
+            if finished or changed:
+                entry[1] = self.min_interval
+            else:
+                entry[1] = min(self.max_interval, entry[1] * self.BACKOFF)
+            if listing is not None:
+                entry[2] = listing
+            entry[0] = time.monotonic() + entry[1]